@@ -0,0 +1,330 @@
+import sys
+import json
+import time
+import asyncio
+import logging
+import argparse
+from pathlib import Path
+from datetime import datetime
+from dataclasses import dataclass, field
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from common.config_loader import settings
+from common.state_manager import get_conn, run_sql, get_dyn_record
+from common.group_context import GROUPS, use_group, get_group
+from common.job_queue import job_exists
+from common.tweet_record import TweetRecord
+from common.deadline import run_stage, StageTimeout
+from Bot_Crawler.capture_store import capture_store, entry_tweet_ids, json_loads
+from Bot_Crawler.tweet_parser import parse_timeline_pages
+from Bot_Crawler.twitter_scraper import search_timeline
+from Bot_Crawler.poll_scheduler import poll_scheduler
+
+logger = logging.getLogger("GloBot_Backfill")
+
+BACKFILL_SCHEMA = """
+CREATE TABLE IF NOT EXISTS backfills (
+    backfill_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    account TEXT NOT NULL,
+    since_ts INTEGER NOT NULL,
+    until_ts INTEGER NOT NULL,
+    cursor_ts INTEGER NOT NULL,
+    phase TEXT NOT NULL DEFAULT 'harvest',
+    captures TEXT NOT NULL DEFAULT '[]',
+    fed_index INTEGER NOT NULL DEFAULT 0,
+    harvested INTEGER NOT NULL DEFAULT 0,
+    fed INTEGER NOT NULL DEFAULT 0,
+    skipped INTEGER NOT NULL DEFAULT 0,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    last_error TEXT
+);
+"""
+ACTIVE_PHASES = ("harvest", "feed")
+PHASE_LABELS = {"harvest": "翻页采集", "feed": "限速投递", "done": "已完成", "cancelled": "已取消"}
+
+IDLE_SEC = 60          # 没有补录任务时多久再查一次 (任务可能由另一个进程的 /backfill 登记)
+THROTTLE_SEC = 30      # 令牌不足或车道繁忙时的等待
+EMPTY_SLICES_TO_FINISH = 3  # 搜索连续几次一条都没截到才认定翻到了尽头 (空结果与网络抖动无法区分)
+SNOWFLAKE_EPOCH_MS = 1288834974657
+
+_schema_ready: set[int] = set()
+
+def _ensure_schema():
+    conn = get_conn()
+    if id(conn) not in _schema_ready:
+        conn.executescript(BACKFILL_SCHEMA)
+        _schema_ready.add(id(conn))
+
+def snowflake_time(tweet_id: int) -> float:
+    """推文 ID 的高位就是毫秒时间戳，不必解码 JSON 就能知道发推时间"""
+    return ((int(tweet_id) >> 22) + SNOWFLAKE_EPOCH_MS) / 1000
+
+def _fmt_date(ts: float) -> str:
+    return datetime.fromtimestamp(ts).strftime("%Y-%m-%d")
+
+@dataclass(slots=True)
+class BackfillTask:
+    backfill_id: int
+    account: str
+    since_ts: int
+    until_ts: int
+    cursor_ts: int                      # 采集游标：下一次搜索只要早于该时刻的推文
+    phase: str
+    captures: list[int] = field(default_factory=list)  # 采集到的搜索结果归档 (新到旧)
+    fed_index: int = 0                  # 投递游标：从最旧的归档往新处理，已处理完的份数
+    harvested: int = 0
+    fed: int = 0
+    skipped: int = 0
+    created_at: float = 0.0
+    updated_at: float = 0.0
+    last_error: str | None = None
+    group: str = ""
+
+    @classmethod
+    def from_row(cls, row, group: str) -> "BackfillTask":
+        data = dict(row)
+        data['captures'] = json.loads(data['captures'])
+        return cls(**data, group=group)
+
+    def save(self):
+        self.updated_at = time.time()
+        run_sql("UPDATE backfills SET cursor_ts = ?, phase = ?, captures = ?, fed_index = ?, harvested = ?, fed = ?, skipped = ?, "
+                "updated_at = ?, last_error = ? WHERE backfill_id = ? AND phase != 'cancelled'",
+                (self.cursor_ts, self.phase, json.dumps(self.captures), self.fed_index, self.harvested, self.fed,
+                 self.skipped, self.updated_at, self.last_error, self.backfill_id))
+
+    @property
+    def query(self) -> str:
+        q = f"from:{self.account} until_time:{self.cursor_ts}"
+        return q + (f" since_time:{self.since_ts}" if self.since_ts else "")
+
+    def progress(self) -> str:
+        """进度与预计剩余时间"""
+        window = f"{_fmt_date(self.since_ts) if self.since_ts else '最早'} ~ {_fmt_date(self.until_ts)}"
+        head = f"#{self.backfill_id} @{self.account} ({window}) {PHASE_LABELS.get(self.phase, self.phase)}"
+        if self.phase == "harvest":
+            pct = f"，约 {(self.until_ts - self.cursor_ts) / (self.until_ts - self.since_ts):.0%}" if self.since_ts else ""
+            return f"{head}: 已翻到 {_fmt_date(self.cursor_ts)}{pct}，发现 {self.harvested} 条"
+        remaining = max(0, self.harvested - self.fed - self.skipped)
+        text = f"{head}: 已投递 {self.fed} / 已跳过 {self.skipped} / 共 {self.harvested} 条"
+        if self.phase == "feed" and remaining:
+            text += f"，剩余约 {remaining} 条，预计 {remaining / settings.crawlers.global_settings.backfill.max_per_hour:.1f} 小时"
+        return text
+
+# ==========================================
+# 🗂️ 补录任务登记 (CLI 与 Telegram 共用，写入账号所属团体的状态库，由爬虫进程执行)
+# ==========================================
+def _group_of(account: str):
+    return next((g for g in GROUPS if account in g.target_accounts), None)
+
+def create_backfill(account: str, since_ts: int = 0, until_ts: int | None = None) -> BackfillTask:
+    account = account.lstrip("@").lower()
+    group = _group_of(account)
+    if group is None: raise ValueError(f"@{account} 不在任何团体的 targets.x_accounts 里")
+    until_ts = int(until_ts or time.time())
+    if since_ts and since_ts >= until_ts: raise ValueError("起始日期必须早于截止日期")
+    with use_group(group):
+        _ensure_schema()
+        active = run_sql(f"SELECT backfill_id FROM backfills WHERE account = ? AND phase IN ({','.join('?' * len(ACTIVE_PHASES))})",
+                         (account,) + ACTIVE_PHASES)
+        if active: raise ValueError(f"@{account} 已有进行中的补录任务 #{active[0]['backfill_id']}")
+        now = time.time()
+        run_sql("INSERT INTO backfills (account, since_ts, until_ts, cursor_ts, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (account, since_ts, until_ts, until_ts, now, now))
+        row = run_sql("SELECT * FROM backfills WHERE account = ? ORDER BY backfill_id DESC LIMIT 1", (account,))[0]
+    return BackfillTask.from_row(row, group.name)
+
+def list_backfills(active_only: bool = True) -> list[BackfillTask]:
+    tasks = []
+    for group in GROUPS:
+        with use_group(group):
+            _ensure_schema()
+            sql = "SELECT * FROM backfills"
+            args = ()
+            if active_only:
+                sql += f" WHERE phase IN ({','.join('?' * len(ACTIVE_PHASES))})"
+                args = ACTIVE_PHASES
+            tasks += [BackfillTask.from_row(r, group.name) for r in run_sql(sql + " ORDER BY created_at", args)]
+    return tasks
+
+def cancel_backfill(account: str) -> int:
+    """取消该账号进行中的补录；已投进车道的任务不受影响。返回取消的任务数"""
+    account = account.lstrip("@").lower()
+    cancelled = 0
+    for group in GROUPS:
+        with use_group(group):
+            _ensure_schema()
+            rows = run_sql(f"SELECT backfill_id FROM backfills WHERE account = ? AND phase IN ({','.join('?' * len(ACTIVE_PHASES))})",
+                           (account,) + ACTIVE_PHASES)
+            for r in rows:
+                run_sql("UPDATE backfills SET phase = 'cancelled', updated_at = ? WHERE backfill_id = ?", (time.time(), r['backfill_id']))
+            cancelled += len(rows)
+    return cancelled
+
+def _reload(task: BackfillTask) -> BackfillTask | None:
+    """另一个进程可能已经取消了它"""
+    rows = run_sql("SELECT * FROM backfills WHERE backfill_id = ?", (task.backfill_id,))
+    return BackfillTask.from_row(rows[0], task.group) if rows else None
+
+# ==========================================
+# 📚 历史补录执行器
+# 首发截断保护会把新增账号除最新一条外的历史全部标为已处理，此前没有办法有意识地补上。
+# 补录分两段，每一步都落盘检查点，重启后原地续跑：
+#   1. 翻页采集：用常驻浏览器搜索 from:账号 until_time:游标 (最新排序)，每次翻 pages_per_slice 页，
+#      游标推进到本次最旧推文的时间 (推文 ID 即雪花时间戳)，搜索结果原样进抓包归档；
+#   2. 限速投递：从最旧的归档往新化验 (同一条引用链的祖先先发)，只排除已发布或已登记过任务的推文，
+#      按令牌桶 max_per_hour 逐条投进车道，车道积压超过 max_lane_backlog 时暂停；
+#      补录任务带 BACKFILL_PENALTY 优先级惩罚 (common/job_priority)，实时推文永远先被领取。
+# ==========================================
+class BackfillRunner:
+    def __init__(self, dispatch, lane_backlog):
+        self.dispatch = dispatch          # dispatch(tweet, 团体名) -> 是否成功入队
+        self.lane_backlog = lane_backlog  # lane_backlog(团体名) -> 该团体各车道 (采集 + 待发布) 的最大积压
+        self._empty_slices: dict[tuple, int] = {}
+        self._tokens = 1.0
+        self._refilled_at = time.monotonic()
+        self._buffer: list[TweetRecord] = []
+        self._buffer_key: tuple | None = None
+
+    @property
+    def cfg(self):
+        return settings.crawlers.global_settings.backfill
+
+    def _refill(self):
+        now = time.monotonic()
+        rate = self.cfg.max_per_hour / 3600
+        self._tokens = min(float(self.cfg.max_per_hour), self._tokens + (now - self._refilled_at) * rate)
+        self._refilled_at = now
+
+    @staticmethod
+    def _skip(tweet_id: str) -> bool:
+        return get_dyn_record(tweet_id) is not None or job_exists(tweet_id)
+
+    async def harvest(self, task: BackfillTask):
+        try:
+            captured = await run_stage("crawl", search_timeline(task.query, self.cfg.pages_per_slice), f"backfill @{task.account}")
+        except StageTimeout:
+            return
+        ids = {i for cid in captured for i in await asyncio.to_thread(lambda c=cid: entry_tweet_ids(capture_store.read_raw(c)))}
+        fresh = [i for i in ids if snowflake_time(i) < task.cursor_ts]
+        key = (task.group, task.backfill_id)
+        if fresh:
+            task.captures += captured
+            task.harvested += len(fresh)
+            task.cursor_ts = int(min(snowflake_time(i) for i in fresh))
+            self._empty_slices.pop(key, None)
+        else:
+            self._empty_slices[key] = self._empty_slices.get(key, 0) + 1
+        exhausted = self._empty_slices.get(key, 0) >= EMPTY_SLICES_TO_FINISH
+        if exhausted or (task.since_ts and task.cursor_ts <= task.since_ts):
+            task.phase = "feed"
+            logger.info(f"📚 [补录] @{task.account} 采集完毕，共 {task.harvested} 条，转入限速投递。")
+        task.last_error = None
+        task.save()
+
+    async def _load_next(self, task: BackfillTask) -> bool:
+        """化验下一份 (更新的) 归档，填充待投递缓冲；没有剩余归档返回 False"""
+        order = task.captures[::-1]
+        if task.fed_index >= len(order): return False
+        cid = order[task.fed_index]
+        try: raw = await asyncio.to_thread(capture_store.read_raw, cid)
+        except FileNotFoundError:
+            logger.warning(f"⚠️ [补录] 归档 #{cid} 已被滚动清理，跳过这一页。")
+            task.fed_index += 1
+            return True
+        entries = set(entry_tweet_ids(raw))
+        try: tweets = await run_stage("parse", parse_timeline_pages([json_loads(raw)], [cid], skip=self._skip), f"backfill #{cid}")
+        except StageTimeout: return True  # 下轮重新化验这一份
+        tweets = [t for t in tweets if t.author == task.account and task.since_ts <= t.timestamp < task.until_ts]
+        for t in tweets: t.backfill = True
+        tweets.sort(key=lambda t: t.timestamp)
+        task.skipped += max(0, len(entries) - len(tweets))
+        self._buffer, self._buffer_key = tweets, (task.group, task.backfill_id, task.fed_index)
+        return True
+
+    async def feed(self, task: BackfillTask) -> float:
+        """投递一条补录推文，返回建议的等待秒数"""
+        if self._buffer_key != (task.group, task.backfill_id, task.fed_index):
+            if not await self._load_next(task):
+                task.phase = "done"
+                task.save()
+                logger.info(f"✅ [补录] @{task.account} 补录完成：投递 {task.fed} 条，跳过 {task.skipped} 条。")
+                return 0
+            task.save()
+            return 0
+        if not self._buffer:
+            task.fed_index += 1
+            self._buffer_key = None
+            task.save()
+            return 0
+
+        self._refill()
+        if self._tokens < 1: return (1 - self._tokens) * 3600 / self.cfg.max_per_hour
+        if self.lane_backlog(task.group) > self.cfg.max_lane_backlog: return THROTTLE_SEC
+
+        tweet = self._buffer.pop(0)
+        if self.dispatch(tweet, task.group):
+            task.fed += 1
+            self._tokens -= 1
+        else:
+            task.skipped += 1
+        task.save()
+        if task.fed and task.fed % 10 == 0: logger.info(f"📚 [补录] {task.progress()}")
+        return 0
+
+    async def step(self) -> float:
+        """推进最早登记的一个补录任务，返回建议的等待秒数"""
+        task = None
+        try:
+            tasks = list_backfills()
+            if not tasks: return IDLE_SEC
+            task = tasks[0]
+            with use_group(get_group(task.group)):
+                if task.phase == "harvest":
+                    # 搜索同样会被风控盯上：仿生休眠期间只投递、不翻页
+                    if poll_scheduler.should_hibernate(): return IDLE_SEC
+                    await self.harvest(task)
+                    return self.cfg.slice_pause_sec if task.phase == "harvest" else 0
+                return await self.feed(task)
+        except asyncio.CancelledError: raise
+        except Exception as e:
+            if "TWITTER_AUTH_EXPIRED" in str(e): raise
+            logger.error(f"❌ [补录] {f'@{task.account} ' if task else ''}本步失败 (下轮从检查点重试): {e}")
+            if task is not None:
+                with use_group(get_group(task.group)):
+                    latest = _reload(task)
+                    if latest and latest.phase in ACTIVE_PHASES:
+                        latest.last_error = str(e)[:500]
+                        latest.save()
+            return self.cfg.slice_pause_sec
+
+def parse_date(value: str) -> int:
+    """YYYY-MM-DD (本地时间零点)；格式不对抛 ValueError"""
+    return int(datetime.strptime(value, "%Y-%m-%d").timestamp())
+
+# ==========================================
+# 命令行入口：登记/查看/取消补录任务 (实际执行由运行中的爬虫进程接手)
+# ==========================================
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="GloBot 历史补录")
+    parser.add_argument("account", nargs="?", help="要补录的成员账号 (须在 targets.x_accounts 里)")
+    parser.add_argument("--since", help="补录到哪一天为止 (YYYY-MM-DD，默认翻到搜索结果尽头)")
+    parser.add_argument("--until", help="从哪一天开始往回翻 (YYYY-MM-DD，不含当天，默认现在)")
+    parser.add_argument("--list", action="store_true", help="查看全部补录任务")
+    parser.add_argument("--cancel", action="store_true", help="取消该账号进行中的补录")
+    args = parser.parse_args()
+
+    if args.list or not args.account:
+        tasks = list_backfills(active_only=False)
+        print("\n".join(f"[{t.group}] {t.progress()}" for t in tasks) or "📭 没有补录任务。")
+    elif args.cancel:
+        print(f"🛑 已取消 {cancel_backfill(args.account)} 个补录任务。")
+    else:
+        try:
+            task = create_backfill(args.account, parse_date(args.since) if args.since else 0,
+                                   parse_date(args.until) if args.until else None)
+        except ValueError as e:
+            print(f"❌ {e}")
+            sys.exit(1)
+        print(f"📚 已登记补录任务: [{task.group}] {task.progress()}\n运行中的爬虫进程会在下一轮空闲时接手。")
@@ -0,0 +1,62 @@
+import re
+import bisect
+import logging
+from pathlib import Path
+
+import sys
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from common.state_manager import processed_subset
+from common.group_context import current_group
+
+logger = logging.getLogger("GloBot_Prefilter")
+
+_REST_ID_RE = re.compile(rb'"rest_id"\s*:\s*"(\d+)"')
+# 用户对象形如 {"__typename":"User","id":"VXNlcj...","rest_id":"..."}，它们的 rest_id 不是推文
+_USER_ID_RE = re.compile(rb'"__typename"\s*:\s*"User"\s*,\s*"id"\s*:\s*"[^"]*"\s*,\s*"rest_id"\s*:\s*"(\d+)"')
+
+# 进程累计的筛选结果，供 /status 展示
+prefilter_stats = {"hit": 0, "miss": 0, "skipped_bytes": 0}
+
+_name_patterns: dict[tuple, re.Pattern] = {}
+
+def _screen_name_re(accounts: list[str]) -> re.Pattern:
+    key = tuple(sorted(accounts))
+    if key not in _name_patterns:
+        names = b"|".join(re.escape(a.encode()) for a in key)
+        _name_patterns[key] = re.compile(rb'"screen_name"\s*:\s*"(?:' + names + rb')"', re.IGNORECASE)
+    return _name_patterns[key]
+
+# ==========================================
+# 🧹 字节级预筛
+# 绝大多数抓包里只有没在监控的账号，或者全是已经入库的旧推文，旧版照样整包解码、整树扫描。
+# 现在先在原始字节上找监控账号的 screen_name，再把它就近归属到所在推文的 rest_id，
+# 到去重表里批量点查；一条没见过的监控推文都没有时直接跳过，不做 JSON 解码。
+# 宁可多放行：归属不到推文 ID 时一律交给完整解析兜底。
+# ==========================================
+def is_relevant(raw: bytes) -> bool:
+    if not raw: return False
+    names = [m.start() for m in _screen_name_re(current_group().target_accounts).finditer(raw)]
+    if not names: return False
+
+    user_ids = set(_USER_ID_RE.findall(raw))
+    tweets = [(m.start(), m.group(1).decode()) for m in _REST_ID_RE.finditer(raw) if m.group(1) not in user_ids]
+    if not tweets: return True
+    positions = [pos for pos, _ in tweets]
+
+    # 作者信息紧跟在推文 rest_id 之后 (core.user_results)；前后各取最近的一条推文 ID，防止字段顺序变化时漏判
+    candidates = set()
+    for pos in names:
+        i = bisect.bisect_left(positions, pos)
+        if i > 0: candidates.add(tweets[i - 1][1])
+        if i < len(tweets): candidates.add(tweets[i][1])
+    return bool(candidates - processed_subset(candidates))
+
+def prefilter(capture_id: int, raw: bytes) -> bool:
+    """返回是否需要完整解析，并记入命中统计"""
+    if is_relevant(raw):
+        prefilter_stats["hit"] += 1
+        return True
+    prefilter_stats["miss"] += 1
+    prefilter_stats["skipped_bytes"] += len(raw)
+    logger.debug(f"🧹 [预筛] 抓包 #{capture_id} 没有未入库的监控推文，跳过解码 ({len(raw) / 1024:.0f} KB)")
+    return False
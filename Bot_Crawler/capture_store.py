@@ -0,0 +1,201 @@
+import os
+import re
+import gzip
+import json
+import time
+import sqlite3
+import logging
+import threading
+from pathlib import Path
+from datetime import datetime
+
+import sys
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from common.config_loader import settings
+
+try:
+    import zstandard
+except ImportError:  # 未安装 zstandard 时退回标准库 gzip
+    zstandard = None
+
+# 大页信息流解码是化验环节的头号开销：优先 orjson，未安装时退回标准库
+try:
+    import orjson
+    json_loads, JSON_BACKEND = orjson.loads, "orjson"
+except ImportError:
+    json_loads, JSON_BACKEND = json.loads, "json"
+
+logger = logging.getLogger("GloBot_CaptureStore")
+
+INDEX_DB_NAME = "captures.db"
+# 推特的纯游标废包通常在 1~2KB 左右。真实包含推文的包必定包含 'legacy' 字段。
+PROBE_MAX_BYTES = 5000
+ZSTD_LEVEL = 6
+_TWEET_ID_RE = re.compile(rb'"rest_id"\s*:\s*"(\d+)"')
+# 时间线顶层条目 ID (tweet-123)：只含信息流按时间直接列出的推文，不含被引用/被转推的旧推文、对话串与广告
+_ENTRY_ID_RE = re.compile(rb'"entryId"\s*:\s*"tweet-(\d+)"')
+
+def entry_tweet_ids(body: bytes) -> list[int]:
+    """时间线分页里直接列出的推文 ID (雪花 ID，越大越新)"""
+    return [int(m) for m in _ENTRY_ID_RE.findall(body)]
+
+KIND_LABELS = {"HomeLatestTimeline": "【正在关注】信息流", "SearchTimeline": "搜索结果", "UserTweets": "账号页时间线"}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS captures (
+    capture_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    captured_at REAL NOT NULL,
+    kind TEXT NOT NULL,
+    path TEXT NOT NULL,
+    codec TEXT NOT NULL,
+    raw_bytes INTEGER NOT NULL,
+    stored_bytes INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_captures_time ON captures(captured_at);
+CREATE TABLE IF NOT EXISTS capture_tweets (
+    tweet_id TEXT NOT NULL,
+    capture_id INTEGER NOT NULL,
+    PRIMARY KEY (tweet_id, capture_id)
+);
+CREATE INDEX IF NOT EXISTS idx_capture_tweets_capture ON capture_tweets(capture_id);
+"""
+
+# ==========================================
+# 🗃️ 原始抓包归档
+# 旧版先把响应解析成对象、整包 json.dumps 一遍量体积、再 indent=2 美化落盘，下一轮又删得只剩最新一份。
+# 现在直接保存响应原始字节 (zstd，缺库时 gzip)，按日期分目录滚动，总体积与保留天数双重封顶；
+# 旁路 SQLite 索引记录抓取时间与包内推文 ID，解析器与回放工具都从这里取料。
+# ==========================================
+class CaptureStore:
+    def __init__(self, root: Path):
+        self.root = root
+        self._lock = threading.RLock()
+        self._conn: sqlite3.Connection | None = None
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        with self._lock:
+            if self._conn is None:
+                self.root.mkdir(parents=True, exist_ok=True)
+                self._conn = sqlite3.connect(self.root / INDEX_DB_NAME, check_same_thread=False, isolation_level=None)
+                self._conn.row_factory = sqlite3.Row
+                self._conn.execute("PRAGMA journal_mode=WAL")
+                self._conn.executescript(SCHEMA)
+            return self._conn
+
+    def save(self, body: bytes, kind: str = "HomeLatestTimeline") -> int | None:
+        """落盘一个原始响应，返回 capture_id；无推文的游标探针包返回 None"""
+        if b'legacy' not in body and len(body) < PROBE_MAX_BYTES:
+            logger.debug(f"⚠️ 丢弃了一个无推文的游标探针包 (大小: {len(body)} bytes)")
+            return None
+
+        now = time.time()
+        if zstandard is not None:
+            codec, payload = "zst", zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(body)
+        else:
+            codec, payload = "gz", gzip.compress(body, compresslevel=6)
+
+        day_dir = self.root / datetime.fromtimestamp(now).strftime("%Y%m%d")
+        day_dir.mkdir(parents=True, exist_ok=True)
+        path = day_dir / f"{kind}_{datetime.fromtimestamp(now).strftime('%H%M%S_%f')}.json.{codec}"
+        path.write_bytes(payload)
+
+        tweet_ids = {m.decode() for m in _TWEET_ID_RE.findall(body)}
+        with self._lock:
+            conn = self.conn
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                cur = conn.execute(
+                    "INSERT INTO captures (captured_at, kind, path, codec, raw_bytes, stored_bytes) VALUES (?, ?, ?, ?, ?, ?)",
+                    (now, kind, str(path.relative_to(self.root)), codec, len(body), len(payload)))
+                capture_id = cur.lastrowid
+                conn.executemany("INSERT OR IGNORE INTO capture_tweets (tweet_id, capture_id) VALUES (?, ?)",
+                                 [(tid, capture_id) for tid in tweet_ids])
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        logger.info(f"🎯 成功截获纯净版{KIND_LABELS.get(kind, kind)}！(有效净荷: {len(body)} bytes -> 压缩归档 {len(payload)} bytes, {len(tweet_ids)} 条推文)")
+        self.rotate()
+        return capture_id
+
+    def read_raw(self, capture_id: int) -> bytes:
+        """解压一份归档，返回响应原始字节"""
+        row = self.conn.execute("SELECT path, codec FROM captures WHERE capture_id = ?", (capture_id,)).fetchone()
+        if row is None: raise FileNotFoundError(f"抓包归档 {capture_id} 不存在或已被滚动清理")
+        payload = (self.root / row["path"]).read_bytes()
+        if row["codec"] == "zst":
+            if zstandard is None: raise RuntimeError("该归档为 zstd 压缩，请先 pip install zstandard")
+            return zstandard.ZstdDecompressor().decompress(payload)
+        return gzip.decompress(payload)
+
+    def load(self, capture_id: int):
+        """解压并解析一份归档，返回 JSON 对象"""
+        return json_loads(self.read_raw(capture_id))
+
+    def latest(self) -> int | None:
+        row = self.conn.execute("SELECT capture_id FROM captures ORDER BY capture_id DESC LIMIT 1").fetchone()
+        return row["capture_id"] if row else None
+
+    def latest_of(self, kind: str) -> int | None:
+        row = self.conn.execute("SELECT MAX(capture_id) AS cid FROM captures WHERE kind = ?", (kind,)).fetchone()
+        return row["cid"]
+
+    def after(self, capture_id: int | None, kind: str | tuple[str, ...] | None = None) -> list[int]:
+        """游标式取料：返回 capture_id 之后落盘的全部归档 ID (升序)；指定 kind (可多个) 时只取这几类信息流"""
+        sql, args = "SELECT capture_id FROM captures WHERE capture_id > ?", (capture_id or 0,)
+        if kind is not None:
+            kinds = (kind,) if isinstance(kind, str) else tuple(kind)
+            sql, args = sql + f" AND kind IN ({','.join('?' * len(kinds))})", args + kinds
+        return [r["capture_id"] for r in self.conn.execute(sql + " ORDER BY capture_id", args)]
+
+    def kinds(self, capture_ids: list[int]) -> dict[int, str]:
+        """capture_id -> 信息流类型"""
+        rows = self.conn.execute(f"SELECT capture_id, kind FROM captures WHERE capture_id IN ({','.join('?' * len(capture_ids))})", capture_ids)
+        return {r["capture_id"]: r["kind"] for r in rows}
+
+    def since(self, ts: float) -> list[int]:
+        """按抓取时间回放：返回 ts 之后的全部归档 ID (升序)"""
+        return [r["capture_id"] for r in self.conn.execute(
+            "SELECT capture_id FROM captures WHERE captured_at >= ? ORDER BY capture_id", (ts,))]
+
+    def find_tweet(self, tweet_id) -> list[int]:
+        """按推文 ID 反查包含它的归档"""
+        return [r["capture_id"] for r in self.conn.execute(
+            "SELECT capture_id FROM capture_tweets WHERE tweet_id = ? ORDER BY capture_id", (str(tweet_id),))]
+
+    def rotate(self):
+        """超过保留天数或总体积上限时，从最旧的归档开始删除"""
+        cfg = settings.crawlers.global_settings
+        cutoff = time.time() - cfg.capture_retention_days * 86400
+        cap = cfg.capture_archive_mb * 1024 * 1024
+        with self._lock:
+            conn = self.conn
+            total = conn.execute("SELECT COALESCE(SUM(stored_bytes), 0) FROM captures").fetchone()[0]
+            doomed = []
+            # 最新一份永远保留：爬虫在没有新包时会回看它
+            for r in conn.execute("SELECT capture_id, captured_at, path, stored_bytes FROM captures "
+                                  "WHERE capture_id < (SELECT MAX(capture_id) FROM captures) ORDER BY capture_id"):
+                if r["captured_at"] >= cutoff and total <= cap: break
+                doomed.append((r["capture_id"], r["path"]))
+                total -= r["stored_bytes"]
+            if not doomed: return
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                ids = [(cid,) for cid, _ in doomed]
+                conn.executemany("DELETE FROM capture_tweets WHERE capture_id = ?", ids)
+                conn.executemany("DELETE FROM captures WHERE capture_id = ?", ids)
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        for _, rel in doomed:
+            path = self.root / rel
+            try: path.unlink()
+            except FileNotFoundError: pass
+            try: path.parent.rmdir()  # 当天目录清空后顺手删除
+            except OSError: pass
+        logger.info(f"🧹 [抓包归档] 滚动清理 {len(doomed)} 份旧归档。")
+
+# 单爬虫共享一条信息流，归档放在主团体的 timeline_raw 下
+capture_store = CaptureStore(Path(os.getenv("LOCAL_DATA_DIR", f"./GloBot_Data/{settings.targets.group_name}")) / "timeline_raw")
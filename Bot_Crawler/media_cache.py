@@ -0,0 +1,135 @@
+import os
+import shutil
+import sqlite3
+import hashlib
+import logging
+import threading
+import time
+from pathlib import Path
+from urllib.parse import urlsplit
+
+import sys
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from common.group_context import current_group
+
+logger = logging.getLogger("GloBot_MediaCache")
+
+CACHE_DIR_NAME = "media_cache"
+INDEX_DB_NAME = "index.db"
+HASH_CHUNK = 1 << 20  # 逐块计算摘要 (hashlib.file_digest 需要 Python 3.11)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS media_keys (
+    cache_key TEXT PRIMARY KEY,
+    digest TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    stored_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_media_keys_digest ON media_keys(digest);
+"""
+
+# 进程累计的命中量，供 /status 展示
+cache_hits = {"files": 0, "bytes": 0}
+
+def cache_key(url: str, media_key: str = "") -> str:
+    """推特的 media_key 与去掉查询参数的 CDN 地址都是稳定的；视频的不同码率地址不同，天然分开"""
+    parts = urlsplit(url)
+    return f"{media_key}|{parts.netloc}{parts.path}"
+
+# ==========================================
+# 🗄️ 内容寻址媒体缓存
+# 同一张官方海报被五个成员引用，旧版会下载五次，再被 cleanup_old_media 删五次。
+# 现在每个文件按 SHA-256 只存一份 blob (blobs/ab/abcd....jpg)，旁路索引记录 缓存键 -> 内容哈希；
+# media/<成员>/<推文ID>_img1.jpg 只是指向 blob 的硬链接，st_nlink 即引用计数：
+# 成员目录里的链接照旧按保留天数清理，blob 只有在链接全部消失 (st_nlink == 1) 且过期后才删除。
+# ==========================================
+class MediaCache:
+    def __init__(self, root: Path):
+        self.root = root
+        self.blob_dir = root / "blobs"
+        self._lock = threading.RLock()
+        self._conn: sqlite3.Connection | None = None
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        with self._lock:
+            if self._conn is None:
+                self.blob_dir.mkdir(parents=True, exist_ok=True)
+                self._conn = sqlite3.connect(self.root / INDEX_DB_NAME, check_same_thread=False, isolation_level=None)
+                self._conn.row_factory = sqlite3.Row
+                self._conn.execute("PRAGMA journal_mode=WAL")
+                self._conn.executescript(SCHEMA)
+            return self._conn
+
+    def blob_path(self, digest: str, suffix: str) -> Path:
+        return self.blob_dir / digest[:2] / f"{digest}{suffix}"
+
+    def link(self, key: str, dest: Path) -> bool:
+        """缓存命中时把 blob 硬链接到 dest，零网络开销；未命中或 blob 已被清理返回 False"""
+        row = self.conn.execute("SELECT digest, size FROM media_keys WHERE cache_key = ?", (key,)).fetchone()
+        if row is None: return False
+        blob = self.blob_path(row["digest"], dest.suffix)
+        if not blob.exists():
+            self.conn.execute("DELETE FROM media_keys WHERE cache_key = ?", (key,))
+            return False
+        self._place(blob, dest)
+        cache_hits["files"] += 1
+        cache_hits["bytes"] += row["size"]
+        logger.info(f"♻️ 媒体缓存命中: {dest.name} ({row['size'] / 1024:.0f} KB，免下载)")
+        return True
+
+    def store(self, key: str, part: Path, dest: Path) -> Path:
+        """把下载完成的临时文件收进缓存 (内容相同的只留一份)，再硬链接到 dest"""
+        sha = hashlib.sha256()
+        with open(part, "rb") as f:
+            for chunk in iter(lambda: f.read(HASH_CHUNK), b""): sha.update(chunk)
+        digest = sha.hexdigest()
+        size = part.stat().st_size
+        blob = self.blob_path(digest, dest.suffix)
+        blob.parent.mkdir(parents=True, exist_ok=True)
+        if blob.exists(): part.unlink()
+        else: part.replace(blob)
+        with self._lock:
+            self.conn.execute("INSERT OR REPLACE INTO media_keys (cache_key, digest, size, stored_at) VALUES (?, ?, ?, ?)",
+                              (key, digest, size, time.time()))
+        self._place(blob, dest)
+        return blob
+
+    @staticmethod
+    def _place(blob: Path, dest: Path):
+        dest.parent.mkdir(parents=True, exist_ok=True)
+        if dest.exists(): dest.unlink()
+        try: os.link(blob, dest)
+        except OSError: shutil.copy2(blob, dest)  # 跨文件系统时退化为复制
+        # 硬链接共享 inode 的 mtime：刷新一次，成员目录按保留天数清理时不会误删刚被复用的链接
+        os.utime(blob)
+
+    def prune(self, retention_days: float) -> int:
+        """删除已无任何链接引用 (st_nlink == 1) 且超过保留天数的 blob，返回删除数量"""
+        if not self.blob_dir.exists(): return 0
+        cutoff = time.time() - retention_days * 86400
+        doomed = []
+        for blob in self.blob_dir.rglob("*"):
+            if not blob.is_file(): continue
+            st = blob.stat()
+            if st.st_nlink <= 1 and st.st_mtime < cutoff: doomed.append(blob)
+        for blob in doomed:
+            try: blob.unlink()
+            except FileNotFoundError: pass
+        if doomed:
+            with self._lock:
+                self.conn.executemany("DELETE FROM media_keys WHERE digest = ?", [(b.stem,) for b in doomed])
+            for d in self.blob_dir.iterdir():
+                if d.is_dir() and not any(d.iterdir()):
+                    try: d.rmdir()
+                    except OSError: pass
+            logger.info(f"🧹 [媒体缓存] 已回收 {len(doomed)} 个无人引用的 blob。")
+        return len(doomed)
+
+_caches: dict[Path, MediaCache] = {}
+
+def get_media_cache() -> MediaCache:
+    """按当前团体取缓存；硬链接不能跨文件系统，所以缓存放在团体数据目录里"""
+    root = current_group().data_dir / CACHE_DIR_NAME
+    if root not in _caches: _caches[root] = MediaCache(root)
+    return _caches[root]
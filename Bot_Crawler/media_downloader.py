@@ -1,48 +1,165 @@
 import asyncio
 import os
 import sys
+import time
+import logging
 from pathlib import Path
+from urllib.parse import urlsplit
 
-async def download_media(url: str, save_dir: Path, filename: str):
-    """调用本机 Aria2c 进行极速多线程下载"""
-    save_dir.mkdir(parents=True, exist_ok=True)
-    
-    safe_filename = filename.replace("?name=orig", "")
-    
-    cmd = [
-        "aria2c",
-        "--quiet=true",                   
-        "--continue=true",                
-        "--max-connection-per-server=16", 
-        "--split=16",                     
-        "--min-split-size=1M",            
-        "--dir", str(save_dir),           
-        "--out", safe_filename,           
-        url                               
-    ]
-    
-    print(f"⬇️ 正在极速拉取: {safe_filename} ...")
-    
-    try:
-        process = await asyncio.create_subprocess_exec(
-            *cmd,
-            stdout=asyncio.subprocess.PIPE,
-            stderr=asyncio.subprocess.PIPE
+import httpx
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from common.config_loader import settings
+from Bot_Crawler.media_cache import MediaCache, get_media_cache, cache_key
+
+logger = logging.getLogger("GloBot_Downloader")
+
+CHUNK_SIZE = 256 * 1024
+RETRY_BACKOFF_SEC = 2
+
+# ==========================================
+# ⬇️ 媒体下载引擎
+# 旧版每张图片都单独拉起一个 aria2c 进程 (16 连接 × 16 分段)，解析器再逐个 await。
+# 现在整个进程共用一个常驻 httpx 连接池：有界队列 + 固定数量的下载协程，
+# 每个域名限制同时占用的连接数，只有超过阈值且支持 Range 的大文件才分段并行。
+# submit() 立即返回 Future，解析器可以边下载边拼装后面的引用链。
+# 带缓存键提交时先查内容寻址缓存 (Bot_Crawler/media_cache)，命中直接硬链接，下载完成的文件也先入缓存再链接。
+# ==========================================
+class DownloadEngine:
+    def __init__(self):
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._client: httpx.AsyncClient | None = None
+        self._queue: asyncio.Queue | None = None
+        self._workers: list[asyncio.Task] = []
+        self._host_slots: dict[str, asyncio.Semaphore] = {}
+        self._inflight: dict[Path, asyncio.Future] = {}
+        self._inflight_keys: dict[str, asyncio.Future] = {}
+
+    @property
+    def cfg(self):
+        return settings.crawlers.global_settings.media_download
+
+    def _start(self):
+        cfg = self.cfg
+        self._loop = asyncio.get_running_loop()
+        self._host_slots, self._inflight, self._inflight_keys = {}, {}, {}
+        self._client = httpx.AsyncClient(
+            follow_redirects=True, timeout=httpx.Timeout(cfg.timeout_sec, connect=15),
+            limits=httpx.Limits(max_connections=cfg.workers * cfg.split_parts, max_keepalive_connections=cfg.workers),
         )
-        
-        stdout, stderr = await process.communicate()
-        
-        if process.returncode == 0:
-            print(f"✅ 下载成功: {safe_filename}")
-            return True
-        else:
-            print(f"❌ 下载失败: {safe_filename}\n错误: {stderr.decode().strip()}")
-            return False
-            
-    except Exception as e:
-        print(f"❌ 调用 Aria2c 发生异常: {e}")
+        self._queue = asyncio.Queue(maxsize=cfg.workers * 4)
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(cfg.workers)]
+
+    def _host_slot(self, url: str) -> asyncio.Semaphore:
+        host = urlsplit(url).hostname or ""
+        if host not in self._host_slots: self._host_slots[host] = asyncio.Semaphore(self.cfg.per_host_connections)
+        return self._host_slots[host]
+
+    async def submit(self, url: str, dest: Path, cache: MediaCache | None = None, key: str = "") -> asyncio.Future:
+        """排队下载，返回 Future[bool]；同一目标文件正在下载时直接挂靠，队列满时在此等待 (背压)"""
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop: self._start()  # 首次提交 (或换了事件循环) 时才建连接池
+        if dest in self._inflight: return self._inflight[dest]
+        fut = loop.create_future()
+        if dest.exists() and dest.stat().st_size > 0:
+            fut.set_result(True)  # 上一轮已完整落盘 (下载中的文件带 .part 后缀)
+            return fut
+        if cache is not None and cache.link(key, dest):
+            fut.set_result(True)
+            return fut
+        if cache is not None and key in self._inflight_keys:
+            # 同一媒体正被别的节点下载：等它入缓存后直接链接过来
+            def _relink(src: asyncio.Future):
+                if fut.done(): return
+                fut.set_result(not src.cancelled() and bool(src.result()) and cache.link(key, dest))
+            self._inflight_keys[key].add_done_callback(_relink)
+            return fut
+        self._inflight[dest] = fut
+        fut.add_done_callback(lambda _: self._inflight.pop(dest, None))
+        if cache is not None:
+            self._inflight_keys[key] = fut
+            fut.add_done_callback(lambda _: self._inflight_keys.pop(key, None))
+        await self._queue.put((url, dest, cache, key, fut))
+        return fut
+
+    async def _worker(self):
+        while True:
+            url, dest, cache, key, fut = await self._queue.get()
+            try:
+                ok = await self._download(url, dest, cache, key)
+                if not fut.done(): fut.set_result(ok)
+            except asyncio.CancelledError:
+                if not fut.done(): fut.cancel()
+                raise
+            except Exception as e:
+                logger.error(f"❌ 下载引擎异常: {dest.name}: {e}")
+                if not fut.done(): fut.set_result(False)
+            finally:
+                self._queue.task_done()
+
+    async def _download(self, url: str, dest: Path, cache: MediaCache | None, key: str) -> bool:
+        dest.parent.mkdir(parents=True, exist_ok=True)
+        part = dest.with_name(dest.name + ".part")
+        start = time.monotonic()
+        for attempt in range(1, self.cfg.max_tries + 1):
+            try:
+                size = await self._fetch(url, part)
+                if cache is None: part.replace(dest)
+                else: await asyncio.to_thread(cache.store, key, part, dest)
+                logger.info(f"✅ 下载成功: {dest.name} ({size / 1024:.0f} KB, {time.monotonic() - start:.1f}s)")
+                return True
+            except (httpx.HTTPError, OSError) as e:
+                logger.warning(f"⚠️ 下载失败 ({attempt}/{self.cfg.max_tries}): {dest.name}: {e}")
+                if isinstance(e, httpx.HTTPStatusError) and e.response.status_code in (403, 404, 410): break
+                await asyncio.sleep(RETRY_BACKOFF_SEC * attempt)
+        try: part.unlink()
+        except FileNotFoundError: pass
         return False
 
+    async def _fetch(self, url: str, part: Path) -> int:
+        """普通文件单连接流式写盘；大文件探明体积后改走分段并行"""
+        cfg = self.cfg
+        async with self._host_slot(url):
+            async with self._client.stream("GET", url) as resp:
+                resp.raise_for_status()
+                size = int(resp.headers.get("content-length", 0))
+                split = (cfg.split_parts > 1 and size >= cfg.split_threshold_mb * 1024 * 1024
+                         and resp.headers.get("accept-ranges") == "bytes")
+                if not split:
+                    with open(part, "wb") as f:
+                        async for chunk in resp.aiter_bytes(CHUNK_SIZE): f.write(chunk)
+                    return part.stat().st_size
+        # 分段期间每一段各自占用一个域名连接名额，探测连接已经归还，不会互相死锁
+        with open(part, "wb") as f: f.truncate(size)
+        step = -(-size // cfg.split_parts)
+        await asyncio.gather(*(self._fetch_range(url, part, lo, min(lo + step, size) - 1) for lo in range(0, size, step)))
+        return size
+
+    async def _fetch_range(self, url: str, part: Path, lo: int, hi: int):
+        async with self._host_slot(url):
+            async with self._client.stream("GET", url, headers={"Range": f"bytes={lo}-{hi}"}) as resp:
+                if resp.status_code != 206: raise httpx.HTTPError(f"Range 请求未被支持 (HTTP {resp.status_code})")
+                with open(part, "r+b") as f:
+                    f.seek(lo)
+                    async for chunk in resp.aiter_bytes(CHUNK_SIZE): f.write(chunk)
+                    if f.tell() != hi + 1: raise httpx.HTTPError(f"分段 {lo}-{hi} 不完整")
+
+    async def close(self):
+        for w in self._workers: w.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        if self._client is not None: await self._client.aclose()
+        self._loop, self._client, self._queue, self._workers = None, None, None, []
+
+download_engine = DownloadEngine()
+
+async def submit_download(url: str, save_dir: Path, filename: str, media_key: str = "") -> asyncio.Future:
+    """提交下载，立即返回 Future[bool]；经当前团体的媒体缓存去重"""
+    return await download_engine.submit(url, save_dir / filename.replace("?name=orig", ""), get_media_cache(), cache_key(url, media_key))
+
+async def download_media(url: str, save_dir: Path, filename: str, media_key: str = "") -> bool:
+    """提交下载并等待完成；调用方被取消时不连累挂靠同一文件的其他等待者"""
+    return await asyncio.shield(await submit_download(url, save_dir, filename, media_key))
+
 # ==========================================
 # 本地防呆测试
 # ==========================================
@@ -50,6 +167,6 @@ if __name__ == "__main__":
     # 🌟 GloBot 测试路径
     test_dir = Path(os.getenv("LOCAL_DATA_DIR", "./GloBot_Data/test_group")) / "media_test"
     test_url = "https://pbs.twimg.com/media/HB17XJwawAADZ5n.jpg?name=orig"
-    
-    print("🚀 启动 Aria2c 引擎单点测试...")
-    asyncio.run(download_media(test_url, test_dir, "karen_test_image.jpg"))
\ No newline at end of file
+
+    print("🚀 启动下载引擎单点测试...")
+    asyncio.run(download_media(test_url, test_dir, "karen_test_image.jpg"))
@@ -0,0 +1,147 @@
+import sys
+import asyncio
+from pathlib import Path
+from dataclasses import dataclass, field
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from common.config_loader import settings
+from common.state_manager import get_dyn_record
+from common.group_context import current_group
+from common.tweet_record import TweetRecord, MediaRef
+from Bot_Crawler.media_downloader import submit_download
+
+# 推特原图 JPEG 的经验体积 (字节/像素)；拿不到尺寸时按单张 400KB 估算
+PHOTO_BYTES_PER_PIXEL = 0.25
+PHOTO_FALLBACK_BYTES = 400 * 1024
+
+SKIP_REASONS = {
+    "published": "祖先已发布",
+    "images_off": "图片抓取已关闭",
+    "videos_unused": "视频不会被发布",
+    "batch_shared": "批内已下载",
+}
+
+def estimate_bytes(media: dict) -> int:
+    """按 GraphQL 媒体描述估算文件体积：视频用码率 × 时长，图片用原图像素数"""
+    if media.get('type') == 'photo':
+        info = media.get('original_info', {})
+        pixels = info.get('width', 0) * info.get('height', 0)
+        return int(pixels * PHOTO_BYTES_PER_PIXEL) if pixels else PHOTO_FALLBACK_BYTES
+    video_info = media.get('video_info', {})
+    bitrate = max((v.get('bitrate', 0) for v in video_info.get('variants', [])), default=0)
+    return bitrate * video_info.get('duration_millis', 0) // 8000
+
+@dataclass(slots=True)
+class PlannedFetch:
+    node: TweetRecord
+    ref: MediaRef
+    filename: str
+
+@dataclass(slots=True)
+class PlanReport:
+    planned: int = 0
+    planned_bytes: int = 0
+    skipped: dict[str, list[int]] = field(default_factory=dict)  # 原因 -> [文件数, 估算字节]
+
+    def skip(self, reason: str, ref: MediaRef):
+        entry = self.skipped.setdefault(reason, [0, 0])
+        entry[0] += 1
+        entry[1] += ref.est_bytes
+
+    @property
+    def avoided(self) -> int:
+        return sum(n for n, _ in self.skipped.values())
+
+    @property
+    def avoided_bytes(self) -> int:
+        return sum(b for _, b in self.skipped.values())
+
+    def merge(self, other: "PlanReport"):
+        self.planned += other.planned
+        self.planned_bytes += other.planned_bytes
+        for reason, (n, b) in other.skipped.items():
+            entry = self.skipped.setdefault(reason, [0, 0])
+            entry[0] += n
+            entry[1] += b
+
+    def summary(self) -> str:
+        details = " / ".join(f"{SKIP_REASONS[r]} {n}" for r, (n, _) in self.skipped.items())
+        return (f"计划下载 {self.planned} 个 (约 {self.planned_bytes / 1048576:.1f} MB)，"
+                f"跳过 {self.avoided} 个，省下约 {self.avoided_bytes / 1048576:.1f} MB"
+                + (f" ({details})" if details else ""))
+
+# 进程累计的节省量，供 /status 展示
+savings_total = PlanReport()
+
+def media_policy(platform: str = "x_twitter") -> tuple[bool, bool]:
+    """(要不要图片, 要不要视频)：按来源平台的抓取开关 (crawlers.<platform>)；视频只有在至少一种视频发布开关打开时才会被消费"""
+    spider, bili = getattr(settings.crawlers, platform), settings.publishers.bilibili
+    want_videos = spider.fetch_videos and (bili.publish_original_video or bili.publish_translated_video)
+    return spider.fetch_images, want_videos
+
+# ==========================================
+# 🧮 媒体下载规划
+# 旧版对 quote_chain + [目标] 的每个节点无差别下载，已发布的祖先 (发布时直接套娃 dyn_map)、
+# 被抓取开关关掉的图片、根本不会被发布的视频都照拉不误。
+# 现在先按链条算清楚哪些文件真正会被消费，只下载这些，其余记入跳过报表。
+# ==========================================
+def plan_chain(chain: list[TweetRecord], report: PlanReport, shared, platform: str = "x_twitter") -> list[PlannedFetch]:
+    """shared 为本批次已排队下载的节点 ID 集合 (或以其为键的字典)；多条链共享的祖先只下载一次"""
+    want_images, want_videos = media_policy(platform)
+    fetches = []
+    for node in chain:
+        if node.is_placeholder or node.node_type == 'RETWEET': continue
+        if node.id in shared:
+            for ref in node.media_refs: report.skip("batch_shared", ref)
+            continue
+        if get_dyn_record(node.id) is not None:
+            for ref in node.media_refs: report.skip("published", ref)
+            continue
+
+        img_count = 1
+        for ref in node.media_refs:
+            # 文件编号与图片附言保持一致，跳过的图片也占号
+            if ref.kind == 'photo':
+                filename = f"{node.id}_img{img_count}.jpg"
+                img_count += 1
+                if not want_images:
+                    report.skip("images_off", ref)
+                    continue
+            else:
+                filename = f"{node.id}_video.mp4"
+                if not want_videos:
+                    report.skip("videos_unused", ref)
+                    continue
+            fetches.append(PlannedFetch(node, ref, filename))
+            report.planned += 1
+            report.planned_bytes += ref.est_bytes
+    return fetches
+
+async def fetch_planned_media(tweets: list[TweetRecord], platform: str = "x_twitter") -> PlanReport:
+    """按链规划并下载一批推文的媒体，结果写回各节点的 media (当前团体的成员媒体目录)"""
+    group = current_group()
+    report = PlanReport()
+    pending: dict[str, list[tuple[asyncio.Future, str]]] = {}  # 本批次已排队下载的节点 ID -> [(Future, 本地路径)]
+    chains = [tweet.quote_chain + [tweet] for tweet in tweets]
+
+    # 🖼️ 先规划再下载：只拉取这条链真正会被发布消费的媒体，提交给下载引擎后继续规划下一条链
+    for all_nodes in chains:
+        for fetch in plan_chain(all_nodes, report, pending, platform):
+            member_media_dir = group.data_dir / "media" / fetch.node.author
+            fut = await submit_download(fetch.ref.url, member_media_dir, fetch.filename, fetch.ref.media_key)
+            pending.setdefault(fetch.node.id, []).append((fut, str(member_media_dir / fetch.filename)))
+
+    # ⏳ 全部链条提交完毕后统一等待下载结果；asyncio.wait 被取消时不会连带取消引擎里的下载
+    futures = [fut for items in pending.values() for fut, _ in items]
+    if futures: await asyncio.wait(futures)
+    for all_nodes in chains:
+        for node in all_nodes:
+            if node.is_placeholder or node.node_type == 'RETWEET':
+                node.media = []
+                continue
+            node.media = [path for fut, path in pending.get(node.id, []) if not fut.cancelled() and fut.result()]
+
+    if report.planned or report.avoided:
+        savings_total.merge(report)
+        print(f"🧮 [下载规划] {report.summary()}")
+    return report
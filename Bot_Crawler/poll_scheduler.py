@@ -0,0 +1,238 @@
+import sys
+import time
+import random
+import logging
+from pathlib import Path
+from datetime import datetime, timedelta
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from common.config_loader import settings
+from common.state_manager import run_sql
+from common.group_context import GROUPS, use_group
+
+logger = logging.getLogger("GloBot_PollScheduler")
+
+HOURS_PER_WEEK = 168
+REBUILD_INTERVAL_SEC = 3600    # 直方图每小时重建一次，新入库的推文随之计入
+MIN_HISTORY_POSTS = 20         # 历史样本太少时不冒险，沿用旧版随机节奏
+SMOOTHING_WEEKS = 2.0          # 周内小时格子的先验强度：样本稀疏时向"同一钟点的全周均值"收缩
+BURST_WINDOW_SEC = 3600
+HIBERNATE_NAP_SEC = 600
+LEGACY_INTERVAL = (240, 420)
+
+def _hour_of_week(dt: datetime) -> int:
+    return dt.weekday() * 24 + dt.hour
+
+def _parse_hhmm(value: str):
+    return datetime.strptime(value, "%H:%M").time()
+
+# ==========================================
+# ⏱️ 自适应巡视节奏
+# 旧版两轮巡视之间固定随机睡 240~420 秒，休眠时段一律蛰伏：
+# 公演/直播前后来不及反应，工作日下午又白白空转，白白消耗风控额度。
+# 现在从各团体状态库的 tweets 表 (作者, 发推时间) 学习每个成员"周几几点"的发推率直方图，
+# 稀疏格子按同一钟点的全周均值平滑，叠加最近一小时的突发量，得到当前预期发推率 Λ (条/小时)，
+# 在每天 polls_per_day 次的巡视预算下，让发现延迟 (按发推率加权的平均等待) 最小的分配是 间隔 ∝ 1/√Λ：
+# 高峰时段密集巡视、冷门时段稀疏巡视，间隔夹在 [min_interval_sec, max_interval_sec] 之间。
+# 休眠时段内若历史发推率不低于 night_wake_rate 则不再蛰伏，改按上限间隔巡视。
+# ==========================================
+class PollScheduler:
+    def __init__(self):
+        self._built_at = 0.0
+        self._rates: list[float] = [0.0] * HOURS_PER_WEEK   # 全体监控成员合计的每小时发推率
+        self._per_account: dict[str, list[float]] = {}
+        self._posts = 0
+        self._scale = 0.0    # 间隔 = scale / √Λ，重建时按巡视预算解出
+        self.report: dict = {}
+        self.last_interval = 0
+        self.last_rate = 0.0
+
+    @property
+    def cfg(self):
+        return settings.crawlers.global_settings.adaptive_polling
+
+    @property
+    def sleep_cfg(self):
+        return settings.crawlers.global_settings.sleep_schedule
+
+    # ---------- 历史直方图 ----------
+    def _load_history(self, since: int) -> dict[str, tuple[str, int]]:
+        """跨团体汇总目标成员的发推记录 (同一账号被多个团体监控时按推文 ID 去重)"""
+        posts = {}
+        for group in GROUPS:
+            targets = set(group.target_accounts)
+            with use_group(group):
+                try: rows = run_sql("SELECT tweet_id, LOWER(author) AS author, tweeted_at FROM tweets WHERE tweeted_at >= ?", (since,))
+                except Exception as e:
+                    logger.warning(f"⚠️ [{group.name}] 读取发推历史失败: {e}")
+                    continue
+            for r in rows:
+                if r["author"] in targets: posts[r["tweet_id"]] = (r["author"], r["tweeted_at"])
+        return posts
+
+    def rebuild(self, now: float | None = None):
+        now = now or time.time()
+        cfg = self.cfg
+        posts = self._load_history(int(now - cfg.lookback_days * 86400))
+        self._built_at, self._posts = now, len(posts)
+        if not posts:
+            self._per_account, self._rates = {}, [0.0] * HOURS_PER_WEEK
+            self.report = self._detection_report()
+            return
+
+        # 有效观测周数：部署不满 lookback_days 时按实际跨度算，避免低估发推率
+        span_days = min(cfg.lookback_days, max(1.0, (now - min(ts for _, ts in posts.values())) / 86400))
+        weeks = span_days / 7
+        how_counts: dict[str, list[int]] = {}
+        hod_counts: dict[str, list[int]] = {}
+        for author, ts in posts.values():
+            dt = datetime.fromtimestamp(ts)
+            how_counts.setdefault(author, [0] * HOURS_PER_WEEK)[_hour_of_week(dt)] += 1
+            hod_counts.setdefault(author, [0] * 24)[dt.hour] += 1
+
+        # λ = (c_周内小时 + α · c_钟点 / (7W)) / (W + α)：样本充足时贴近真实格子，稀疏时退回同钟点均值
+        per_account = {}
+        for author, how in how_counts.items():
+            hod = hod_counts[author]
+            per_account[author] = [(how[h] + SMOOTHING_WEEKS * hod[h % 24] / (7 * weeks)) / (weeks + SMOOTHING_WEEKS)
+                                   for h in range(HOURS_PER_WEEK)]
+        self._per_account = per_account
+        self._rates = [sum(r[h] for r in per_account.values()) for h in range(HOURS_PER_WEEK)]
+        self._scale = self._solve_scale()
+        self.report = self._detection_report()
+
+        top = sorted(((sum(r), a) for a, r in per_account.items()), reverse=True)[:3]
+        logger.info(f"⏱️ [巡视节奏] 已按近 {span_days:.0f} 天 {len(posts)} 条推文重建发推直方图 "
+                    f"(最活跃: {', '.join(f'@{a} {s / 7:.1f}条/天' for s, a in top)})，"
+                    f"预计发现延迟 {self.report['adaptive_delay'] / 60:.1f} 分钟 (旧版 {self.report['legacy_delay'] / 60:.1f} 分钟)，"
+                    f"每天巡视约 {self.report['adaptive_polls']:.0f} 次 (旧版 {self.report['legacy_polls']:.0f} 次)")
+
+    def _refresh(self, now: float):
+        if now - self._built_at >= REBUILD_INTERVAL_SEC: self.rebuild(now)
+
+    @property
+    def warmed_up(self) -> bool:
+        return self._posts >= MIN_HISTORY_POSTS
+
+    # ---------- 当前发推率与间隔 ----------
+    def burst_rate(self, now: float) -> float:
+        """最近一小时内目标成员的新推文数 × burst_weight：开播、返图、连发时临时提速"""
+        if not self.cfg.burst_weight: return 0.0
+        return self.cfg.burst_weight * len(self._load_history(int(now - BURST_WINDOW_SEC)))
+
+    def rate_at(self, dt: datetime) -> float:
+        return self._rates[_hour_of_week(dt)]
+
+    def interval_for(self, rate: float) -> float:
+        cfg = self.cfg
+        if rate <= 0 or self._scale <= 0: return float(cfg.max_interval_sec)
+        return min(cfg.max_interval_sec, max(cfg.min_interval_sec, self._scale / rate ** 0.5))
+
+    def _solve_scale(self) -> float:
+        """二分求 scale，使一周内清醒时段的巡视次数恰好用完 polls_per_day × 7 的预算"""
+        cfg = self.cfg
+        awake = [r for h, r in enumerate(self._rates) if self._hibernate_wait(h) is None]
+        night_polls = sum(3600 / cfg.max_interval_sec for h, r in enumerate(self._rates)
+                          if self._hibernate_wait(h) is not None and r >= cfg.night_wake_rate)
+        budget = cfg.polls_per_day * 7 - night_polls
+
+        def polls(scale: float) -> float:
+            return sum(3600 / (min(cfg.max_interval_sec, max(cfg.min_interval_sec, scale / r ** 0.5)) if r > 0 else cfg.max_interval_sec)
+                       for r in awake)
+
+        lo, hi = 1e-3, 1e7
+        for _ in range(60):
+            mid = (lo * hi) ** 0.5
+            if polls(mid) > budget: lo = mid
+            else: hi = mid
+        return hi
+
+    def in_sleep_window(self, dt: datetime) -> bool:
+        sleep_cfg = self.sleep_cfg
+        if not sleep_cfg.enable: return False
+        try: t_start, t_end = _parse_hhmm(sleep_cfg.start_time), _parse_hhmm(sleep_cfg.end_time)
+        except ValueError: return False
+        curr = dt.time()
+        return (t_start <= curr <= t_end) if t_start <= t_end else (curr >= t_start or curr <= t_end)
+
+    def should_hibernate(self) -> bool:
+        """休眠时段内是否蛰伏：成员历来在这个钟点活跃 (或刚刚连发) 时照常巡视"""
+        now = time.time()
+        dt = datetime.fromtimestamp(now)
+        if not self.in_sleep_window(dt): return False
+        if not self.cfg.enable: return True
+        self._refresh(now)
+        if not self.warmed_up: return True
+        rate = self.rate_at(dt) + self.burst_rate(now)
+        if rate < self.cfg.night_wake_rate: return True
+        logger.info(f"🌙 休眠时段内预期发推率 {rate:.2f} 条/小时 ≥ {self.cfg.night_wake_rate}，保持低频巡视。")
+        return False
+
+    def next_interval(self) -> int:
+        """下一轮巡视前的等待秒数"""
+        cfg = self.cfg
+        if not cfg.enable:
+            self.last_interval = random.randint(*LEGACY_INTERVAL)
+            return self.last_interval
+        now = time.time()
+        self._refresh(now)
+        if not self.warmed_up:
+            self.last_interval = random.randint(*LEGACY_INTERVAL)
+            return self.last_interval
+
+        dt = datetime.fromtimestamp(now)
+        rate = self.rate_at(dt) + self.burst_rate(now)
+        base = self.interval_for(rate)
+        if self.in_sleep_window(dt): base = cfg.max_interval_sec  # 能走到这里说明夜间已被唤醒，只做低频值守
+        jittered = base * (1 + random.uniform(-cfg.jitter, cfg.jitter))
+        self.last_rate = rate
+        self.last_interval = int(min(cfg.max_interval_sec, max(cfg.min_interval_sec, jittered)))
+        return self.last_interval
+
+    # ---------- 发现延迟评估 ----------
+    def _hibernate_wait(self, h: int) -> float | None:
+        """周内第 h 个小时落在休眠时段时，该小时中点发出的推文要等到苏醒的秒数；不在休眠时段返回 None"""
+        monday = datetime(2024, 1, 1)  # 任取一个周一作为周内小时的基准
+        mid = monday + timedelta(hours=h, minutes=30)
+        if not self.in_sleep_window(mid): return None
+        wake = datetime.combine(mid.date(), _parse_hhmm(self.sleep_cfg.end_time))
+        if wake <= mid: wake += timedelta(days=1)
+        return (wake - mid).total_seconds()
+
+    def _detection_report(self) -> dict:
+        """按历史发推率加权的平均发现延迟 (巡视间隔 I 下，泊松到达的推文平均等待 E[I²] / 2E[I])，与旧版节奏对照"""
+        cfg = self.cfg
+        lo, hi = LEGACY_INTERVAL
+        mean, var = (lo + hi) / 2, (hi - lo) ** 2 / 12
+        legacy_residual = (mean ** 2 + var) / (2 * mean)
+        jitter_factor = 1 + cfg.jitter ** 2 / 3
+
+        weights = self._rates if sum(self._rates) > 0 else [1.0] * HOURS_PER_WEEK
+        total = sum(weights)
+        legacy_delay = adaptive_delay = legacy_polls = adaptive_polls = 0.0
+        for h, w in enumerate(weights):
+            wait = self._hibernate_wait(h)
+            if wait is None:
+                legacy_delay += w * legacy_residual
+                legacy_polls += 3600 / mean
+                interval = self.interval_for(self._rates[h])
+            else:
+                legacy_delay += w * (wait + legacy_residual)
+                if self._rates[h] < cfg.night_wake_rate:
+                    adaptive_delay += w * (wait + legacy_residual)
+                    continue
+                interval = cfg.max_interval_sec
+            adaptive_delay += w * interval / 2 * jitter_factor
+            adaptive_polls += 3600 / interval
+        return {"adaptive_delay": adaptive_delay / total, "legacy_delay": legacy_delay / total,
+                "adaptive_polls": adaptive_polls / 7, "legacy_polls": legacy_polls / 7, "posts": self._posts}
+
+    def status_line(self) -> str:
+        if not self.cfg.enable: return ""
+        if not self.warmed_up: return f"⏱️ 巡视节奏: 历史样本不足 ({self._posts}/{MIN_HISTORY_POSTS} 条)，沿用 {LEGACY_INTERVAL[0]}~{LEGACY_INTERVAL[1]} 秒随机间隔"
+        r = self.report
+        return (f"⏱️ 巡视节奏: 上轮间隔 {self.last_interval}s (预期 {self.last_rate:.2f} 条/小时)，"
+                f"预计发现延迟 {r['adaptive_delay'] / 60:.1f} 分钟 (旧版 {r['legacy_delay'] / 60:.1f})，"
+                f"日均巡视 {r['adaptive_polls']:.0f} 次 (旧版 {r['legacy_polls']:.0f})")
+
+poll_scheduler = PollScheduler()
@@ -0,0 +1,128 @@
+import sys
+import time
+import random
+import logging
+from pathlib import Path
+from datetime import datetime
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from common.config_loader import settings, CrawlerPlatformConfig
+from common.state_manager import is_processed
+from common.tweet_record import TweetRecord
+from Bot_Crawler.twitter_scraper import fetch_timeline, TIMELINE_KIND, USER_KIND
+from Bot_Crawler.tweet_parser import parse_captures
+from Bot_Crawler.capture_store import capture_store, entry_tweet_ids
+from Bot_Crawler.backfill import snowflake_time
+from Bot_Crawler.media_planner import fetch_planned_media
+from Bot_Crawler.poll_scheduler import poll_scheduler, LEGACY_INTERVAL
+
+logger = logging.getLogger("GloBot_Sources")
+
+MAX_PAGES_PER_BATCH = 50  # 单轮最多合并化验的抓包分页数 (停机积压时分批追平)
+
+# ==========================================
+# 🔌 信息源适配器
+# 旧版只有推特一条路径，抓取、游标、化验全部写死在 main.crawler_engine 里，
+# config.yaml 里的 tiktok / instagram / youtube 开关形同虚设。
+# 现在每个平台实现一个适配器：fetch 巡视并返回待化验的批次，parse 按当前团体化验成通用的 TweetRecord
+# (引用链拼好、media_refs 待下载)，plan_media 按平台抓取开关规划下载。
+# main 为每个启用的适配器各开一个雷达引擎，节奏互相独立，产物汇入同一套车道与去重表：
+# 新增平台不会拖慢推特巡视。记录 ID 与推特共用去重表，非推特平台请自带前缀 (如 "yt:<视频ID>") 避免撞号。
+# ==========================================
+class SourceAdapter:
+    name = ""            # 对应 config.yaml 中 crawlers.<name> 配置段
+    label = ""           # 日志与告警里的平台名
+    first_run_flag = ""  # 首发截断标记文件 (团体数据目录下)，每个平台各自首发一次
+
+    @property
+    def cfg(self) -> CrawlerPlatformConfig:
+        return getattr(settings.crawlers, self.name)
+
+    @property
+    def enabled(self) -> bool:
+        return self.cfg.enable
+
+    async def fetch(self):
+        """巡视一轮，返回待化验的批次 (内容由适配器自定)，没有可化验的返回 None；
+        由调用方包在 run_stage("crawl") 里，账号失效请抛出含 AUTH_EXPIRED 的 RuntimeError"""
+        raise NotImplementedError
+
+    async def parse(self, batch) -> list[TweetRecord]:
+        """按当前团体化验批次，只返回未处理过的监控动态；不下载媒体"""
+        raise NotImplementedError
+
+    async def plan_media(self, tweets: list[TweetRecord]):
+        """按本平台的抓取开关规划并下载媒体，结果写回各节点的 media"""
+        await fetch_planned_media(tweets, self.name)
+
+    def commit(self, batch):
+        """本批次在全部团体化验成功后调用，适配器在此推进自己的游标"""
+
+    def describe(self, batch) -> str:
+        return self.label
+
+    def should_hibernate(self) -> bool:
+        return poll_scheduler.in_sleep_window(datetime.now())
+
+    def next_interval(self) -> int:
+        return random.randint(*LEGACY_INTERVAL)
+
+class XTwitterAdapter(SourceAdapter):
+    """推特【正在关注】信息流 (及开启后的重点成员账号页)：热浏览器截获的分页落进抓包归档，按归档游标分批化验"""
+    name, label = "x_twitter", "推特"
+    first_run_flag = ".first_run_completed"  # 沿用旧版文件名，已部署的实例不会再触发一次首发截断
+
+    def __init__(self):
+        self.cursor = capture_store.latest_of(TIMELINE_KIND)  # 化验游标：已经化验过的最新一份抓包归档
+
+    async def fetch(self) -> list[int] | None:
+        await fetch_timeline()
+        # 📚 取走上次化验之后落盘的全部分页 (含滚动翻页与上一轮迟到的响应)，一页都不丢
+        # 本轮没有新包时回看最近一份归档，上一轮化验超时未入库的推文在这里补上
+        # 只取【正在关注】与账号页时间线：历史补录的搜索结果归档由补录引擎按限速自行消化
+        batch = capture_store.after(self.cursor, (TIMELINE_KIND, USER_KIND))[:MAX_PAGES_PER_BATCH]
+        if not batch and (latest := capture_store.latest_of(TIMELINE_KIND)) is not None: batch = [latest]
+        return batch or None
+
+    async def parse(self, batch: list[int]) -> list[TweetRecord]:
+        kinds = capture_store.kinds(batch)
+        if USER_KIND not in kinds.values(): return await parse_captures(batch, fetch_media=False)
+        # 👤 账号页里的置顶与部署前的旧推从没进过去重表：信息流里没出现过的，只收 max_age_min 分钟内发出的
+        home_ids = set()
+        for cid, kind in kinds.items():
+            if kind != TIMELINE_KIND: continue
+            try: home_ids.update(entry_tweet_ids(capture_store.read_raw(cid)))
+            except FileNotFoundError: pass
+        cutoff = time.time() - settings.crawlers.global_settings.account_timelines.max_age_min * 60
+        skip = lambda tid: is_processed(tid) or (int(tid) not in home_ids and snowflake_time(tid) < cutoff)
+        return await parse_captures(batch, fetch_media=False, skip=skip)
+
+    def commit(self, batch: list[int]):
+        self.cursor = max(batch[-1], self.cursor or 0)
+
+    def describe(self, batch: list[int]) -> str:
+        return f"capture #{batch[0]}~#{batch[-1]}"
+
+    # ⏱️ 巡视间隔与夜间蛰伏由各成员的历史发推率决定 (Bot_Crawler/poll_scheduler)
+    def should_hibernate(self) -> bool:
+        return poll_scheduler.should_hibernate()
+
+    def next_interval(self) -> int:
+        return poll_scheduler.next_interval()
+
+# 新平台在这里登记：crawlers.<name>.enable 打开后由 main 拉起独立的雷达引擎
+ADAPTERS: dict[str, type[SourceAdapter]] = {
+    "x_twitter": XTwitterAdapter,
+}
+
+def build_adapters() -> list[SourceAdapter]:
+    """实例化所有已启用的信息源；开关打开但尚无适配器的平台只告警不报错"""
+    adapters = []
+    for name in type(settings.crawlers).model_fields:
+        cfg = getattr(settings.crawlers, name)
+        if not isinstance(cfg, CrawlerPlatformConfig) or not cfg.enable: continue
+        if name not in ADAPTERS:
+            logger.warning(f"⚠️ crawlers.{name} 已开启，但该平台还没有信息源适配器，暂时忽略。")
+            continue
+        adapters.append(ADAPTERS[name]())
+    return adapters
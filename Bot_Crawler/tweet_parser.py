@@ -1,33 +1,19 @@
 import json
-import sqlite3
-import os
 import sys
 import asyncio
 import time
 import re
 from pathlib import Path
 from datetime import datetime
+from dataclasses import replace
 
 sys.path.append(str(Path(__file__).resolve().parent.parent))
-from common.config_loader import settings
-from Bot_Crawler.media_downloader import download_media  
-
-FACTORY_DIR = Path(os.getenv("LOCAL_DATA_DIR", f"./GloBot_Data/{settings.targets.group_name}"))
-DB_PATH = FACTORY_DIR / "processed_tweets.db"
-
-def init_db():
-    FACTORY_DIR.mkdir(parents=True, exist_ok=True)
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS tweets (
-            tweet_id TEXT PRIMARY KEY,
-            author TEXT,
-            extracted_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-    ''')
-    conn.commit()
-    return conn
+from common.state_manager import is_processed
+from common.group_context import current_group
+from common.tweet_record import TweetRecord, MediaRef
+from Bot_Crawler.capture_store import capture_store, json_loads
+from Bot_Crawler.capture_prefilter import prefilter
+from Bot_Crawler.media_planner import estimate_bytes, fetch_planned_media
 
 def find_tweets(obj):
     if isinstance(obj, dict):
@@ -52,13 +38,63 @@ def find_key(obj, target_key):
             if res is not None: return res
     return None
 
+# ==========================================
+# 🧭 按时间线骨架直达推文 (instructions -> entries -> itemContent)
+# 不再递归扫描整棵响应树；骨架不认识时才退回 find_tweets 全树扫描
+# ==========================================
+TIMELINE_PATHS = (
+    ("data", "home", "home_timeline_urt", "instructions"),
+    ("data", "user", "result", "timeline_v2", "timeline", "instructions"),
+    ("data", "user", "result", "timeline", "timeline", "instructions"),
+    ("data", "search_by_raw_query", "search_timeline", "timeline", "instructions"),
+)
+
+def dig(obj, path):
+    for key in path:
+        if not isinstance(obj, dict): return None
+        obj = obj.get(key)
+    return obj
+
+def unwrap_result(result) -> dict:
+    """受限可见推文外面会多包一层 TweetWithVisibilityResults"""
+    if result and result.get('__typename') == 'TweetWithVisibilityResults':
+        return result.get('tweet', {})
+    return result or {}
+
+def iter_timeline_results(data):
+    instructions = next((ins for path in TIMELINE_PATHS if isinstance(ins := dig(data, path), list)), None)
+    if instructions is None:
+        yield from find_tweets(data)
+        return
+    for ins in instructions:
+        # TimelineAddEntries 带 entries，TimelinePinEntry 只带单个 entry
+        entries = ins.get('entries') or ([ins['entry']] if 'entry' in ins else [])
+        for entry in entries:
+            content = entry.get('content', {})
+            if 'itemContent' in content:
+                item_contents = [content['itemContent']]
+            else:
+                # 对话模块 (TimelineTimelineModule) 把回复串平铺在 items 里
+                item_contents = [i.get('item', {}).get('itemContent', {}) for i in content.get('items', [])]
+            for ic in item_contents:
+                result = ic.get('tweet_results', {}).get('result')
+                if result: yield result
+
+def _user_names(node) -> tuple:
+    """作者 screen_name 与显示名：新版接口放在 user.core，旧版放在 user.legacy"""
+    user = dig(node, ('core', 'user_results', 'result')) or {}
+    screen_name = dig(user, ('core', 'screen_name')) or dig(user, ('legacy', 'screen_name'))
+    name = dig(user, ('core', 'name')) or dig(user, ('legacy', 'name'))
+    if screen_name is None:
+        screen_name, name = find_key(node.get('core', {}), 'screen_name'), find_key(node.get('core', {}), 'name')
+    return screen_name, name
+
 def extract_tweet_node(node):
     tweet_id = str(node.get('rest_id', ''))
     legacy = node.get('legacy', {})
-    raw_screen_name = find_key(node.get('core', {}), 'screen_name')
+    raw_screen_name, raw_display_name = _user_names(node)
     author_screen_name = str(raw_screen_name).lower() if raw_screen_name else ''
     
-    raw_display_name = find_key(node.get('core', {}), 'name')
     author_display_name = str(raw_display_name) if raw_display_name else f"@{author_screen_name}"    
     
     raw_reply_name = legacy.get('in_reply_to_screen_name')
@@ -80,7 +116,7 @@ def extract_tweet_node(node):
     if legacy.get('in_reply_to_status_id_str'):
         full_text = re.sub(r'^(@\w+\s*)+', '', full_text).strip()
 
-    media_files = legacy.get('extended_entities', {}).get('media', [])
+    media_refs = extract_media_refs(legacy.get('extended_entities', {}).get('media', []))
     
     raw_created_at = legacy.get('created_at', '')
     try:
@@ -89,22 +125,45 @@ def extract_tweet_node(node):
     except:
         timestamp_sec = int(time.time()) 
         
-    return {
-        'id': tweet_id,
-        'author': author_screen_name,
-        'author_display_name': author_display_name,
-        'text': full_text,
-        'media_files_raw': media_files,
-        'timestamp': timestamp_sec,
-        'in_reply_to_screen_name': in_reply_to_screen_name,
-        'in_reply_to_status_id_str': in_reply_to_status_id_str,
-        'raw_node': node
-    }
+    return TweetRecord(
+        id=tweet_id,
+        author=author_screen_name,
+        author_display_name=author_display_name,
+        text=full_text,
+        media_refs=media_refs,
+        timestamp=timestamp_sec,
+        in_reply_to_screen_name=in_reply_to_screen_name,
+        in_reply_to_status_id_str=in_reply_to_status_id_str,
+    )
+
+def extract_media_refs(media_files: list) -> list[MediaRef]:
+    """只摘出下载要用的地址与附言，不再挂着整段 extended_entities"""
+    refs = []
+    for media in media_files:
+        if media.get('type') == 'photo':
+            refs.append(MediaRef('photo', media['media_url_https'] + "?name=orig", media_key=media.get('media_key', ''),
+                                 alt=(media.get('ext_alt_text') or '').strip(), est_bytes=estimate_bytes(media)))
+        elif media.get('type') in ['video', 'animated_gif']:
+            video_info = media.get('video_info', {})
+            mp4_variants = [v for v in video_info.get('variants', []) if v.get('content_type') == 'video/mp4' and 'bitrate' in v]
+            if not mp4_variants: continue
+            best_video = max(mp4_variants, key=lambda x: x['bitrate'])
+            refs.append(MediaRef(media['type'], best_video['url'], media_key=media.get('media_key', ''),
+                                 bitrate=best_video['bitrate'], duration_ms=video_info.get('duration_millis', 0),
+                                 est_bytes=estimate_bytes(media)))
+    return refs
+
+def load_raw_node(record: TweetRecord) -> dict | None:
+    """按引用回查推文的原始 GraphQL 子树 (排查用)；归档已被滚动清理时返回 None"""
+    if record.capture_id is None: return None
+    try: data = capture_store.load(record.capture_id)
+    except FileNotFoundError: return None
+    return next((t for t in find_tweets(data) if str(t.get('rest_id')) == record.id), None)
 
 # ==========================================
 # 🧬 新增：节点原生身份鉴定器
 # ==========================================
-def get_node_type(n_info, raw_node, target_accounts):
+def get_node_type(n_info: TweetRecord, raw_node, target_accounts):
     legacy = raw_node.get('legacy', {})
     
     # 1. 如果它是转推
@@ -112,7 +171,7 @@ def get_node_type(n_info, raw_node, target_accounts):
         return 'RETWEET'
         
     # 2. 如果它是对内部账号的回复
-    reply_user = n_info.get('in_reply_to_screen_name')
+    reply_user = n_info.in_reply_to_screen_name
     if reply_user and reply_user in target_accounts:
         return 'REPLY'
         
@@ -123,156 +182,151 @@ def get_node_type(n_info, raw_node, target_accounts):
     # 4. 兜底：独立原创推文
     return 'ORIGINAL'
 
+async def parse_captures(capture_ids: list[int], fetch_media: bool = True, skip=is_processed) -> list:
+    """从原始抓包归档 (Bot_Crawler/capture_store) 取料，一次巡视截获的多页信息流合并化验；
+    fetch_media=False 时只拼装引用链，媒体留给调用方按规划下载 (见 media_planner.fetch_planned_media)"""
+    print(f"🔬 正在化验矿石: 抓包归档 {', '.join(f'#{c}' for c in capture_ids)}")
+    pages, loaded_ids = [], []
+    for cid in capture_ids:
+        try: raw = capture_store.read_raw(cid)
+        except FileNotFoundError as e:
+            print(f"⚠️ {e}")
+            continue
+        # 🧹 字节级预筛：没有未入库的监控推文就不解码
+        if not prefilter(cid, raw): continue
+        pages.append(json_loads(raw))
+        loaded_ids.append(cid)
+    if not pages:
+        print(f"🧹 [预筛] {len(capture_ids)} 份抓包均无新的监控推文，跳过化验。")
+        return []
+    if fetch_media: return await parse_timeline_pages(pages, loaded_ids, skip)
+    return assemble_chains(pages, loaded_ids, skip)
+
 async def parse_timeline_json(json_file_path: Path) -> list:
+    """兼容旧版落盘的 JSON 文件 (离线排查用)"""
     print(f"🔬 正在化验矿石: {json_file_path.name}")
-    with open(json_file_path, "r", encoding="utf-8") as f: data = json.load(f)
+    return await parse_timeline_pages([json_loads(json_file_path.read_bytes())])
+
+def index_timeline(pages: list, target_accounts, capture_ids: list | None = None) -> tuple[dict, dict, dict]:
+    """
+    单遍建索引：沿时间线骨架取出每条推文，连同其转推/引用子树逐个登记，每个节点只提取一次。
+    返回 (nodes, quotes, retweets)：nodes 为 ID -> TweetRecord，后两者记录 ID -> 被引用/被转推的 ID。
+    多页合并时同一 ID 只保留第一次出现的节点；capture_ids 与 pages 一一对应，记入节点供回查原始 JSON。
+    """
+    nodes, quotes, retweets = {}, {}, {}
+    capture_id = None
+
+    def register(result) -> str | None:
+        node = unwrap_result(result)
+        if 'legacy' not in node or 'rest_id' not in node: return None
+        tid = str(node['rest_id'])
+        if tid not in nodes:
+            info = extract_tweet_node(node)
+            info.node_type = get_node_type(info, node, target_accounts)
+            info.capture_id = capture_id
+            nodes[tid] = info
+        # 同一条推文的不同出场可能一处带引用子树、一处不带，缺的补上
+        rt = node['legacy'].get('retweeted_status_result')
+        if rt and tid not in retweets:
+            rt_id = register(rt.get('result'))
+            if rt_id: retweets[tid] = rt_id
+        q = node.get('quoted_status_result')
+        if q and tid not in quotes:
+            q_id = register(q.get('result'))
+            if q_id: quotes[tid] = q_id
+        return tid
 
-    conn = init_db()
-    cursor = conn.cursor()
-    target_accounts = [acc.lower() for acc in settings.targets.x_accounts]
+    for data, capture_id in zip(pages, capture_ids or [None] * len(pages)):
+        for result in iter_timeline_results(data):
+            register(result)
+    return nodes, quotes, retweets
+
+async def parse_timeline_pages(pages: list, capture_ids: list | None = None, skip=is_processed) -> list[TweetRecord]:
+    """拼装引用链并下载规划内的媒体"""
+    parsed_new_tweets = assemble_chains(pages, capture_ids, skip)
+    await fetch_planned_media(parsed_new_tweets)
+    if parsed_new_tweets: print(f"\n✅ 提纯与下载全部完成！共提取 {len(parsed_new_tweets)} 条全新动态。")
+    return parsed_new_tweets
+
+def assemble_chains(pages: list, capture_ids: list | None = None, skip=is_processed) -> list[TweetRecord]:
+    """返回当前团体未处理过的监控推文，quote_chain 已拼好，media_refs 待下载"""
+    # 多团体托管：同一份时间线矿石按当前团体的监控名单分别化验
+    # skip 判定推文是否已处理过：实时巡视查去重表，历史补录只排除已发布或已在车道里的 (见 Bot_Crawler/backfill)
+    target_accounts = current_group().target_accounts
     parsed_new_tweets = []
 
-    all_raw_tweets = list(find_tweets(data))
-    all_nodes_dict = {}
-    
     # 🌟 第一步：扫描全场，给每一个推文打上不可篡改的 Node Type 钢印！
-    for t_node in all_raw_tweets:
-        n_info = extract_tweet_node(t_node)
-        n_info['node_type'] = get_node_type(n_info, t_node, target_accounts)
-        all_nodes_dict[n_info['id']] = n_info
+    nodes, quotes, retweets = index_timeline(pages, target_accounts, capture_ids)
 
-    for tweet_node in all_raw_tweets:
-        target_info = extract_tweet_node(tweet_node)
-        target_info['node_type'] = get_node_type(target_info, tweet_node, target_accounts)
-        
-        if target_info['author'] not in target_accounts: continue
+    for tid, node_info in nodes.items():
+        if node_info.author not in target_accounts: continue
 
         # 🚨 痛点修复：彻底忽略对外部路人的回复
-        reply_to_user = target_info.get('in_reply_to_screen_name')
+        reply_to_user = node_info.in_reply_to_screen_name
         if reply_to_user and reply_to_user not in target_accounts:
             continue
 
-        cursor.execute("SELECT 1 FROM tweets WHERE tweet_id = ?", (target_info['id'],))
-        if cursor.fetchone(): continue
+        if skip(tid): continue
 
+        # 节点在多条链之间共享，拼装与下载会就地改写字段，一律取副本
+        target_info = replace(node_info)
         quote_chain = []
-        curr_node = tweet_node
+        curr_id = tid
 
         # ==========================================
         # 🔗 第二步：按原生身份进行套娃拼装 (绝不篡改祖先的 node_type)
         # ==========================================
-        if target_info['node_type'] == 'RETWEET':
-            target_info['text'] = ""
-            target_info['media_files_raw'] = []
+        if target_info.node_type == 'RETWEET':
+            target_info.text = ""
+            target_info.media_refs = []
             
-            rt_res = tweet_node['legacy']['retweeted_status_result'].get('result', {})
-            if rt_res.get('__typename') == 'TweetWithVisibilityResults':
-                rt_res = rt_res.get('tweet', {})
-                
-            if rt_res and 'legacy' in rt_res:
-                rt_info = extract_tweet_node(rt_res)
-                rt_info['node_type'] = get_node_type(rt_info, rt_res, target_accounts)
-                rt_info['is_placeholder'] = False
-                quote_chain.insert(0, rt_info)
-                curr_node = rt_res 
-            else:
-                continue 
+            rt_id = retweets.get(tid)
+            if not rt_id: continue
+            quote_chain.insert(0, replace(nodes[rt_id]))
+            curr_id = rt_id
         else:
             # 1. 挖掘回复链
-            if target_info['node_type'] == 'REPLY':
-                curr_reply_id = target_info.get('in_reply_to_status_id_str')
+            if target_info.node_type == 'REPLY':
+                curr_reply_id = target_info.in_reply_to_status_id_str
                 while curr_reply_id:
-                    if curr_reply_id in all_nodes_dict:
+                    if curr_reply_id in nodes:
                         # 直接把字典里打好钢印的原生节点拉进来，拒绝株连篡改！
-                        anc_info = dict(all_nodes_dict[curr_reply_id]) 
-                        anc_info['is_placeholder'] = False
+                        anc_info = replace(nodes[curr_reply_id])
                         quote_chain.insert(0, anc_info)
-                        curr_reply_id = anc_info.get('in_reply_to_status_id_str')
+                        curr_reply_id = anc_info.in_reply_to_status_id_str
                     else:
-                        quote_chain.insert(0, {
-                            'id': curr_reply_id,
-                            'author': reply_to_user,
-                            'author_display_name': f"@{reply_to_user}",
-                            'text': "(回复溯源占位符)",
-                            'timestamp': target_info['timestamp'] - 1,
-                            'media_files_raw': [],
-                            'node_type': 'ORIGINAL', # 占位符一律视为原创
-                            'is_placeholder': True
-                        })
+                        # 占位符一律视为原创
+                        quote_chain.insert(0, TweetRecord.placeholder(curr_reply_id, reply_to_user, target_info.timestamp - 1))
                         break
 
         # 2. 挖掘引用链 (向上深挖多层)
-        while True:
-            q_res = curr_node.get('quoted_status_result', {}).get('result', {})
-            if q_res.get('__typename') == 'TweetWithVisibilityResults':
-                q_res = q_res.get('tweet', {})
-                
-            if not q_res or 'legacy' not in q_res:
-                break
-                
-            q_info = extract_tweet_node(q_res)
-            q_info['node_type'] = get_node_type(q_info, q_res, target_accounts)
-            q_info['is_placeholder'] = False
+        seen = {tid} | {n.id for n in quote_chain}
+        while (q_id := quotes.get(curr_id)) and q_id not in seen:
+            q_info = replace(nodes[q_id])
             
-            if not quote_chain and target_info['node_type'] != 'RETWEET':
-                target_info['quoted_tweet_id'] = q_info['id']
-                target_info['quoted_text'] = q_info['text']
+            if not quote_chain and target_info.node_type != 'RETWEET':
+                target_info.quoted_tweet_id = q_info.id
+                target_info.quoted_text = q_info.text
                 
             quote_chain.insert(0, q_info)
-            curr_node = q_res
+            seen.add(q_id)
+            curr_id = q_id
 
-        # 🖼️ 为链条上的每一个真实节点下载媒体文件
         all_nodes = quote_chain + [target_info]
         for node in all_nodes:
-            if node.get('is_placeholder') or node.get('node_type') == 'RETWEET':
-                node['media'] = []
-                continue
+            photos = [ref for ref in node.media_refs if ref.kind == 'photo']
+            alt_texts = [f"【图{i}附言】\n{ref.alt}" for i, ref in enumerate(photos, 1) if ref.alt]
+            if alt_texts and not node.is_placeholder and node.node_type != 'RETWEET':
+                node.text += "\n\n" + "\n\n".join(alt_texts)
 
-            member_media_dir = FACTORY_DIR / "media" / node['author']
-            member_media_dir.mkdir(parents=True, exist_ok=True)
-            local_media = []
-            img_count = 1
-            alt_texts = [] 
-            
-            for media in node['media_files_raw']:
-                if media['type'] == 'photo':
-                    orig_url = media['media_url_https'] + "?name=orig"
-                    filename = f"{node['id']}_img{img_count}.jpg"
-                    if await download_media(orig_url, member_media_dir, filename):
-                        local_media.append(str(member_media_dir / filename))
-                    
-                    alt = media.get('ext_alt_text')
-                    if alt:
-                        alt_texts.append(f"【图{img_count}附言】\n{alt.strip()}")
-                        
-                    img_count += 1
-                elif media['type'] in ['video', 'animated_gif']:
-                    variants = media.get('video_info', {}).get('variants', [])
-                    mp4_variants = [v for v in variants if v.get('content_type') == 'video/mp4' and 'bitrate' in v]
-                    if mp4_variants:
-                        best_video = sorted(mp4_variants, key=lambda x: x['bitrate'], reverse=True)[0]
-                        vid_url = best_video['url']
-                        filename = f"{node['id']}_video.mp4"
-                        if await download_media(vid_url, member_media_dir, filename):
-                            local_media.append(str(member_media_dir / filename))
-            
-            node['media'] = local_media
-            if alt_texts: node['text'] += "\n\n" + "\n\n".join(alt_texts)
-
-        cursor.execute("INSERT INTO tweets (tweet_id, author) VALUES (?, ?)", (target_info['id'], target_info['author']))
-        conn.commit()
-
-        target_info['quote_chain'] = quote_chain
+        # 去重登记推迟到入队时与任务写入同一事务完成 (见 common/job_queue.enqueue)，防止入队前崩溃导致推文永久丢失
+        target_info.quote_chain = quote_chain
         parsed_new_tweets.append(target_info)
 
-    conn.close()
-    if parsed_new_tweets: print(f"\n✅ 提纯与下载全部完成！共提取 {len(parsed_new_tweets)} 条全新动态。")
     return parsed_new_tweets
 
 if __name__ == "__main__":
-    raw_dir = FACTORY_DIR / "timeline_raw"
-    json_files = list(raw_dir.glob("*.json"))
-    if json_files:
-        latest_json = max(json_files, key=os.path.getmtime)
-        res = asyncio.run(parse_timeline_json(latest_json))
-        print(f"\n测试返回数据预览: {json.dumps(res, ensure_ascii=False, indent=2)}")
\ No newline at end of file
+    latest = capture_store.latest()
+    if latest is not None:
+        res = asyncio.run(parse_captures([latest]))
+        print(f"\n测试返回数据预览: {json.dumps([t.to_payload() for t in res], ensure_ascii=False, indent=2)}")
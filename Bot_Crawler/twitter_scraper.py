@@ -4,50 +4,180 @@ import os
 import sys
 import logging
 import random
-from datetime import datetime
+import time
+import subprocess
+import functools
+from collections import Counter
+from urllib.parse import urlsplit, quote
 from pathlib import Path
 
 sys.path.append(str(Path(__file__).resolve().parent.parent))
 
-from playwright.async_api import async_playwright, Response
+from playwright.async_api import async_playwright, Response, Route
 from common.config_loader import settings
+from common.group_context import GROUPS
+from Bot_Crawler.capture_store import capture_store, entry_tweet_ids
 
 logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
 logger = logging.getLogger(__name__)
 
 AUTH_FILE = Path(__file__).resolve().parent.parent / "auth_store" / "twitter_auth.json"
 
-DATA_DIR = Path(os.getenv("LOCAL_DATA_DIR", f"./GloBot_Data/{settings.targets.group_name}")) / "timeline_raw"
+DATA_DIR = capture_store.root  # 原始抓包归档目录 (见 capture_store)
 DATA_DIR.mkdir(parents=True, exist_ok=True)
 
 BROWSER_CACHE_DIR = Path(os.getenv("LOCAL_DATA_DIR", f"./GloBot_Data/{settings.targets.group_name}")) / "browser_profile"
 BROWSER_CACHE_DIR.mkdir(parents=True, exist_ok=True)
 
-async def handle_response(response: Response):
-    if "graphql" in response.url and "HomeLatestTimeline" in response.url:
+TIMELINE_KIND = "HomeLatestTimeline"
+SEARCH_KIND = "SearchTimeline"
+USER_KIND = "UserTweets"
+
+async def handle_response(response: Response) -> int | None:
+    """截获【正在关注】信息流并原样压缩归档，返回 capture_id；游标探针包与非目标响应返回 None"""
+    if "graphql" in response.url and TIMELINE_KIND in response.url:
         try:
-            json_data = await response.json()
-            
-            # 🚨 止血补丁：质量检测防线
-            # 推特的纯游标废包通常在 1~2KB 左右。真实包含推文的包必定包含 'legacy' 字段。
-            json_str = json.dumps(json_data)
-            if 'legacy' not in json_str and len(json_str) < 5000:
-                logger.debug(f"⚠️ 丢弃了一个无推文的游标探针包 (大小: {len(json_str)} bytes)")
-                return
-                
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            save_path = DATA_DIR / f"timeline_following_{timestamp}.json"
-            with open(save_path, "w", encoding="utf-8") as f:
-                json.dump(json_data, f, ensure_ascii=False, indent=2)
-            logger.info(f"🎯 成功截获纯净版【正在关注】信息流！(有效净荷: {len(json_str)} bytes)")
+            # 直接取响应原始字节：不再解析、不再为量体积整包 dumps、也不再美化重写
+            return capture_store.save(await response.body(), TIMELINE_KIND)
         except Exception as e:
-            pass
+            logger.debug(f"⚠️ 信息流归档失败: {e}")
+    return None
+
+async def handle_search_response(response: Response) -> int | None:
+    """截获搜索结果页 (历史补录用)，同样原样归档"""
+    if "graphql" in response.url and SEARCH_KIND in response.url:
+        try: return capture_store.save(await response.body(), SEARCH_KIND)
+        except Exception as e: logger.debug(f"⚠️ 搜索结果归档失败: {e}")
+    return None
 
-async def fetch_timeline():
-    logger.info("🚀 唤醒隐身拟人内核，潜入 X 主页提取最新动态...")
+async def handle_user_response(response: Response) -> int | None:
+    """截获成员主页的 UserTweets 时间线 (账号页模式)，同样原样归档"""
+    if "graphql" in response.url and f"/{USER_KIND}?" in response.url:
+        try: return capture_store.save(await response.body(), USER_KIND)
+        except Exception as e: logger.debug(f"⚠️ 账号页时间线归档失败: {e}")
+    return None
+
+# 🚨 止血点：抛弃第三方库，直接使用原生底层注入，抹除三大致命风控特征！
+STEALTH_SCRIPT = """
+    // 1. 抹除无头浏览器最致命的 webdriver 标记
+    Object.defineProperty(navigator, 'webdriver', { get: () => undefined });
+    
+    // 2. 伪装 Chrome 插件特征
+    Object.defineProperty(navigator, 'plugins', { get: () => [1, 2, 3] });
     
-    async with async_playwright() as p:
-        context = await p.chromium.launch_persistent_context(
+    // 3. 伪装 Chrome 运行时环境
+    window.navigator.chrome = { runtime: {} };
+"""
+
+NAVIGATION_WAIT_SEC = 15   # 整页导航后等待首个信息流包的时间
+MAX_IN_PLACE_MISSES = 3    # 连续几轮就地刷新没有新包后，整页重开一次
+
+def _browser_rss_mb() -> float:
+    """统计本进程派生的 Playwright 驱动与 Chromium 进程树的常驻内存 (MB)；ps 不可用时返回 0"""
+    try:
+        out = subprocess.run(["ps", "-A", "-o", "pid=,ppid=,rss=,args="], capture_output=True, text=True, timeout=5).stdout
+    except Exception:
+        return 0.0
+    children, info = {}, {}
+    for line in out.splitlines():
+        parts = line.split(None, 3)
+        if len(parts) < 3 or not parts[0].isdigit(): continue
+        pid, ppid, rss = int(parts[0]), int(parts[1]), int(parts[2])
+        info[pid] = (rss, parts[3].lower() if len(parts) > 3 else "")
+        children.setdefault(ppid, []).append(pid)
+    total, stack = 0, list(children.get(os.getpid(), []))
+    while stack:
+        pid = stack.pop()
+        rss, args = info[pid]
+        # 只统计浏览器相关进程，FFmpeg 等临时子进程不计入
+        if "chrom" in args or "playwright" in args: total += rss
+        stack.extend(children.get(pid, []))
+    return total / 1024
+
+# ==========================================
+# 🚧 抓包模式资源拦截
+# 被掐断的请求拿不到真实体积，节省量按下表的经验单价 (字节, 毫秒) 估算，仅供观察趋势。
+# ==========================================
+BLOCKED_COST_ESTIMATE = {
+    "image": (60_000, 40), "media": (400_000, 250), "font": (40_000, 20), "third_party": (25_000, 60),
+}
+
+class CaptureFilter:
+    def __init__(self):
+        self.blocked: Counter = Counter()
+        self.allowed = 0
+
+    def classify(self, url: str, resource_type: str) -> str | None:
+        """返回拦截类别；放行返回 None"""
+        cfg = settings.crawlers.global_settings.capture_filter
+        if not cfg.enable or url.startswith(("data:", "blob:")): return None
+        if any(p in url for p in cfg.allow_patterns): return None
+        host = urlsplit(url).hostname or ""
+        if not any(host == h or host.endswith("." + h) for h in cfg.first_party_hosts): return "third_party"
+        return resource_type if resource_type in cfg.block_types else None
+
+    async def route(self, route: Route):
+        kind = self.classify(route.request.url, route.request.resource_type)
+        if kind is None:
+            self.allowed += 1
+            await route.continue_()
+        else:
+            self.blocked[kind] += 1
+            await route.abort()
+
+    def summary(self) -> str:
+        """本轮拦截统计，并清零计数器"""
+        total = sum(self.blocked.values())
+        saved_bytes = sum(BLOCKED_COST_ESTIMATE.get(k, (0, 0))[0] * n for k, n in self.blocked.items())
+        saved_ms = sum(BLOCKED_COST_ESTIMATE.get(k, (0, 0))[1] * n for k, n in self.blocked.items())
+        detail = " / ".join(f"{k} {n}" for k, n in self.blocked.most_common())
+        text = f"放行 {self.allowed} 个请求，拦截 {total} 个" + (f" ({detail})，约省 {saved_bytes / 1024:.0f} KB / {saved_ms} ms" if total else "")
+        self.blocked.clear()
+        self.allowed = 0
+        return text
+
+# ==========================================
+# 🔥 常驻热浏览器
+# 旧版每轮巡视都冷启动一个持久化 Chromium、注入脚本、导航主页、切换标签并混沌等待 10~20 秒。
+# 现在浏览器与页面常驻：每轮只需回到顶部再点一次【正在关注】，X 会就地拉取新的 HomeLatestTimeline，
+# 响应一到立即返回。浏览器按存活时间与内存占用定期回收重启，防止 Chromium 长跑泄漏。
+# ==========================================
+class WarmTimeline:
+    def __init__(self):
+        self._pw = None
+        self.context = None
+        self.page = None
+        self.search_page = None   # 历史补录专用标签页，不打扰主页信息流的滚动位置
+        self.home_ready = False   # 主标签页是否已停在【正在关注】
+        self.lock = asyncio.Lock()  # 巡视与补录搜索共用一个浏览器，轮流使用
+        self.launched_at = 0.0
+        self.dirty = False  # 上一轮被取消或异常中断，页面状态不可信，下轮先重启
+        self.misses = 0     # 连续未截获新包的轮数
+        self.high_water: int | None = None  # 已截获的最新推文 ID (高水位)，下滑追赶到它为止
+        self.account_pages: list = []       # 账号页标签池 (见 _capture_accounts)
+        self.account_seen: dict[str, float] = {}  # 账号 -> 上次抓取账号页的时刻 (monotonic)
+        self._page_waiters: dict = {}       # 账号页标签 -> 正在等待的 Future
+        self._hwm_loaded = False
+        self._waiter: asyncio.Future | None = None
+        self.filter = CaptureFilter()
+
+    def _resolve(self, capture_id: int | None):
+        if capture_id and self._waiter and not self._waiter.done():
+            self._waiter.set_result(capture_id)
+
+    async def _on_response(self, response: Response):
+        self._resolve(await handle_response(response))
+
+    async def _on_page_response(self, page, handler, response: Response):
+        """补录标签与账号页标签各自只认自己的等待者，主页信息流的后台响应不会被错当成搜索结果"""
+        capture_id = await handler(response)
+        waiter = self._page_waiters.get(page)
+        if capture_id and waiter and not waiter.done(): waiter.set_result(capture_id)
+
+    async def _launch(self):
+        logger.info("🚀 唤醒隐身拟人内核，冷启动常驻浏览器...")
+        self._pw = await async_playwright().start()
+        self.context = await self._pw.chromium.launch_persistent_context(
             user_data_dir=str(BROWSER_CACHE_DIR),
             headless=True,
             args=[
@@ -59,59 +189,280 @@ async def fetch_timeline():
             viewport={'width': 1280, 'height': 800},
             user_agent="Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/122.0.0.0 Safari/537.36"
         )
+        self.launched_at = time.monotonic()
+        self.page = self.context.pages[0] if self.context.pages else await self.context.new_page()
+        await self.page.add_init_script(STEALTH_SCRIPT)
         
-        page = context.pages[0] if context.pages else await context.new_page()
-        
-        # 🚨 止血点：抛弃第三方库，直接使用原生底层注入，抹除三大致命风控特征！
-        await page.add_init_script("""
-            // 1. 抹除无头浏览器最致命的 webdriver 标记
-            Object.defineProperty(navigator, 'webdriver', { get: () => undefined });
-            
-            // 2. 伪装 Chrome 插件特征
-            Object.defineProperty(navigator, 'plugins', { get: () => [1, 2, 3] });
-            
-            // 3. 伪装 Chrome 运行时环境
-            window.navigator.chrome = { runtime: {} };
-        """)
-        
-        page.on("response", handle_response)
+        self.page.on("response", self._on_response)
+        await self.context.route("**/*", self.filter.route)
         
         if AUTH_FILE.exists():
             try:
                 with open(AUTH_FILE, "r") as f:
                     auth_data = json.load(f)
                     if "cookies" in auth_data:
-                        await context.add_cookies(auth_data["cookies"])
+                        await self.context.add_cookies(auth_data["cookies"])
             except: pass
 
+    async def close(self):
+        self._waiter = None
+        self._page_waiters = {}
+        try:
+            if self.context: await self.context.close()
+        except Exception: pass
+        try:
+            if self._pw: await self._pw.stop()
+        except Exception: pass
+        self._pw = self.context = self.page = self.search_page = None
+        self.account_pages = []
+        self.dirty, self.misses, self.home_ready = False, 0, False
+
+    async def _recycle_reason(self) -> str | None:
+        cfg = settings.crawlers.global_settings
+        if self.dirty: return "上一轮被中断"
+        if self.page is None or self.page.is_closed(): return "页面已关闭"
+        age_min = (time.monotonic() - self.launched_at) / 60
+        if age_min > cfg.browser_max_age_min: return f"已存活 {age_min:.0f} 分钟"
+        rss = await asyncio.to_thread(_browser_rss_mb)
+        if rss > cfg.browser_max_rss_mb: return f"内存占用 {rss:.0f} MB"
+        return None
+
+    def _check_auth(self, page=None):
+        current_url = (page or self.page).url
+        if "login" in current_url or "logout" in current_url or "suspended" in current_url:
+            raise RuntimeError(f"TWITTER_AUTH_EXPIRED: 账号状态异常！当前页面被劫持到了: {current_url}")
+
+    async def _click_following(self):
+        await self.page.wait_for_selector('[role="tab"]', timeout=30000)
+        tabs = self.page.locator('[role="tab"]')
+        if await tabs.count() >= 2:
+            await tabs.nth(1).click()
+
+    async def _open_following(self):
+        """整页导航到主页并切换到【正在关注】(冷启动与就地刷新失灵时使用)"""
+        await self.page.goto("https://x.com/home", timeout=60000)
+        self._check_auth()
+        logger.info("🖱️ 正在强制切换到【正在关注】(Following) 页面...")
+        await self._click_following()
+        self.home_ready = True
+
+    async def _refresh_in_place(self):
+        """回到顶部再点一次当前标签，X 会就地拉取新推文，无需整页重载"""
+        self._check_auth()
+        await self.page.evaluate("window.scrollTo(0, 0)")
+        await self._click_following()
+
+    async def _capture(self, action, timeout: float) -> int | None:
+        self._waiter = asyncio.get_running_loop().create_future()
         try:
-            await page.goto("https://x.com/home", timeout=60000)
-            await page.wait_for_timeout(random.randint(2000, 4000))
-            
-            current_url = page.url
-            if "login" in current_url or "logout" in current_url or "suspended" in current_url:
-                raise RuntimeError(f"TWITTER_AUTH_EXPIRED: 账号状态异常！当前页面被劫持到了: {current_url}")
-            
-            logger.info("🖱️ 正在强制切换到【正在关注】(Following) 页面...")
-            await page.wait_for_selector('[role="tab"]', timeout=30000)
-            tabs = page.locator('[role="tab"]')
-            
-            if await tabs.count() >= 2:
-                await tabs.nth(1).click()
-            
-            logger.info("⏳ 正在注入混沌浏览行为特征...")
-            await page.wait_for_timeout(random.randint(3000, 6000))
-            await page.mouse.move(random.randint(200, 1000), random.randint(100, 700))
-            await page.mouse.wheel(0, random.randint(800, 2500))
-            await page.wait_for_timeout(random.randint(3000, 5000))
-            await page.mouse.move(random.randint(200, 1000), random.randint(100, 700))
-            await page.mouse.wheel(0, random.randint(-500, 800))
-            await page.wait_for_timeout(random.randint(2000, 4000))
-            
-        except RuntimeError as e:
-            raise e 
+            await action()
+            return await asyncio.wait_for(self._waiter, timeout)
+        except asyncio.TimeoutError:
+            return None
+        finally:
+            self._waiter = None
+
+    @staticmethod
+    def _page_ids(capture_id: int) -> list[int]:
+        return entry_tweet_ids(capture_store.read_raw(capture_id))
+
+    def _load_high_water(self):
+        """重启后从最近一份归档恢复高水位：停机期间积压的推文也能靠下滑追回来"""
+        self._hwm_loaded = True
+        last = capture_store.latest_of(TIMELINE_KIND)
+        if last is None: return
+        try: self.high_water = max(self._page_ids(last), default=None)
+        except Exception as e: logger.debug(f"⚠️ 高水位恢复失败: {e}")
+
+    async def _scroll_to_bottom(self):
+        await self.page.evaluate("window.scrollTo(0, document.body.scrollHeight)")
+
+    # ==========================================
+    # 📜 高水位增量下滑
+    # 旧版每轮都固定滚两下，清闲时白白多拉一页，停机或长间隔后积压超过一页的推文又会漏掉。
+    # 现在每收到一页就看它的最旧条目：已经不晚于高水位说明与上一轮接上了，立即停止；
+    # 否则继续下滑翻页，直到接上或滚满 scroll_depth 像素。
+    # ==========================================
+    async def _catch_up(self, first: int) -> int:
+        """返回额外翻页的数量"""
+        cfg = settings.crawlers.global_settings
+        ids = await asyncio.to_thread(self._page_ids, first)
+        newest, pages = max(ids, default=0), 0
+        mark = self.high_water
+        reached = mark is None or not ids or min(ids) <= mark
+        start_y = await self.page.evaluate("window.scrollY")
+        while not reached:
+            depth = await self.page.evaluate("window.scrollY") - start_y
+            if depth >= cfg.scroll_depth: break
+            saved = await self._capture(self._scroll_to_bottom, cfg.scroll_timeout_ms / 1000)
+            if saved is None: break  # 翻到底或 X 不再返回更多条目
+            pages += 1
+            ids = await asyncio.to_thread(self._page_ids, saved)
+            newest = max(newest, max(ids, default=0))
+            reached = not ids or min(ids) <= mark
+
+        if mark is not None and not reached:
+            logger.warning(f"📜 [增量下滑] 翻了 {pages} 页 (上限 {cfg.scroll_depth}px) 仍未接上高水位 {mark}，中间可能有推文遗漏。")
+        elif pages:
+            logger.info(f"📜 [增量下滑] 额外翻了 {pages} 页，已接上高水位。")
+        if newest: self.high_water = max(mark or 0, newest)
+        return pages
+
+    async def refresh(self) -> int | None:
+        """刷新一次【正在关注】信息流，返回本轮截获的 capture_id；没有新推文时返回 None"""
+        async with self.lock: return await self._refresh()
+
+    async def _maybe_recycle(self):
+        if self._pw is None: return
+        reason = await self._recycle_reason()
+        if reason:
+            logger.info(f"♻️ [热浏览器] 触发回收 ({reason})，重启 Chromium...")
+            await self.close()
+
+    async def _refresh(self) -> int | None:
+        await self._maybe_recycle()
+
+        wait_sec = settings.crawlers.global_settings.scroll_timeout_ms / 1000
+        started = time.monotonic()
+        self.filter.summary()  # 清掉两轮之间后台请求的计数
+        if not self._hwm_loaded: await asyncio.to_thread(self._load_high_water)
+        try:
+            if self.context is None: await self._launch()
+            # 主页信息流与账号页在各自的标签里同时抓取，账号页不拖慢主页巡视
+            results = await asyncio.gather(self._refresh_home(wait_sec), self._capture_accounts(), return_exceptions=True)
+            for r in results:
+                if isinstance(r, BaseException): raise r
+            (saved, pages), accounts = results
         except Exception as e:
-            logger.error(f"⚠️ 抓取过程发生普通异常(可能引发静默失败): {e}")
-            raise e 
+            # 页面处于未知状态，下轮重启浏览器
+            self.dirty = True
+            if not isinstance(e, RuntimeError): logger.error(f"⚠️ 抓取过程发生普通异常(可能引发静默失败): {e}")
+            raise
+        except BaseException:
+            self.dirty = True # 工序超时或停机导致的取消
+            raise
+
+        self.misses = 0 if saved else self.misses + 1
+        outcome = (f"截获新包 {1 + pages} 页" if saved else "无新推文") + (f"，账号页 {len(accounts)} 个" if accounts else "")
+        logger.info(f"⚡ [热浏览器] 本轮巡视耗时 {time.monotonic() - started:.1f} 秒 ({outcome})")
+        logger.info(f"🚧 [资源拦截] {self.filter.summary()}")
+        return saved
+
+    async def _refresh_home(self, wait_sec: float) -> tuple[int | None, int]:
+        """刷新主标签页的【正在关注】，返回 (首页 capture_id, 额外翻页数)"""
+        pages = 0
+        if not self.home_ready:
+            saved = await self._capture(self._open_following, max(wait_sec, NAVIGATION_WAIT_SEC))
+        elif self.misses >= MAX_IN_PLACE_MISSES:
+            # 连续多轮就地刷新都没等到新包：可能单页应用已经僵死，整页重开兜底一次
+            logger.info(f"🔄 [热浏览器] 连续 {self.misses} 轮就地刷新无新包，整页重开主页...")
+            saved = await self._capture(self._open_following, max(wait_sec, NAVIGATION_WAIT_SEC))
+        else:
+            saved = await self._capture(self._refresh_in_place, wait_sec)
+        if saved: pages = await self._catch_up(saved)
+        # 保留一点拟人的指针活动，不再原地干等
+        await self.page.mouse.move(random.randint(200, 1000), random.randint(100, 700))
+        return saved, pages
+
+    # ==========================================
+    # 👤 重点成员账号页
+    # 【正在关注】与机器人关注的所有账号共用，无关账号一刷屏，成员推文就被挤出首页 (下滑也有深度上限)。
+    # 开启 account_timelines 后，每轮再从最久没抓的成员里挑几个，打开其主页截获 UserTweets 时间线，
+    # 归档后与主页信息流在同一批次里合并化验。账号页在热浏览器里常驻 pool_size 个标签，
+    # 每个标签依次处理分到的账号，同时在抓的账号数不超过标签数。
+    # ==========================================
+    def _due_accounts(self) -> list[str]:
+        cfg = settings.crawlers.global_settings.account_timelines
+        accounts = [a.lstrip("@").lower() for a in cfg.accounts] or sorted({a for g in GROUPS for a in g.target_accounts})
+        now = time.monotonic()
+        due = [a for a in accounts if now - self.account_seen.get(a, -float("inf")) >= cfg.min_interval_sec]
+        due.sort(key=lambda a: self.account_seen.get(a, -float("inf")))
+        return due[:cfg.max_per_round]
+
+    async def _account_page(self, index: int):
+        if index < len(self.account_pages) and not self.account_pages[index].is_closed():
+            return self.account_pages[index]
+        page = await self.context.new_page()
+        await page.add_init_script(STEALTH_SCRIPT)
+        page.on("response", functools.partial(self._on_page_response, page, handle_user_response))
+        if index < len(self.account_pages): self.account_pages[index] = page
+        else: self.account_pages.append(page)
+        return page
+
+    async def _capture_on(self, page, action, timeout: float) -> int | None:
+        self._page_waiters[page] = asyncio.get_running_loop().create_future()
+        try:
+            await action()
+            return await asyncio.wait_for(self._page_waiters[page], timeout)
+        except asyncio.TimeoutError:
+            return None
         finally:
-            await context.close()
\ No newline at end of file
+            self._page_waiters.pop(page, None)
+
+    async def _capture_accounts(self) -> list[int]:
+        """抓取本轮到期的成员账号页，返回截获的 capture_id 列表；未开启时直接返回空"""
+        cfg = settings.crawlers.global_settings.account_timelines
+        if not cfg.enable: return []
+        queue = self._due_accounts()
+        wait_sec = max(settings.crawlers.global_settings.scroll_timeout_ms / 1000, NAVIGATION_WAIT_SEC)
+        captured = []
+
+        async def worker(page):
+            while queue:
+                account = queue.pop(0)
+                async def open_account():
+                    await page.goto(f"https://x.com/{account}", timeout=60000)
+                    self._check_auth(page)
+                saved = await self._capture_on(page, open_account, wait_sec)
+                self.account_seen[account] = time.monotonic()
+                if saved: captured.append(saved)
+                else: logger.info(f"👤 [账号页] @{account} 本轮未截获时间线。")
+
+        pages = [await self._account_page(i) for i in range(min(cfg.pool_size, len(queue)))]
+        for r in await asyncio.gather(*(worker(page) for page in pages), return_exceptions=True):
+            if isinstance(r, BaseException): raise r
+        return captured
+
+    async def search(self, query: str, max_pages: int) -> list[int]:
+        """在补录标签页打开【最新】搜索结果并向下翻页，返回截获的 capture_id 列表 (新到旧)"""
+        async with self.lock:
+            await self._maybe_recycle()  # 上一轮巡视被中断或浏览器超龄时，不在半坏的页面上搜索
+            wait_sec = settings.crawlers.global_settings.scroll_timeout_ms / 1000
+            try:
+                if self.context is None: await self._launch()
+                if self.search_page is None or self.search_page.is_closed():
+                    self.search_page = await self.context.new_page()
+                    await self.search_page.add_init_script(STEALTH_SCRIPT)
+                    self.search_page.on("response", functools.partial(self._on_page_response, self.search_page, handle_search_response))
+                page = self.search_page
+
+                async def open_search():
+                    await page.goto(f"https://x.com/search?q={quote(query)}&src=typed_query&f=live", timeout=60000)
+                    self._check_auth(page)
+
+                async def next_page():
+                    await page.evaluate("window.scrollTo(0, document.body.scrollHeight)")
+
+                captured = []
+                saved = await self._capture_on(page, open_search, max(wait_sec, NAVIGATION_WAIT_SEC))
+                while saved and len(captured) < max_pages:
+                    captured.append(saved)
+                    if len(captured) >= max_pages: break
+                    saved = await self._capture_on(page, next_page, wait_sec)
+                return captured
+            except BaseException:
+                self.dirty = True  # 含工序超时导致的取消：补录标签停在未知状态，下次先回收
+                raise
+
+_warm = WarmTimeline()
+
+async def fetch_timeline() -> int | None:
+    """刷新一次时间线，返回本轮新归档的 capture_id (见 capture_store)；没有新包返回 None"""
+    return await _warm.refresh()
+
+async def search_timeline(query: str, max_pages: int) -> list[int]:
+    """用常驻浏览器执行一次推特搜索 (历史补录用)，返回截获的 capture_id 列表"""
+    return await _warm.search(query, max_pages)
+
+async def close_browser():
+    await _warm.close()
@@ -1,12 +1,13 @@
 import os
 import sys
+import html
+import json
 import logging
 import asyncio
-import sqlite3
-import json
 import warnings  # 👈 新增
 from telegram.warnings import PTBUserWarning  # 👈 新增
 from pathlib import Path
+from collections import Counter
 from datetime import datetime, time, timezone, timedelta
 from telegram import Update, Bot, InlineKeyboardButton, InlineKeyboardMarkup, InputMediaPhoto
 from telegram.ext import ApplicationBuilder, CommandHandler, MessageHandler, filters, ContextTypes, ConversationHandler, CallbackQueryHandler
@@ -14,6 +15,16 @@ from telegram.error import NetworkError
 
 sys.path.append(str(Path(__file__).resolve().parent.parent))
 from common.config_loader import settings
+from common.state_manager import wipe_tweet_memory, get_meta, set_meta, scan_meta, delete_meta
+from common.job_queue import WORKER_ID
+from common.group_context import GROUPS, PRIMARY_GROUP, current_group, use_group, is_multi_group
+from Bot_Publisher.publish_scheduler import scheduler_stats, ACTION_LABELS
+from common.deadline import timeout_counts, STAGE_LABELS
+from Bot_Crawler.media_planner import savings_total
+from Bot_Crawler.media_cache import cache_hits
+from Bot_Crawler.capture_prefilter import prefilter_stats
+from Bot_Crawler.poll_scheduler import poll_scheduler
+from Bot_Crawler.backfill import create_backfill, list_backfills, cancel_backfill, parse_date
 # 👇 新增：强制让 PTB 框架闭嘴，不再打印这条无害警告
 warnings.filterwarnings("ignore", category=PTBUserWarning)
 
@@ -26,19 +37,104 @@ TG_CHAT_ID = os.getenv("TG_CHAT_ID")
 class GloBotState:
     is_running = asyncio.Event() 
     pending_video_approval = None 
-    daily_stats = {"success": 0, "failed": 0, "videos": 0}
+    daily_stats = {"success": 0, "failed": 0, "videos": 0, "shed": 0, "timeouts": 0}
     main_loop_coro = None    
     crawler_task = None      
     is_sleeping = False
     wake_up_event = asyncio.Event()
     # 👇 新增：用于在不同对话轮次之间，临时存储视频的“熟肉”与“生肉”路径
     current_vid_candidates = {}  
+    lanes = []  # 由总线调度器登记的持久化车道，供 /status 查询积压
+    role = "all"  # 本进程承担的角色 (由 main_master 登记)
 
 GloBotState.is_running.set()
 tg_app = None
 
+# 审片会话依赖全局对话状态机，多团体同时送审时必须排队，一次只挂起一个视频
+_hitl_lock = asyncio.Lock()
+
+# ==========================================
+# 🚦 跨进程总线阀门：拆分部署时，熔断/暂停需要同步到所有 worker 进程
+# ==========================================
+# 阀门是全局的，统一记在主团体的状态库里
+def set_bus_running(running: bool):
+    if running: GloBotState.is_running.set()
+    else: GloBotState.is_running.clear()
+    with use_group(PRIMARY_GROUP): set_meta("bus_paused", "0" if running else "1")
+
+async def sync_bus_valve(interval: float = 2.0, role: str = "all"):
+    # 顺带同步跨进程的运行指标与 /force 唤醒信号 (见下方 📡 跨进程运行指标)
+    with use_group(PRIMARY_GROUP):
+        wake_seen, reset_seen = get_meta("wake_requested", "0"), get_meta("daily_reset_at", "0")
+    while True:
+        with use_group(PRIMARY_GROUP):
+            paused = get_meta("bus_paused", "0") == "1"
+            wake, reset = get_meta("wake_requested", "0"), get_meta("daily_reset_at", "0")
+            if reset != reset_seen:
+                reset_seen = reset
+                GloBotState.daily_stats = dict.fromkeys(GloBotState.daily_stats, 0)
+            set_meta(metrics_key(role), json.dumps(local_metrics(), ensure_ascii=False))
+        if paused and GloBotState.is_running.is_set(): GloBotState.is_running.clear()
+        elif not paused and not GloBotState.is_running.is_set(): GloBotState.is_running.set()
+        if wake != wake_seen:
+            wake_seen = wake
+            GloBotState.wake_up_event.set()
+        await asyncio.sleep(interval)
+
+# ==========================================
+# 📡 跨进程运行指标
+# 削峰/超时/预筛/缓存命中/巡视节奏/休眠状态都是各进程的内存计数器。拆分部署时，
+# 每个 worker 在阀门同步循环里把自己的快照写进主团体 meta 表 (metrics:<角色>:<WORKER_ID>)，
+# 同一角色跑多个进程 (甚至分布在多台机器) 时各占一个键，互不覆盖；
+# 控制中枢的 /status 与每日简报汇总本进程和其他进程的新鲜快照，进程下线后快照过期即被清掉。
+# /force 的唤醒与简报清零同样经 meta 表广播。
+# ==========================================
+METRICS_PREFIX = "metrics:"
+
+def metrics_key(role: str) -> str:
+    return f"{METRICS_PREFIX}{role}:{WORKER_ID}"
+
+def local_metrics() -> dict:
+    return {
+        "at": datetime.now().timestamp(),
+        "sleeping": GloBotState.is_sleeping,
+        "daily": GloBotState.daily_stats,
+        "timeouts": timeout_counts,
+        "savings": [savings_total.avoided, savings_total.avoided_bytes],
+        "prefilter": prefilter_stats,
+        "cache": cache_hits,
+        "poll": poll_scheduler.status_line() if poll_scheduler.last_interval else "",
+    }
+
+def cluster_metrics() -> dict:
+    """本进程的指标 + 其他 worker 进程最近写入的快照，计数逐项相加"""
+    snaps = [local_metrics()]
+    if GloBotState.role != "all":
+        stale_sec = max(60, 10 * settings.pipeline.poll_interval_sec)
+        now = datetime.now().timestamp()
+        with use_group(PRIMARY_GROUP):
+            for key, raw in scan_meta(METRICS_PREFIX).items():
+                if key == metrics_key(GloBotState.role): continue
+                snap = json.loads(raw)
+                if now - snap["at"] <= stale_sec: snaps.append(snap)
+                else: delete_meta(key)  # 已下线的进程 (含重启前的旧进程号)
+    merged = {"sleeping": any(s["sleeping"] for s in snaps),
+              "poll": next((s["poll"] for s in snaps if s["poll"]), ""),
+              "savings": [sum(s["savings"][0] for s in snaps), sum(s["savings"][1] for s in snaps)]}
+    for key in ("daily", "timeouts", "prefilter", "cache"):
+        merged[key] = Counter()
+        for snap in snaps: merged[key].update(snap[key])
+    return merged
+
+def request_wake():
+    """唤醒正在休眠的雷达：本进程直接置位，其他进程经 meta 表在下个同步周期收到"""
+    GloBotState.wake_up_event.set()
+    with use_group(PRIMARY_GROUP): set_meta("wake_requested", datetime.now().timestamp())
+
 async def send_tg_msg(text: str, reply_markup=None):
     if not TG_BOT_TOKEN or not TG_CHAT_ID or not tg_app: return
+    # 多团体托管时给每条推送打上团体标签，方便主理人分辨
+    if is_multi_group(): text = f"🏷️ <b>[{current_group().name}]</b>\n{text}"
     try:
         await tg_app.bot.send_message(chat_id=TG_CHAT_ID, text=text, parse_mode='HTML', reply_markup=reply_markup)
     except Exception as e:
@@ -57,7 +153,7 @@ async def cmd_boot(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return
     if GloBotState.main_loop_coro:
         GloBotState.crawler_task = asyncio.create_task(GloBotState.main_loop_coro())
-        GloBotState.is_running.set() 
+        set_bus_running(True)
         await update.message.reply_text("🚀 <b>引擎已远程点火！</b>\n全自动流水线进程已启动。", parse_mode='HTML')
     else:
         await update.message.reply_text("❌ 找不到引擎入口，无法启动。")
@@ -70,25 +166,49 @@ async def cmd_kill(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text("⚠️ 引擎当前并未运行。")
 
 async def cmd_pause(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    GloBotState.is_running.clear()
+    set_bus_running(False)
     await update.message.reply_text("⏸️ <b>已下达停机指令。</b>\n总线将在完成当前任务后进入挂起状态，停止发稿。", parse_mode='HTML')
 
 async def cmd_resume(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    GloBotState.is_running.set()
+    set_bus_running(True)
     await update.message.reply_text("▶️ <b>已下达恢复指令。</b>\n总线封锁已解除，流水线重新启动！", parse_mode='HTML')
 
 async def cmd_status(update: Update, context: ContextTypes.DEFAULT_TYPE):
     task_status = "🟢 正在运转" if (GloBotState.crawler_task and not GloBotState.crawler_task.done()) else "🔴 已被熄火"
     valve_status = "🟢 畅通" if GloBotState.is_running.is_set() else "🔴 截断"
-    sleep_status = "💤 休眠中" if GloBotState.is_sleeping else "🔥 抓取/发布中"
+    m = cluster_metrics()
+    sleep_status = "💤 休眠中" if m["sleeping"] else "🔥 抓取/发布中"
     
     text = f"📊 <b>GloBot 实时状态</b>\n" \
            f"引擎进程: {task_status} (/boot /kill)\n" \
            f"发布阀门: {valve_status} (/pause /resume)\n" \
            f"当前工况: {sleep_status}\n" \
-           f"今日成功发射: {GloBotState.daily_stats['success']} 条\n" \
-           f"今日发射失败: {GloBotState.daily_stats['failed']} 条\n" \
-           f"当前目标集群: {settings.targets.group_name}"
+           f"今日成功发射: {m['daily']['success']} 条\n" \
+           f"今日发射失败: {m['daily']['failed']} 条\n" \
+           f"当前目标集群: {' / '.join(g.name for g in GROUPS)}"
+    for name, etas in scheduler_stats().items():
+        tag = f"{name}·" if is_multi_group() else ""
+        text += f"\n🪣 {tag}发布令牌: " + " / ".join(f"{ACTION_LABELS[a]} {'就绪' if t <= 0 else f'{t}s'}" for a, t in etas.items())
+    timeouts, prefilter, cache = m["timeouts"], m["prefilter"], m["cache"]
+    if any(timeouts.values()):
+        text += "\n⏰ 工序超时累计: " + " / ".join(f"{STAGE_LABELS.get(k, k)} {n}" for k, n in timeouts.items() if n)
+    if m["savings"][0]:
+        text += f"\n🧮 下载规划累计跳过: {m['savings'][0]} 个文件，省下约 {m['savings'][1] / 1048576:.1f} MB"
+    if prefilter["hit"] or prefilter["miss"]:
+        text += f"\n🧹 抓包预筛: 放行 {prefilter['hit']} / 跳过 {prefilter['miss']} 份 (免解码 {prefilter['skipped_bytes'] / 1048576:.1f} MB)"
+    if cache["files"]:
+        text += f"\n🗄️ 媒体缓存累计命中: {cache['files']} 个文件，免下载 {cache['bytes'] / 1048576:.1f} MB"
+    if m["poll"]:
+        text += f"\n{m['poll']}"
+    for task in list_backfills():
+        text += f"\n📚 补录 {html.escape(task.progress())}"
+    if GloBotState.lanes:
+        text += "\n\n🚚 <b>车道积压</b> (排队/处理中/已削峰)"
+        for lane in GloBotState.lanes:
+            d = lane.depth()
+            cap = f"/{lane.capacity}" if lane.capacity else ""
+            tag = f"{lane.group.name}·" if is_multi_group() else ""
+            text += f"\n{tag}{lane.name}: {d.get('pending', 0)}/{d.get('inflight', 0)}/{d.get('shed', 0)} (积压 {lane.pipeline_backlog()}{cap})"
     await update.message.reply_text(text, parse_mode='HTML')
 
 # ==========================================
@@ -96,35 +216,10 @@ async def cmd_status(update: Update, context: ContextTypes.DEFAULT_TYPE):
 # ==========================================
 async def handle_memory_wipe(tweet_id: str) -> tuple[bool, str]:
     try:
-        # 1. 深入 SQLite 数据库抹除记忆
-        db_path = Path(os.getenv("LOCAL_DATA_DIR", f"./GloBot_Data/{settings.targets.group_name}")) / "processed_tweets.db"
-        if db_path.exists():
-            conn = sqlite3.connect(db_path)
-            cursor = conn.cursor()
-            cursor.execute("DELETE FROM tweets WHERE tweet_id = ?", (tweet_id,))
-            conn.commit()
-            conn.close()
-            
-        # 2. 深入 JSON 历史记录抹除记忆
-        history_file = Path(os.getenv("LOCAL_DATA_DIR", f"./GloBot_Data/{settings.targets.group_name}")) / "history.json"
-        if history_file.exists():
-            with open(history_file, "r", encoding="utf-8") as f:
-                history = set(json.load(f))
-            if tweet_id in history:
-                history.remove(tweet_id)
-                with open(history_file, "w", encoding="utf-8") as f:
-                    json.dump(list(history), f, ensure_ascii=False, indent=2)
-                    
-        # 3. 🚨 核心修复：抹除 dyn_map 里的残余羁绊，防止强发导致 KeyError
-        dyn_map_file = Path(os.getenv("LOCAL_DATA_DIR", f"./GloBot_Data/{settings.targets.group_name}")) / "dyn_map.json"
-        if dyn_map_file.exists():
-            with open(dyn_map_file, "r", encoding="utf-8") as f:
-                dyn_map = json.load(f)
-            if tweet_id in dyn_map:
-                del dyn_map[tweet_id]
-                with open(dyn_map_file, "w", encoding="utf-8") as f:
-                    json.dump(dyn_map, f, ensure_ascii=False, indent=2)
-                    
+        # 去重表 / 发布历史 / dyn_map 残余羁绊，在同一个 SQLite 事务里一次性抹除，防止强发导致 KeyError
+        # 推文 ID 全局唯一，多团体时逐个团体清理即可
+        for group in GROUPS:
+            with use_group(group): wipe_tweet_memory(tweet_id)
         return True, ""
     except Exception as e:
         return False, str(e)
@@ -147,18 +242,45 @@ async def cmd_force(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return
     tweet_id = context.args[0]
     
-    if not GloBotState.is_sleeping:
+    if not cluster_metrics()["sleeping"]:
         await update.message.reply_text("⚠️ 引擎当前正在高速运转处理任务，强制唤醒指令不生效。\n请等待其进入休眠状态后再试，或使用 /reset 仅抹除记忆。")
         return
 
     await update.message.reply_text(f"🔍 收到强制唤醒指令，正在重置推文 [{tweet_id}] 的全部记录...")
     success, err = await handle_memory_wipe(tweet_id)
     if success:
-        GloBotState.wake_up_event.set() 
+        request_wake()
         await update.message.reply_text("⚡ <b>强制唤醒已触发！</b>\n流水线休眠被打断，正在火速启动新一轮抓取！", parse_mode='HTML')
     else:
         await update.message.reply_text(f"❌ 抹除记忆失败，唤醒中止: {err}")
 
+async def cmd_backfill(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """/backfill 查看进度；/backfill <账号> [起始日期] [截止日期] 登记补录；/backfill cancel <账号> 取消"""
+    args = context.args or []
+    if not args:
+        tasks = list_backfills()
+        if not tasks:
+            await update.message.reply_text("📭 当前没有进行中的补录任务。\n用法: /backfill <账号> [起始日期 YYYY-MM-DD] [截止日期]\n取消: /backfill cancel <账号>")
+            return
+        lines = [f"{f'[{t.group}] ' if is_multi_group() else ''}{html.escape(t.progress())}" for t in tasks]
+        await update.message.reply_text("📚 <b>历史补录进度</b>\n" + "\n".join(lines), parse_mode='HTML')
+        return
+    if args[0] == "cancel":
+        if len(args) < 2:
+            await update.message.reply_text("❌ 用法: /backfill cancel <账号>")
+            return
+        n = cancel_backfill(args[1])
+        await update.message.reply_text(f"🛑 已取消 {n} 个补录任务 (已投进车道的推文照常发布)。" if n else "⚠️ 该账号没有进行中的补录任务。")
+        return
+    try:
+        since_ts = parse_date(args[1]) if len(args) > 1 else 0
+        until_ts = parse_date(args[2]) if len(args) > 2 else None
+        task = create_backfill(args[0], since_ts, until_ts)
+    except ValueError as e:
+        await update.message.reply_text(f"❌ 登记失败: {e}")
+        return
+    await update.message.reply_text(f"📚 <b>补录任务已登记</b>\n{html.escape(task.progress())}\n爬虫会在巡视间隙翻页采集，并按限速低优先级投递，不影响实时推文。", parse_mode='HTML')
+
 # ==========================================
 # 🎥 4. 视频发布人工介入
 # ==========================================
@@ -186,7 +308,10 @@ async def extract_video_frames(video_path: str, num_frames=5) -> list[str]:
 # 🚨 接收 vid_candidates
 async def ask_video_approval(vid_candidates: dict, default_desc: str) -> dict:
     if not tg_app: return None
-    
+    async with _hitl_lock:
+        return await _ask_video_approval(vid_candidates, default_desc)
+
+async def _ask_video_approval(vid_candidates: dict, default_desc: str) -> dict:
     # 注册到全局状态机，供下一步的按钮回调提取
     GloBotState.current_vid_candidates = vid_candidates
     
@@ -310,19 +435,23 @@ JST = timezone(timedelta(hours=9))
 
 async def daily_report(context: ContextTypes.DEFAULT_TYPE):
     now_jst = datetime.now(JST)
+    daily = cluster_metrics()["daily"]
     
     report = (
         f"🌙 <b>GloBot 每日夜间简报</b>\n"
         f"周期: 昨夜 22:00 - 今夜 22:00\n"
         f"日期: {now_jst.strftime('%Y-%m-%d')}\n"
         f"------------------------\n"
-        f"✅ 成功搬运: {GloBotState.daily_stats['success']} 条\n"
-        f"❌ 失败/拦截: {GloBotState.daily_stats['failed']} 条\n"
-        f"🎬 发布视频: {GloBotState.daily_stats['videos']} 个\n\n"
+        f"✅ 成功搬运: {daily['success']} 条\n"
+        f"❌ 失败/拦截: {daily['failed']} 条\n"
+        f"🎬 发布视频: {daily['videos']} 个\n"
+        f"🧯 过载削峰: {daily['shed']} 条\n"
+        f"⏰ 工序超时: {daily['timeouts']} 次\n\n"
         f"状态: 数据已清零归档，夜间自动值守已就绪！"
     )
     await send_tg_msg(report)
-    GloBotState.daily_stats = {"success": 0, "failed": 0, "videos": 0}
+    GloBotState.daily_stats = {"success": 0, "failed": 0, "videos": 0, "shed": 0, "timeouts": 0}
+    with use_group(PRIMARY_GROUP): set_meta("daily_reset_at", datetime.now().timestamp())  # 其他角色进程随之清零
 
 # ==========================================
 # 🔇 全局静音异常拦截器
@@ -336,13 +465,18 @@ async def global_error_handler(update: object, context: ContextTypes.DEFAULT_TYP
 # ==========================================
 # 🧠 启动器
 # ==========================================
-async def start_telegram_bot():
+async def start_telegram_bot(polling: bool = True):
+    """polling=False 时仅具备发报能力 (供拆分部署中的爬虫/媒体 worker 使用)，指令监听只能由唯一的控制进程承担"""
     global tg_app
     if not TG_BOT_TOKEN:
         logger.warning("⚠️ 未配置 TG_BOT_TOKEN，Telegram 遥控器未激活。")
         return
 
     tg_app = ApplicationBuilder().token(TG_BOT_TOKEN).build()
+    if not polling:
+        await tg_app.initialize()
+        logger.info("📡 Telegram 发报通道已就绪 (仅推送模式，不监听指令)。")
+        return
 
     tg_app.add_handler(CommandHandler("start", cmd_start))
     tg_app.add_handler(CommandHandler("help", cmd_start))
@@ -353,6 +487,7 @@ async def start_telegram_bot():
     tg_app.add_handler(CommandHandler("status", cmd_status))
     tg_app.add_handler(CommandHandler("reset", cmd_reset))
     tg_app.add_handler(CommandHandler("force", cmd_force))
+    tg_app.add_handler(CommandHandler("backfill", cmd_backfill))
     
     conv_handler = ConversationHandler(
         entry_points=[MessageHandler(filters.TEXT & (~filters.COMMAND), video_hitl_title)],
@@ -1,5 +1,6 @@
 import os
 import asyncio
+import functools
 import logging
 from pathlib import Path
 import sys
@@ -7,11 +8,16 @@ import sys
 # 将项目根目录加入系统路径
 sys.path.append(str(Path(__file__).resolve().parent.parent))
 from common.config_loader import settings
+from common.fair_scheduler import FairScheduler
+from common.deadline import run_stage, run_subprocess, StageTimeout
 import mlx_whisper
 
 logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
 logger = logging.getLogger(__name__)
 
+# 统一内存只够跑一个 Whisper 实例，多团体按轮转排队
+whisper_gate = FairScheduler("Whisper", 1)
+
 async def extract_audio(video_path: Path, audio_path: Path) -> bool:
     """调用 FFmpeg 极速剥离纯净音频"""
     logger.info(f"✂️ 正在从视频中剥离纯净音频: {video_path.name} ...")
@@ -20,12 +26,9 @@ async def extract_audio(video_path: Path, audio_path: Path) -> bool:
         "-vn", "-acodec", "pcm_s16le", "-ar", "16000", "-ac", "1",
         str(audio_path)
     ]
-    process = await asyncio.create_subprocess_exec(
-        *cmd, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE
-    )
-    _, stderr = await process.communicate()
+    returncode, stderr = await run_subprocess("encode", *cmd, detail=video_path.name)
     
-    if process.returncode == 0:
+    if returncode == 0:
         logger.info("✅ 音频剥离成功！")
         return True
     else:
@@ -40,13 +43,16 @@ async def transcribe_audio(audio_path: Path) -> dict:
     try:
         # 💡 核心开启：word_timestamps=True，强制模型追踪每一个字的精确发音时间
         # 因为 MLX 的调用是同步的，我们在 asyncio 里用 to_thread 防止阻塞主循环
-        result = await asyncio.to_thread(
+        # ⏰ 线程无法强杀：超时后只是不再等待，但闸门一直占到后台推理真正跑完，内存里始终只有一个模型
+        inference = await whisper_gate.detach(functools.partial(
+            asyncio.to_thread,
             mlx_whisper.transcribe,
             str(audio_path),
             path_or_hf_repo=model_name,
             fp16=True,
             word_timestamps=True # 🔪 手术刀级对齐开关
-        )
+        ))
+        result = await run_stage("transcribe", asyncio.shield(inference), audio_path.name)
         
         segments = result.get('segments', [])
         
@@ -62,6 +68,8 @@ async def transcribe_audio(audio_path: Path) -> dict:
         logger.info(f"✅ 听译与词级对齐完成！共识别到 {len(segments)} 句话。")
         return result
         
+    except StageTimeout:
+        raise # 交给媒体管线走原片降级
     except Exception as e:
         logger.error(f"❌ 听译引擎崩溃: {e}")
         return {'segments': []}
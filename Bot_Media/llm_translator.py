@@ -11,6 +11,8 @@ from pydantic import BaseModel, Field, ValidationError
 
 sys.path.append(str(Path(__file__).resolve().parent.parent))
 from common.config_loader import settings, MASTER_LLM_API_KEY, WORKER_GLM_API_KEY
+from common.group_context import current_group
+from common.fair_scheduler import FairScheduler
 from Bot_Media.rag_manager import RAGManager
 
 logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
@@ -38,7 +40,16 @@ master_client = AsyncOpenAI(
     max_retries=0
 ) if MASTER_LLM_API_KEY else None
 
-rag = RAGManager()
+# 知识库按团体懒加载；主团体首次访问即为旧版的全局实例
+_rag_cache: dict[Path, RAGManager] = {}
+
+def get_rag() -> RAGManager:
+    kb_dir = current_group().kb_dir
+    if kb_dir not in _rag_cache: _rag_cache[kb_dir] = RAGManager(kb_dir)
+    return _rag_cache[kb_dir]
+
+# 多团体共享同一组 API Key，按团体轮转放行，防止某个团体的刷屏潮饿死其他团体
+llm_gate = FairScheduler("LLM", settings.pipeline.llm_concurrency)
 
 # 强类型校验结构
 class SubtitleLine(BaseModel):
@@ -56,32 +67,33 @@ async def translate_text(jp_text: str, is_subtitle: bool = False) -> str:
     
     clean_jp_text = html.unescape(jp_text)
     clean_jp_text = re.sub(r'#(\w+)', r'#\1#', clean_jp_text)
-    rag_context = rag.build_context_prompt(clean_jp_text)
+    rag_context = get_rag().build_context_prompt(clean_jp_text)
     
     active_client, active_model = master_client, MASTER_MODEL
     system_prompt = settings.prompts.video_translation_prompt if is_subtitle else settings.prompts.tweet_translation_prompt
     
     for attempt in range(3):
         try:
-            response = await active_client.chat.completions.create(
-                model=active_model,
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": f"请翻译以下推文：\n<text>\n{clean_jp_text}\n</text>\n\n{rag_context}"}
-                ],
-                temperature=0.3 + (attempt * 0.1),
-                max_tokens=500,
-                stream=True  # 👈 核心救命稻草：开启流式传输，防网关 30 秒强杀
-            )
+            async with llm_gate.slot():
+                response = await active_client.chat.completions.create(
+                    model=active_model,
+                    messages=[
+                        {"role": "system", "content": system_prompt},
+                        {"role": "user", "content": f"请翻译以下推文：\n<text>\n{clean_jp_text}\n</text>\n\n{rag_context}"}
+                    ],
+                    temperature=0.3 + (attempt * 0.1),
+                    max_tokens=500,
+                    stream=True  # 👈 核心救命稻草：开启流式传输，防网关 30 秒强杀
+                )
             
-            result_chunks = []
-            async for chunk in response:
-                if chunk.choices and len(chunk.choices) > 0:
-                    delta = chunk.choices[0].delta
-                    if hasattr(delta, 'content') and delta.content:
-                        result_chunks.append(delta.content)
+                result_chunks = []
+                async for chunk in response:
+                    if chunk.choices and len(chunk.choices) > 0:
+                        delta = chunk.choices[0].delta
+                        if hasattr(delta, 'content') and delta.content:
+                            result_chunks.append(delta.content)
             
-            result = "".join(result_chunks).strip()
+                result = "".join(result_chunks).strip()
             
             # 清理可能被思考模型暴露出来的 <think> 标签内容
             result = re.sub(r'<think>.*?</think>', '', result, flags=re.DOTALL).strip()
@@ -122,7 +134,7 @@ async def translate_batch(segments: list, ocr_results: list) -> list:
         input_lines.append(f"{i+1}. {text}{ocr_hint}")
 
     script_text = "\n".join(input_lines)
-    rag_context = rag.build_context_prompt(full_text_for_rag)
+    rag_context = get_rag().build_context_prompt(full_text_for_rag)
     
     active_client = master_client or worker_client
     active_model = MASTER_MODEL if master_client else WORKER_MODEL
@@ -141,26 +153,27 @@ async def translate_batch(segments: list, ocr_results: list) -> list:
 
     for attempt in range(3):
         try:
-            response = await active_client.chat.completions.create(
-                model=active_model,
-                response_format={"type": "json_object"},
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": f"请翻译以下台本：\n<text>\n{script_text}\n</text>\n\n{rag_context}{json_instruction}"}
-                ],
-                temperature=0.2 + (attempt * 0.1), 
-                max_tokens=2000,
-                stream=True  # 👈 流式防封杀
-            )
+            async with llm_gate.slot():
+                response = await active_client.chat.completions.create(
+                    model=active_model,
+                    response_format={"type": "json_object"},
+                    messages=[
+                        {"role": "system", "content": system_prompt},
+                        {"role": "user", "content": f"请翻译以下台本：\n<text>\n{script_text}\n</text>\n\n{rag_context}{json_instruction}"}
+                    ],
+                    temperature=0.2 + (attempt * 0.1), 
+                    max_tokens=2000,
+                    stream=True  # 👈 流式防封杀
+                )
             
-            output_chunks = []
-            async for chunk in response:
-                if chunk.choices and len(chunk.choices) > 0:
-                    delta = chunk.choices[0].delta
-                    if hasattr(delta, 'content') and delta.content:
-                        output_chunks.append(delta.content)
+                output_chunks = []
+                async for chunk in response:
+                    if chunk.choices and len(chunk.choices) > 0:
+                        delta = chunk.choices[0].delta
+                        if hasattr(delta, 'content') and delta.content:
+                            output_chunks.append(delta.content)
             
-            output_text = "".join(output_chunks).strip()
+                output_text = "".join(output_chunks).strip()
             output_text = re.sub(r'<think>.*?</think>', '', output_text, flags=re.DOTALL).strip()
             
             if "<!DOCTYPE html>" in output_text[:50].lower():
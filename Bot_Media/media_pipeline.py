@@ -1,4 +1,3 @@
-import os
 import shutil
 import asyncio
 import logging
@@ -9,21 +8,27 @@ import time
 
 sys.path.append(str(Path(__file__).resolve().parent.parent))
 from common.config_loader import settings
+from common.group_context import current_group
+from common.deadline import run_stage, run_subprocess, StageTimeout
 from Bot_Media.audio_transcriber import extract_audio, transcribe_audio
 from Bot_Media.video_ocr import extract_video_text
 from Bot_Media.llm_translator import translate_batch 
+from Bot_Crawler.media_cache import get_media_cache
 
 logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
 logger = logging.getLogger(__name__)
 
-DATA_DIR = Path(os.getenv("LOCAL_DATA_DIR", f"./GloBot_Data/{settings.targets.group_name}"))
-
 def format_time_srt(seconds: float) -> str:
     hours, rem = divmod(seconds, 3600)
     mins, secs = divmod(rem, 60)
     millis = int((secs - int(secs)) * 1000)
     return f"{int(hours):02d}:{int(mins):02d}:{int(secs):02d},{millis:03d}"
 
+async def _ocr_or_skip(source_file: Path) -> list:
+    """OCR 只是翻译的辅助参考，超时直接放弃花字，不拖累听译主线"""
+    try: return await run_stage("ocr", extract_video_text(source_file), source_file.name)
+    except StageTimeout: return []
+
 async def process_with_ai(source_file: Path, output_file: Path):
     logger.info(f"🧠 [AI 引擎启动] 解析中: {source_file.name}")
     work_dir = source_file.parent
@@ -31,9 +36,13 @@ async def process_with_ai(source_file: Path, output_file: Path):
     srt_file = work_dir / f"temp_subs_{source_file.stem}.srt"
 
     try:
-        ocr_task = asyncio.create_task(extract_video_text(source_file))
+        ocr_task = asyncio.create_task(_ocr_or_skip(source_file))
         audio_task = asyncio.create_task(extract_audio(source_file, audio_file))
-        ocr_results, audio_success = await asyncio.gather(ocr_task, audio_task)
+        try:
+            ocr_results, audio_success = await asyncio.gather(ocr_task, audio_task)
+        finally:
+            # 音频剥离超时时 gather 不会替我们取消兄弟任务
+            ocr_task.cancel()
         
         if not audio_success: return
 
@@ -44,7 +53,7 @@ async def process_with_ai(source_file: Path, output_file: Path):
             return
 
         logger.info(f"🧬 开始双模态上下文融合，打包发送给 AI 翻译中...")
-        cn_texts = await translate_batch(segments, ocr_results)
+        cn_texts = await run_stage("translate", translate_batch(segments, ocr_results), source_file.name)
         
         srt_lines = []
         for i, seg in enumerate(segments):
@@ -73,18 +82,19 @@ async def process_with_ai(source_file: Path, output_file: Path):
             str(output_file.absolute())
         ]
         
-        process = await asyncio.create_subprocess_exec(
-            *cmd, cwd=str(work_dir.absolute()), 
-            stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE
-        )
-        _, stderr = await process.communicate()
+        returncode, stderr = await run_subprocess("encode", *cmd, cwd=str(work_dir.absolute()), detail=source_file.name)
         
-        if process.returncode == 0:
+        if returncode == 0:
             logger.info(f"🎉 [压制完成] HEVC 字幕视频已就绪！")
         else:
             logger.error(f"❌ 压制失败: {stderr.decode().strip()}")
             shutil.copy2(source_file, output_file)
             
+    except StageTimeout as e:
+        # ⏰ 任一工序超时：丢弃半成品，降级为直接发布原片
+        logger.warning(f"⏰ [{e.stage}] 工序超时，降级为原片直发: {source_file.name}")
+        if output_file.exists(): output_file.unlink()
+        shutil.copy2(source_file, output_file)
     finally:
         if audio_file.exists(): audio_file.unlink()
         if srt_file.exists(): srt_file.unlink()
@@ -95,7 +105,7 @@ async def process_bypass(source_file: Path, output_file: Path):
 
 async def dispatch_media(source_file_path: str):
     source_file = Path(source_file_path)
-    PUBLISH_DIR = DATA_DIR / "ready_to_publish"
+    PUBLISH_DIR = current_group().data_dir / "ready_to_publish"
     PUBLISH_DIR.mkdir(parents=True, exist_ok=True)
     output_file = PUBLISH_DIR / f"final_{source_file.name}"
     
@@ -110,7 +120,7 @@ async def dispatch_media(source_file_path: str):
 # 🧹 媒体综合管理暴露接口
 # ==========================================
 def cleanup_old_media(retention_days=2.0):
-    media_dir = DATA_DIR / "media"
+    media_dir = current_group().data_dir / "media"
     if not media_dir.exists(): return
     current_time = time.time()
     cutoff_time = current_time - (retention_days * 24 * 3600)
@@ -127,6 +137,8 @@ def cleanup_old_media(retention_days=2.0):
             except: pass
     if deleted_files > 0:
         logger.info(f"🧹 [空间管理] 触发自动清理！已永久销毁 {deleted_files} 个陈旧媒体文件。")
+    # 成员目录里的文件只是缓存 blob 的硬链接，链接清理完后再回收无人引用的 blob
+    get_media_cache().prune(retention_days)
 
 def cleanup_media(media_paths):
     for f in media_paths:
@@ -134,7 +146,8 @@ def cleanup_media(media_paths):
             try: Path(f).unlink()
             except: pass
 
-async def process_media_files(media_list):
+async def process_media_files(media_list, ai_translate: bool = True):
+    """ai_translate=False 时视频只准备原片 (车道过载降级)，不进入听译与压制"""
     final_paths = []
     video_info = {"original": None, "translated": None}
     
@@ -142,7 +155,7 @@ async def process_media_files(media_list):
         if str(mf).lower().endswith(('.mp4', '.mov')):
             logger.info(f"   -> 正在启动媒体管线压制视频...")
             source_file = Path(mf)
-            PUBLISH_DIR = DATA_DIR / "ready_to_publish"
+            PUBLISH_DIR = current_group().data_dir / "ready_to_publish"
             PUBLISH_DIR.mkdir(parents=True, exist_ok=True)
             
             orig_file = PUBLISH_DIR / f"orig_{source_file.name}"
@@ -150,6 +163,12 @@ async def process_media_files(media_list):
             video_info["original"] = str(orig_file)
             final_paths.append(str(orig_file))
             
+            if not ai_translate:
+                logger.info(f"   -> 🪶 [过载降级] 跳过 AI 字幕压制，仅保留原片: {source_file.name}")
+                try: source_file.unlink()
+                except: pass
+                continue
+            
             output_file = PUBLISH_DIR / f"final_{source_file.name}"
             await dispatch_media(str(source_file))
             
@@ -1,18 +1,18 @@
 import json
-import os
 from pathlib import Path
 import sys
 
 # 将项目根目录加入系统路径
 sys.path.append(str(Path(__file__).resolve().parent.parent))
 from common.config_loader import settings
+from common.group_context import current_group
 
 class RAGManager:
     """动态知识库提取器：毫秒级扫描文本，精准投喂，极致节省 Token"""
     
-    def __init__(self):
-        # 定位到我们刚刚生成的 knowledge_base 目录
-        self.kb_dir = Path(os.getenv("LOCAL_DATA_DIR", "./GloBot_Data")) / "knowledge_base"
+    def __init__(self, kb_dir: Path | None = None):
+        # 定位到当前团体的 knowledge_base 目录 (主团体沿用旧版共享路径)
+        self.kb_dir = Path(kb_dir) if kb_dir else current_group().kb_dir
         
         # 预加载所有 5 部大典到物理内存
         self.members = self._load_json("ilife_members.json")
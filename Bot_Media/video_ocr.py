@@ -87,50 +87,53 @@ async def extract_video_text(video_path: Path) -> list:
     final_texts = []
     
     frame_count = 0
-    while cap.isOpened():
-        ret, frame = cap.read()
-        if not ret:
-            break
+    try:
+        while cap.isOpened():
+            ret, frame = cap.read()
+            if not ret:
+                break
             
-        if frame_count % frame_interval == 0:
-            current_sec = frame_count / fps
-            raw_results = ocr_engine.extract_text_from_frame(frame)
+            if frame_count % frame_interval == 0:
+                current_sec = frame_count / fps
+                raw_results = ocr_engine.extract_text_from_frame(frame)
             
-            # 1. 过滤：丢掉高度小于 3% 的背景杂字（比如衣服上的小logo）
-            valid_results = [r for r in raw_results if r['height'] >= min_height]
+                # 1. 过滤：丢掉高度小于 3% 的背景杂字（比如衣服上的小logo）
+                valid_results = [r for r in raw_results if r['height'] >= min_height]
             
-            # 2. 时空融合：检查当前字幕是不是上一秒就在屏幕上了
-            new_active_texts = []
-            for current_item in valid_results:
-                matched = False
-                for active_item in active_texts:
-                    # 只要位置高度重合 (IOU > 0.8) 或者文字完全一样，我们就认为是同一句台词！
-                    if calculate_iou(current_item['box'], active_item['box']) > iou_thresh or current_item['text'] == active_item['text']:
-                        active_item['end_time'] = current_sec # 延长存活时间
-                        active_item['box'] = current_item['box'] # 更新最新位置
-                        new_active_texts.append(active_item)
-                        matched = True
-                        break
+                # 2. 时空融合：检查当前字幕是不是上一秒就在屏幕上了
+                new_active_texts = []
+                for current_item in valid_results:
+                    matched = False
+                    for active_item in active_texts:
+                        # 只要位置高度重合 (IOU > 0.8) 或者文字完全一样，我们就认为是同一句台词！
+                        if calculate_iou(current_item['box'], active_item['box']) > iou_thresh or current_item['text'] == active_item['text']:
+                            active_item['end_time'] = current_sec # 延长存活时间
+                            active_item['box'] = current_item['box'] # 更新最新位置
+                            new_active_texts.append(active_item)
+                            matched = True
+                            break
                 
-                # 这是一个全新的花字！
-                if not matched:
-                    new_active_texts.append({
-                        "text": current_item['text'],
-                        "start_time": current_sec,
-                        "end_time": current_sec + 0.5, # 至少给 0.5 秒的存活期
-                        "box": current_item['box']
-                    })
+                    # 这是一个全新的花字！
+                    if not matched:
+                        new_active_texts.append({
+                            "text": current_item['text'],
+                            "start_time": current_sec,
+                            "end_time": current_sec + 0.5, # 至少给 0.5 秒的存活期
+                            "box": current_item['box']
+                        })
             
-            # 3. 把已经消失的花字结算归档
-            for active_item in active_texts:
-                if active_item not in new_active_texts:
-                    final_texts.append(active_item)
+                # 3. 把已经消失的花字结算归档
+                for active_item in active_texts:
+                    if active_item not in new_active_texts:
+                        final_texts.append(active_item)
                     
-            active_texts = new_active_texts
+                active_texts = new_active_texts
+                # ⏰ 每个采样帧让出一次事件循环，工序时限才能在帧间取消扫描
+                await asyncio.sleep(0)
             
-        frame_count += 1
-
-    cap.release()
+            frame_count += 1
+    finally:
+        cap.release()
     # 结算最后一波还没消失的字幕
     final_texts.extend(active_texts)
     
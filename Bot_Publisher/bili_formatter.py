@@ -1,7 +1,7 @@
 from common.text_sanitizer import sanitize_for_bilibili
-from common.config_loader import BILI_ACCOUNT_NAME
+from common.group_context import current_group
 
-def build_repost_context(prev_tw_id, dyn_map, settings_obj, id_retention_level, is_video_mode=False):
+def build_repost_context(prev_tw_id, dyn_map, settings_obj, id_retention_level, is_video_mode=False, ctx=None):
     if not prev_tw_id or prev_tw_id not in dyn_map: return ""
     prev_info = dyn_map[prev_tw_id]
     if not isinstance(prev_info, dict): return "" 
@@ -17,7 +17,7 @@ def build_repost_context(prev_tw_id, dyn_map, settings_obj, id_retention_level,
     p_raw = prev_info.get("raw_text", "")
     
     p_name = settings_obj.targets.account_title_map.get(p_handle, p_disp)
-    my_account = BILI_ACCOUNT_NAME
+    my_account = ctx.account_name if ctx else current_group().bili_account_name
     
     if is_video_mode:
         c_trans_p = p_trans.replace('\n', ' ')
@@ -37,11 +37,13 @@ def build_repost_context(prev_tw_id, dyn_map, settings_obj, id_retention_level,
                 retention_str = f"\n\n{prev_tw_id}\n-由GloBot驱动"
             return f"\n//@{my_account}: {p_name}\n\n{p_dt}\n\n{p_trans}\n\n【原文】\n{p_raw}{retention_str}"
 
-def build_safe_dynamic_text(c_name, c_time, c_trans, c_raw, c_id, c_node_type, ret_level, context_suffix, ref_link, limit, debug_status=False):
+def build_safe_dynamic_text(c_name, c_time, c_trans, c_raw, c_id, c_node_type, ret_level, context_suffix, ref_link, limit, debug_status=False, ctx=None):
     """
     B站极限裁切安全排版引擎。
     debug_status: 若开启，则返回 (内容, 裁切状态诊断文本)，专门服务于 format_tester 排版沙盒。
+    ctx: 本次发布的 PublishContext，传入时 ID 保留等级以快照为准 (排版沙盒不传，沿用 ret_level)。
     """
+    if ctx: ret_level = ctx.id_retention_level
     if c_node_type == 'RETWEET':
         text = f"{c_name} 转发\n{c_time}"
         if context_suffix: text += context_suffix
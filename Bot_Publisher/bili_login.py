@@ -1,6 +1,7 @@
 import asyncio
 import aiohttp
 import json
+import sys
 import urllib.parse
 from pathlib import Path
 
@@ -8,6 +9,14 @@ from pathlib import Path
 AUTH_DIR = Path(__file__).resolve().parent.parent / "auth_store"
 AUTH_FILE = AUTH_DIR / "bili_auth.json"
 
+# 多团体托管：python Bot_Publisher/bili_login.py <group_name> 为指定团体的搬运号扫码
+if len(sys.argv) > 1:
+    sys.path.append(str(Path(__file__).resolve().parent.parent))
+    from common.group_context import get_group
+    _group = get_group(sys.argv[1])
+    if _group is None: sys.exit(f"❌ config.yaml 中找不到团体: {sys.argv[1]}")
+    AUTH_FILE = _group.bili_auth_file
+
 async def generate_bili_auth():
     AUTH_DIR.mkdir(parents=True, exist_ok=True)
     
@@ -12,18 +12,21 @@ from datetime import datetime
 from functools import wraps
 
 sys.path.append(str(Path(__file__).resolve().parent.parent))
-from common.config_loader import settings
+from common.group_context import current_group
+from Bot_Publisher.publish_context import PublishContext
+from common.deadline import run_stage
+from Bot_Publisher.publish_scheduler import acquire_publish_slot
 from bilibili_api import Credential, video_uploader
 
 logging.basicConfig(level=logging.INFO, format="%(message)s")
 logger = logging.getLogger(__name__)
 
-AUTH_FILE = Path(__file__).resolve().parent.parent / "auth_store" / "bili_auth.json"
-
 def get_bili_auth():
-    if not AUTH_FILE.exists():
-        raise RuntimeError("AUTH_EXPIRED: 找不到 bili_auth.json，请运行扫码脚本")
-    with open(AUTH_FILE, "r", encoding="utf-8") as f:
+    # 每个团体使用各自的 B 站搬运号凭证
+    auth_file = current_group().bili_auth_file
+    if not auth_file.exists():
+        raise RuntimeError(f"AUTH_EXPIRED: 找不到 {auth_file.name}，请运行扫码脚本")
+    with open(auth_file, "r", encoding="utf-8") as f:
         return json.load(f)
 
 def get_bili_headers():
@@ -124,8 +127,8 @@ async def upload_image_to_bfs(image_path: Path) -> dict:
 # 📝 通道二：降维打击图文发布
 # ==========================================
 @async_retry(max_retries=3, delay=3)
-async def publish_native_dynamic(text: str, image_paths: list = []) -> tuple[bool, str]:
-    cfg = settings.publishers.bilibili
+async def publish_native_dynamic(text: str, image_paths: list = [], ctx: PublishContext | None = None) -> tuple[bool, str]:
+    cfg = ctx or PublishContext.build()
     auth = get_bili_auth()
     device_json = urllib.parse.quote('{"platform": "web", "device": "pc"}')
     web_json = urllib.parse.quote('{"spm_id": "333.999"}')
@@ -176,8 +179,8 @@ async def publish_native_dynamic(text: str, image_paths: list = []) -> tuple[boo
 # 🔄 通道三：原生动态转发 (带评论)
 # ==========================================
 @async_retry(max_retries=3, delay=3)
-async def smart_repost(content: str, orig_dyn_id_str: str) -> tuple[bool, str]:
-    cfg = settings.publishers.bilibili
+async def repost_dynamic(content: str, orig_dyn_id_str: str, ctx: PublishContext | None = None) -> tuple[bool, str]:
+    cfg = ctx or PublishContext.build()
     auth = get_bili_auth()
     
     repost_text = content
@@ -210,8 +213,17 @@ async def smart_repost(content: str, orig_dyn_id_str: str) -> tuple[bool, str]:
         else:
             raise Exception(f"B站拒绝转发发包: {res}")
 
-async def smart_publish(text_content: str, media_files: list, video_type: str = "none") -> tuple[bool, str]:
+# ==========================================
+# 🎫 对外入口：每条动态只领一次发布令牌 (重试不重复扣令牌)，
+# 领到令牌后才开始计 publish 工序时限，令牌桶排队不会被误判为发布超时
+# ==========================================
+async def smart_repost(content: str, orig_dyn_id_str: str, ctx: PublishContext | None = None, detail: str = "") -> tuple[bool, str]:
+    await acquire_publish_slot("repost")
+    return await run_stage("publish", repost_dynamic(content, orig_dyn_id_str, ctx=ctx), detail)
+
+async def smart_publish(text_content: str, media_files: list, video_type: str = "none", ctx: PublishContext | None = None, detail: str = "") -> tuple[bool, str]:
     logger.info(f"\n[B站发射井] 2/5: 正在甄别本地素材文件...")
     images = [Path(p) for p in media_files if str(p).lower().endswith(('.jpg', '.jpeg', '.png'))]
     logger.info(f"   -> 找到 {len(images)} 张图片，即将走纯图文/动态发布通道。")
-    return await publish_native_dynamic(text_content, images)
\ No newline at end of file
+    await acquire_publish_slot("dynamic")
+    return await run_stage("publish", publish_native_dynamic(text_content, images, ctx=ctx), detail)
\ No newline at end of file
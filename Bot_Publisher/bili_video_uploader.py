@@ -4,14 +4,15 @@ import os
 import math
 import logging
 import json
-from pathlib import Path
 from Bot_Master.tg_bot import ask_video_approval, GloBotState, send_tg_msg
+from common.group_context import current_group
+from common.deadline import run_stage
+from Bot_Publisher.publish_context import PublishContext
+from Bot_Publisher.publish_scheduler import acquire_publish_slot
 
 logger = logging.getLogger("GloBot_VideoUp")
 
-AUTH_FILE = Path(__file__).resolve().parent.parent / "auth_store" / "bili_auth.json"
-
-async def upload_video_bilibili(vid_candidates: dict, dynamic_title: str, dynamic_content: str, source_url: str, settings, bypass_tg: bool = False) -> tuple[bool, str]:
+async def upload_video_bilibili(vid_candidates: dict, dynamic_title: str, dynamic_content: str, source_url: str, settings, bypass_tg: bool = False, ctx: PublishContext | None = None) -> tuple[bool, str]:
     avail_trans = vid_candidates.get("translated")
     avail_orig = vid_candidates.get("original")
     
@@ -49,14 +50,15 @@ async def upload_video_bilibili(vid_candidates: dict, dynamic_title: str, dynami
     safe_desc = dynamic_content[:240]
     safe_dynamic = dynamic_content[:220]
 
-    if not AUTH_FILE.exists():
-        err = "找不到 bili_auth.json，请运行扫码脚本！"
+    auth_file = current_group().bili_auth_file
+    if not auth_file.exists():
+        err = f"找不到 {auth_file.name}，请运行扫码脚本！"
         logger.error(f"❌ {err}")
         if not bypass_tg: await send_tg_msg(f"⚠️ <b>凭证缺失</b>\n{err}")
         raise RuntimeError(f"AUTH_EXPIRED: {err}")
         
     try:
-        with open(AUTH_FILE, "r", encoding="utf-8") as f:
+        with open(auth_file, "r", encoding="utf-8") as f:
             auth_data = json.load(f)
             
         cookie_parts = []
@@ -146,7 +148,8 @@ async def upload_video_bilibili(vid_candidates: dict, dynamic_title: str, dynami
                 tasks.append(upload_chunk(i, f.read(chunk_size)))
 
         logger.info(f"🚀 [视频引擎] 正在高并发传输 {chunks} 个切片...")
-        await asyncio.gather(*tasks)
+        # ⏰ 切片传输受 upload 工序时限约束，超时即取消全部切片，任务退避后整体重传
+        await run_stage("upload", asyncio.gather(*tasks), os.path.basename(video_path))
 
         parts.sort(key=lambda x: x["partNumber"])
         comp_params = {
@@ -162,7 +165,8 @@ async def upload_video_bilibili(vid_candidates: dict, dynamic_title: str, dynami
 
         # 🚨 止血点 2：提交最终元数据防抖循环
         submit_url = f"https://member.bilibili.com/x/vu/web/add?csrf={bili_jct}"
-        visibility = 1 if getattr(bili_config, 'visibility', 1) == 1 else 0
+        # 可见范围以本次发布的快照为准 (脱机测试未传入时退回入参 settings)
+        visibility = 1 if (ctx.visibility if ctx else getattr(bili_config, 'visibility', 1)) == 1 else 0
         
         payload = {
             "copyright": getattr(bili_config, 'video_copyright', 2),
@@ -179,6 +183,8 @@ async def upload_video_bilibili(vid_candidates: dict, dynamic_title: str, dynami
             "is_only_self": visibility
         }
         
+        # 切片上传不占令牌，只在提交稿件前排队 (人工审片与传输期间不会空耗配额)
+        await acquire_publish_slot("video")
         for attempt in range(3):
             try:
                 logger.info(f"📡 [视频引擎] 正在提交稿件元数据 (尝试 {attempt+1}/3)...")
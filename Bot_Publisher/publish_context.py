@@ -0,0 +1,32 @@
+from dataclasses import dataclass, replace
+
+from common.config_loader import settings
+from common.group_context import current_group
+
+# ==========================================
+# 🧾 单次发布上下文 (不可变)
+# 旧版在发布前直接改写全局 settings.publishers.bilibili.title，多个发布车间并发时会互相串标题。
+# 现在每个节点在发布前生成一份只读快照，沿调用链一路透传到排版与上传接口。
+# ==========================================
+@dataclass(frozen=True)
+class PublishContext:
+    title: str = ""
+    visibility: int = 1
+    id_retention_level: int = 0
+    account_name: str = ""
+    original_only: bool = False  # 车道过载降级：视频只发原片
+
+    @classmethod
+    def build(cls, title: str | None = None, original_only: bool = False) -> "PublishContext":
+        """以当前配置与当前团体为底稿生成快照；title 为 None 时沿用 config.yaml 中的默认标题"""
+        cfg = settings.publishers.bilibili
+        return cls(
+            title=cfg.title if title is None else title,
+            visibility=cfg.visibility,
+            id_retention_level=getattr(cfg, 'tweet_id_retention', 0),
+            account_name=current_group().bili_account_name,
+            original_only=original_only,
+        )
+
+    def with_title(self, title: str) -> "PublishContext":
+        return replace(self, title=title)
@@ -0,0 +1,75 @@
+import time
+import asyncio
+import logging
+
+from common.config_loader import settings
+from common.group_context import current_group
+
+logger = logging.getLogger("GloBot_PublishScheduler")
+
+ACTIONS = ("repost", "dynamic", "video")
+ACTION_LABELS = {"repost": "原生转发", "dynamic": "图文动态", "video": "视频投稿"}
+
+# ==========================================
+# 🪣 B 站发布令牌桶
+# 取代各车间各自为政的 65 秒硬睡眠：同一个 B 站账号的所有车道共享一组令牌桶，
+# 每种动作 (转发 / 图文 / 视频) 独立限速，另有账号级最小动作间隔。
+# 只有真正向 B 站发包的那一刻才排队取令牌，等待期间媒体车间照常预处理后续任务。
+# ==========================================
+class TokenBucket:
+    def __init__(self, interval_sec: float, burst: int):
+        self.interval = interval_sec
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) / self.interval)
+        self.updated = now
+
+    def eta(self) -> float:
+        self._refill()
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) * self.interval
+
+    async def take(self):
+        # 锁保证同一个桶的等待者先到先得
+        async with self._lock:
+            while (wait := self.eta()) > 0: await asyncio.sleep(wait)
+            self.tokens -= 1
+
+class AccountScheduler:
+    """单个 B 站账号的发布节流器"""
+    def __init__(self, name: str):
+        self.name = name
+        cfg = settings.publishers.bilibili
+        self.buckets = {a: TokenBucket(cfg.rate_limits[a].interval_sec, cfg.rate_limits[a].burst) for a in ACTIONS}
+        self.min_gap = cfg.min_action_gap_sec
+        self.last_action = 0.0
+        self._gap_lock = asyncio.Lock()
+
+    async def acquire(self, action: str):
+        await self.buckets[action].take()
+        async with self._gap_lock:
+            wait = self.last_action + self.min_gap - time.monotonic()
+            if wait > 0: await asyncio.sleep(wait)
+            self.last_action = time.monotonic()
+
+_schedulers: dict[str, AccountScheduler] = {}
+
+def get_scheduler() -> AccountScheduler:
+    """按当前团体取节流器 (每个团体对应一个 B 站账号)"""
+    name = current_group().name
+    if name not in _schedulers: _schedulers[name] = AccountScheduler(name)
+    return _schedulers[name]
+
+async def acquire_publish_slot(action: str):
+    sched = get_scheduler()
+    wait = sched.buckets[action].eta()
+    if wait > 1: logger.info(f"🪣 [{sched.name}] {ACTION_LABELS[action]} 令牌冷却中，约 {wait:.0f} 秒后发包...")
+    await sched.acquire(action)
+
+def scheduler_stats() -> dict:
+    """各账号各动作距离下一个可用令牌的秒数，供 /status 展示"""
+    return {name: {a: round(b.eta()) for a, b in s.buckets.items()} for name, s in _schedulers.items()}
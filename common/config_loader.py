@@ -1,6 +1,7 @@
 import os
 import yaml
 import sys
+from typing import Literal
 from pydantic import BaseModel, Field, model_validator
 from dotenv import load_dotenv
 from pathlib import Path
@@ -20,6 +21,14 @@ class TargetConfig(BaseModel):
     group_name: str
     x_accounts: list[str]
     account_title_map: dict[str, str] = Field(default_factory=dict)
+    account_priority: dict[str, float] = Field(default_factory=dict)  # 👈 新增：账号调度加分 (键为小写推特 ID)
+
+# 👇 新增：多团体租户配置 (同一进程内额外托管的团体，各自拥有独立的状态、知识库与 B 站账号)
+class GroupConfig(BaseModel):
+    targets: TargetConfig
+    data_dir: str = Field(default="", description="留空则使用 ./GloBot_Data/<group_name>")
+    bili_auth_file: str = Field(default="", description="auth_store 下的 B 站凭证文件名，留空则为 bili_auth_<group_name>.json")
+    bili_account_name: str = Field(default="", description="该团体 B 站搬运号名称，留空则沿用 BILI_ACCOUNT_NAME")
 
 # 👇 新增：作息时间数据模型
 class SleepScheduleConfig(BaseModel):
@@ -27,11 +36,69 @@ class SleepScheduleConfig(BaseModel):
     start_time: str = "02:00"
     end_time: str = "07:00"
 
+# 👇 新增：自适应巡视节奏 (按各成员历史发推的小时分布调整间隔)
+class AdaptivePollingConfig(BaseModel):
+    enable: bool = True
+    lookback_days: int = Field(default=28, ge=7, description="统计发推规律所用的历史天数")
+    min_interval_sec: int = Field(default=90, ge=30, description="巡视间隔下限 (风控安全线)")
+    max_interval_sec: int = Field(default=1200, ge=60, description="巡视间隔上限")
+    polls_per_day: int = Field(default=180, ge=24, description="每天的巡视预算 (旧版约 200 次)，按发推率分配到各时段")
+    burst_weight: float = Field(default=0.5, ge=0, description="最近一小时每条新推文额外叠加的每小时发推率 (开播/返图往往扎堆)")
+    night_wake_rate: float = Field(default=1.0, gt=0, description="休眠时段内历史发推率 (条/小时) 达到该值时不再蛰伏，改按上限间隔巡视")
+    jitter: float = Field(default=0.2, ge=0, le=0.5, description="间隔随机抖动比例，避免机械节奏")
+
+    @model_validator(mode='after')
+    def check_bounds(self):
+        if self.min_interval_sec > self.max_interval_sec:
+            raise ValueError("adaptive_polling.min_interval_sec 不能大于 max_interval_sec")
+        return self
+
+# 👇 新增：历史补录 (按成员/日期区间翻搜索结果，低优先级限速投递到车道)
+class BackfillConfig(BaseModel):
+    max_per_hour: int = Field(default=12, ge=1, description="补录推文每小时最多投递条数")
+    max_lane_backlog: int = Field(default=3, ge=0, description="图文/视频车道积压超过该值时暂停投递，实时推文优先")
+    pages_per_slice: int = Field(default=5, ge=1, le=50, description="每次搜索向下翻页数 (一页约 20 条)")
+    slice_pause_sec: int = Field(default=90, ge=10, description="两次搜索之间的间隔，控制风控压力")
+
+# 👇 新增：重点成员的账号页时间线 (UserTweets)，与【正在关注】信息流合并化验
+class AccountTimelinesConfig(BaseModel):
+    enable: bool = False
+    accounts: list[str] = Field(default_factory=list, description="重点成员账号 (不带 @)；留空则取各团体的全部监控成员")
+    pool_size: int = Field(default=2, ge=1, le=8, description="热浏览器里常驻的账号页标签数，即同时抓取的账号上限")
+    max_per_round: int = Field(default=4, ge=1, description="每轮巡视最多抓取几个账号页 (最久没抓的优先)")
+    min_interval_sec: int = Field(default=600, ge=60, description="同一账号页两次抓取的最短间隔，控制风控压力")
+    max_age_min: int = Field(default=180, ge=10, description="只收账号页里多少分钟内发出、且信息流中没出现过的推文 (置顶与陈年旧推不当作新动态)")
+
+# 👇 新增：爬虫抓包模式的资源拦截 (只消费 GraphQL JSON，图片/视频/字体/第三方请求一律掐断)
+class CaptureFilterConfig(BaseModel):
+    enable: bool = True
+    block_types: list[str] = Field(default_factory=lambda: ["image", "media", "font"], description="按 Playwright resource_type 拦截")
+    first_party_hosts: list[str] = Field(default_factory=lambda: ["x.com", "twitter.com", "twimg.com"], description="第一方域名 (含子域名)，其余域名一律视为第三方拦截")
+    allow_patterns: list[str] = Field(default_factory=list, description="URL 包含任一片段即放行，优先级最高")
+
+# 👇 新增：媒体下载引擎 (常驻连接池 + 有界并发队列，取代每个文件单独拉起一次 aria2c)
+class MediaDownloadConfig(BaseModel):
+    workers: int = Field(default=8, ge=1, le=64, description="并发下载任务数")
+    per_host_connections: int = Field(default=4, ge=1, le=32, description="同一域名同时占用的连接上限")
+    split_threshold_mb: int = Field(default=16, ge=1, description="超过该体积且服务器支持 Range 时才分段并行下载")
+    split_parts: int = Field(default=4, ge=1, le=16, description="大文件分段数")
+    timeout_sec: float = Field(default=60, gt=0, description="单次请求的读超时")
+    max_tries: int = Field(default=3, ge=1, le=10)
+
 class CrawlerGlobalSettings(BaseModel):
     max_retries: int = Field(default=3, ge=1, le=5) 
     scroll_timeout_ms: int
-    scroll_depth: int
+    scroll_depth: int = Field(ge=0, description="单轮向下追赶高水位的最大滚动像素，0 为只看首屏")
+    browser_max_age_min: int = Field(default=360, ge=10, description="常驻浏览器最长存活时间，超过后回收重启")
+    browser_max_rss_mb: int = Field(default=1500, ge=200, description="常驻浏览器进程树内存上限，超过后回收重启")
+    capture_filter: CaptureFilterConfig = Field(default_factory=CaptureFilterConfig)
+    capture_archive_mb: int = Field(default=512, ge=16, description="原始抓包归档总体积上限 (压缩后)，超出从最旧的开始滚动删除")
+    capture_retention_days: float = Field(default=14.0, gt=0, description="原始抓包归档最长保留天数")
+    media_download: MediaDownloadConfig = Field(default_factory=MediaDownloadConfig)
     sleep_schedule: SleepScheduleConfig = Field(default_factory=SleepScheduleConfig) # 👈 注入配置
+    adaptive_polling: AdaptivePollingConfig = Field(default_factory=AdaptivePollingConfig)
+    backfill: BackfillConfig = Field(default_factory=BackfillConfig)
+    account_timelines: AccountTimelinesConfig = Field(default_factory=AccountTimelinesConfig)
 
 class CrawlerPlatformConfig(BaseModel):
     enable: bool = False
@@ -65,6 +132,11 @@ class VideoPresetConfig(BaseModel):
     tid: int
     tags: str
 
+# 👇 新增：B 站发布令牌桶 (每种动作独立限速)
+class PublishRateConfig(BaseModel):
+    interval_sec: float = Field(default=65, gt=0, description="每个令牌的回填间隔")
+    burst: int = Field(default=1, ge=1, description="令牌桶容量 (允许的连发次数)")
+
 class BilibiliPublisherConfig(BaseModel):
     visibility: int = Field(default=1, description="0为公开, 1为仅自己可见")
     title: str = Field(default="", max_length=20)
@@ -77,6 +149,10 @@ class BilibiliPublisherConfig(BaseModel):
     video_copyright: int = 2
     video_tid: int = 171
     video_tags: str = "iLiFE!,地下偶像"
+    rate_limits: dict[Literal["repost", "dynamic", "video"], PublishRateConfig] = Field(default_factory=lambda: {
+        "repost": PublishRateConfig(interval_sec=65), "dynamic": PublishRateConfig(interval_sec=65), "video": PublishRateConfig(interval_sec=120)
+    })
+    min_action_gap_sec: float = Field(default=20, ge=0, description="同一账号任意两次发包之间的最小间隔")
     
     # 👇 2. 新增：注入预设选项列表。默认写死了几套配置防止 yaml 没更新时报错
     video_presets: list[VideoPresetConfig] = Field(default_factory=lambda: [
@@ -88,6 +164,29 @@ class BilibiliPublisherConfig(BaseModel):
 class PublishersConfig(BaseModel):
     bilibili: BilibiliPublisherConfig
 
+# 👇 新增：持久化流水线 (磁盘任务队列) 参数
+class PipelineConfig(BaseModel):
+    visibility_timeout_sec: int = Field(default=900, ge=60, description="任务被领取后的可见性超时，超时未确认将被重新投递")
+    max_attempts: int = Field(default=3, ge=1, description="任务最多尝试次数，超过后打入死信")
+    retry_delay_sec: int = Field(default=120, ge=0, description="失败任务重新入队前的退避时间")
+    poll_interval_sec: float = Field(default=2.0, gt=0, description="空闲车间轮询磁盘队列的间隔")
+    media_workers: int = Field(default=1, ge=1, description="每条车道并发运行的媒体预处理车间数量")
+    lane_workers: dict[str, int] = Field(default_factory=dict, description="按车道单独指定车间数 (text/video/publish_text/publish_video)，未列出的媒体车道用 media_workers，发布车道默认 1")
+    llm_concurrency: int = Field(default=2, ge=1, description="全部团体共享的大模型并发请求上限")
+    lane_capacity: dict[str, int] = Field(default_factory=lambda: {"text": 60, "video": 15, "publish_text": 30, "publish_video": 5},
+        description="车道积压上限 (排队 + 处理中)：text/video 按采集 + 待发布端到端计算并触发削峰，publish_* 满时媒体车间暂停领料；0 或不填表示不设限")
+    overload_policies: list[Literal["drop_retweets", "collapse_older", "downgrade_video"]] = Field(
+        default_factory=lambda: ["drop_retweets", "downgrade_video"], description="车道过载时按顺序执行的削峰策略")
+    priority_aging_per_min: float = Field(default=1.0, ge=0, description="排队任务每等待 1 分钟增加的优先级分，防止低优先级任务饿死")
+    freshness_window_min: int = Field(default=180, ge=1, description="推文新鲜度加分的衰减窗口 (分钟)")
+    job_retention_days: float = Field(default=7.0, ge=1, description="已完成/被削峰的任务记录保留天数，过期由清洁工清理")
+    backpressure_sleep_sec: int = Field(default=1200, ge=60, description="削峰后仍然过载时，爬虫雷达放缓到的巡视间隔")
+    stage_deadlines: dict[str, int] = Field(default_factory=lambda: {
+        "crawl": 300, "parse": 600, "translate": 240, "ocr": 600,
+        "transcribe": 1200, "encode": 1200, "upload": 1800, "publish": 600,
+    }, description="各工序的时间预算 (秒)，超时即取消并走降级路径；0 表示不设限")
+    state_journal_mode: Literal["WAL", "DELETE"] = Field(default="WAL", description="状态仓库日志模式，跨主机共享存储时请改为 DELETE")
+
 # 👇 新增：提示词配置数据模型
 class PromptsConfig(BaseModel):
     tweet_translation_prompt: str
@@ -102,6 +201,8 @@ class AppConfig(BaseModel):
     publishers: PublishersConfig
     system: SystemConfig
     prompts: PromptsConfig  # 👈 新增：将提示词引擎接入全局配置
+    pipeline: PipelineConfig = Field(default_factory=PipelineConfig)  # 👈 新增：持久化队列参数 (缺省时使用默认值)
+    extra_groups: list[GroupConfig] = Field(default_factory=list)  # 👈 新增：同进程托管的其他团体
 
     # ==========================================
     # 🚨 核心黑科技：跨模块冲突拦截器 (防呆设计)
@@ -137,6 +238,29 @@ class AppConfig(BaseModel):
 
         # 🚨 已切除：移除了旧版关于同时开启生熟肉会重复发送的警告，适应全新的 TG 抉择架构
 
+        group_names = [self.targets.group_name] + [g.targets.group_name for g in self.extra_groups]
+        if len(set(group_names)) != len(group_names):
+            errors.append(
+                "❌ 【配置冲突】[extra_groups] 中存在重复的 group_name，\n"
+                "   多团体模式下每个团体的数据目录以 group_name 区分！\n"
+                "   👉 解决办法：请为每个团体设置唯一的 group_name。"
+            )
+
+        bad_lanes = {k: v for k, v in self.pipeline.lane_workers.items() if k not in ("text", "video", "publish_text", "publish_video") or v < 1}
+        if bad_lanes:
+            errors.append(
+                f"❌ 【配置冲突】[pipeline.lane_workers] 存在非法条目: {bad_lanes}\n"
+                "   车道名只能是 text / video / publish_text / publish_video，车间数必须 ≥ 1！"
+            )
+
+        stages = ("crawl", "parse", "translate", "ocr", "transcribe", "encode", "upload", "publish")
+        bad_stages = {k: v for k, v in self.pipeline.stage_deadlines.items() if k not in stages or v < 0}
+        if bad_stages:
+            errors.append(
+                f"❌ 【配置冲突】[pipeline.stage_deadlines] 存在非法条目: {bad_stages}\n"
+                f"   工序名只能是 {' / '.join(stages)}，时限必须 ≥ 0！"
+            )
+
         if errors:
             print("\n" + "="*60)
             print("🚨 致命配置错误拦截 🚨")
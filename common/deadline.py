@@ -0,0 +1,86 @@
+import os
+import signal
+import asyncio
+import logging
+
+from common.config_loader import settings
+
+logger = logging.getLogger("GloBot_Deadline")
+
+STAGE_LABELS = {
+    "crawl": "爬虫抓取", "parse": "解析与媒体下载", "translate": "文本翻译", "ocr": "视频 OCR",
+    "transcribe": "语音听译", "encode": "FFmpeg 压制", "upload": "视频上传", "publish": "B站发布",
+}
+KILL_GRACE_SEC = 5  # SIGTERM 之后留给子进程收尾的时间，过时直接 SIGKILL
+
+class StageTimeout(RuntimeError):
+    """某道工序超出时间预算；继承 RuntimeError，未被降级兜住时按普通运行时异常退避重试"""
+    def __init__(self, stage: str, seconds: float):
+        self.stage, self.seconds = stage, seconds
+        super().__init__(f"STAGE_TIMEOUT: {stage} 超过 {seconds:.0f} 秒未完成")
+
+# 超时计数 (供 /status 展示) 与播报回调 (由主程序注入 Telegram 推送，避免底座反向依赖 Bot_Master)
+timeout_counts: dict[str, int] = {s: 0 for s in STAGE_LABELS}
+_reporter = None
+
+def set_timeout_reporter(fn):
+    """fn(stage, seconds, detail) 为协程函数，每次工序超时调用一次"""
+    global _reporter
+    _reporter = fn
+
+def stage_budget(stage: str | None) -> float | None:
+    budget = settings.pipeline.stage_deadlines.get(stage, 0)
+    return budget or None
+
+async def _report(stage: str, seconds: float, detail: str):
+    timeout_counts[stage] = timeout_counts.get(stage, 0) + 1
+    logger.error(f"⏰ [工序超时] {STAGE_LABELS.get(stage, stage)} ({stage}) 超过 {seconds:.0f} 秒，已取消{f': {detail}' if detail else ''}")
+    if _reporter is None: return
+    try: await _reporter(stage, seconds, detail)
+    except Exception as e: logger.warning(f"⚠️ [工序超时] 播报失败: {e}")
+
+# ==========================================
+# ⏰ 工序时限
+# 每道工序独立计时，超时即取消内部协程 (连带清理 FFmpeg 子进程) 并抛出 StageTimeout，
+# 由调用方决定降级路径：翻译超时发原文、听译/压制超时只发原片、抓取超时跳过本轮等。
+# ==========================================
+async def run_stage(stage: str | None, aw, detail: str = ""):
+    budget = stage_budget(stage)
+    if budget is None: return await aw
+    # 用 asyncio.wait 计时 (兼容 Python 3.10)：只认领自己这道闸门的超时，内部组件自带的 TimeoutError 原样抛出
+    task = asyncio.ensure_future(aw)
+    try: done, _ = await asyncio.wait({task}, timeout=budget)
+    except asyncio.CancelledError:
+        task.cancel()
+        raise
+    if done: return task.result()
+    task.cancel()
+    await asyncio.wait({task})  # 等内部协程收尾 (如清理 FFmpeg 子进程) 后再上报
+    if not task.cancelled(): task.exception()
+    await _report(stage, budget, detail)
+    raise StageTimeout(stage, budget)
+
+async def _reap(proc: asyncio.subprocess.Process):
+    """先礼后兵：整个进程组先 SIGTERM，宽限期过后 SIGKILL，确保不留孤儿 FFmpeg"""
+    for sig, grace in ((signal.SIGTERM, KILL_GRACE_SEC), (signal.SIGKILL, None)):
+        try: os.killpg(proc.pid, sig)
+        except ProcessLookupError: return
+        try:
+            await asyncio.wait_for(proc.wait(), grace)
+            return
+        except asyncio.TimeoutError: continue
+
+async def run_subprocess(stage: str | None, *cmd, cwd=None, detail: str = "") -> tuple[int, bytes]:
+    """在工序时限内运行外部命令，返回 (returncode, stderr)；超时或被外层取消时连同子进程组一起清理。
+    stage 为 None 时不单独计时，只保证被外层工序取消时不留孤儿进程"""
+    proc = await asyncio.create_subprocess_exec(
+        *cmd, cwd=cwd, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE,
+        start_new_session=True  # 独立进程组，便于一次性清理 FFmpeg 派生的子进程
+    )
+    try:
+        _, stderr = await run_stage(stage, proc.communicate(), detail)
+        return proc.returncode, stderr
+    finally:
+        if proc.returncode is None:
+            logger.warning(f"🔪 [{stage}] 正在终止子进程 {cmd[0]} (pid {proc.pid})...")
+            await _reap(proc)
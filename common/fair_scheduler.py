@@ -0,0 +1,74 @@
+import asyncio
+import logging
+from collections import deque
+from contextlib import asynccontextmanager
+
+from common.group_context import current_group
+
+logger = logging.getLogger("GloBot_FairScheduler")
+
+# ==========================================
+# ⚖️ 多团体公平闸门
+# 共享重资源 (大模型 API、听译引擎) 时，每个团体拥有独立的等待队列，
+# 名额释放后按团体轮转放行，避免某个团体的爆发流量饿死其他团体。
+# ==========================================
+class FairScheduler:
+    def __init__(self, name: str, concurrency: int):
+        self.name = name
+        self.concurrency = concurrency
+        self._active = 0
+        self._waiters: dict[str, deque] = {}
+        self._turns: deque = deque()
+
+    @asynccontextmanager
+    async def slot(self, key: str | None = None):
+        await self._acquire(key or current_group().name)
+        try:
+            yield
+        finally:
+            self._release()
+
+    async def detach(self, start, key: str | None = None) -> asyncio.Future:
+        """领到名额后在后台启动 start() 并返回其任务；名额一直占到任务真正结束才归还。
+        用于无法强杀的线程推理：调用方 shield 着等，超时即走，后台跑完之前不会放下一个进来"""
+        await self._acquire(key or current_group().name)
+        try: task = asyncio.ensure_future(start())
+        except BaseException:
+            self._release()
+            raise
+        def _done(t: asyncio.Future):
+            if not t.cancelled(): t.exception()  # 调用方已放弃等待时也取走异常，避免 "never retrieved" 告警
+            self._release()
+        task.add_done_callback(_done)
+        return task
+
+    async def _acquire(self, key: str):
+        if self._active < self.concurrency and not self._waiters:
+            self._active += 1
+            return
+        fut = asyncio.get_running_loop().create_future()
+        self._waiters.setdefault(key, deque()).append(fut)
+        if key not in self._turns: self._turns.append(key)
+        try:
+            await fut
+        except asyncio.CancelledError:
+            # 名额已经分配到手却被取消，必须归还，否则闸门永久少一个名额
+            if fut.done() and not fut.cancelled(): self._release()
+            raise
+
+    def _release(self):
+        self._active -= 1
+        while self._active < self.concurrency and self._turns:
+            key = self._turns.popleft()
+            queue = self._waiters.get(key)
+            while queue and queue[0].done(): queue.popleft()
+            if not queue:
+                self._waiters.pop(key, None)
+                continue
+            queue.popleft().set_result(None)
+            self._active += 1
+            if queue: self._turns.append(key)
+            else: self._waiters.pop(key, None)
+
+    def stats(self) -> dict:
+        return {"active": self._active, "waiting": {k: len(q) for k, q in self._waiters.items()}}
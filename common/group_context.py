@@ -0,0 +1,76 @@
+import os
+from pathlib import Path
+from dataclasses import dataclass
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from common.config_loader import settings, TargetConfig, BILI_ACCOUNT_NAME
+
+AUTH_DIR = Path(__file__).resolve().parent.parent / "auth_store"
+
+# ==========================================
+# 👥 多团体租户上下文
+# 每个 asyncio 任务在创建时继承当前团体，模块里原先写死在导入期的 DATA_DIR / 知识库 / B站凭证，
+# 统一改为在运行期通过 current_group() 动态寻址。
+# ==========================================
+@dataclass(frozen=True)
+class GroupContext:
+    name: str
+    targets: TargetConfig
+    data_dir: Path
+    kb_dir: Path
+    bili_auth_file: Path
+    bili_account_name: str
+
+    @property
+    def target_accounts(self) -> list[str]:
+        return [acc.lower() for acc in self.targets.x_accounts]
+
+def _build_groups() -> list[GroupContext]:
+    # 主团体完全沿用旧版路径约定，保证单团体部署零迁移
+    primary_name = settings.targets.group_name
+    groups = [GroupContext(
+        name=primary_name,
+        targets=settings.targets,
+        data_dir=Path(os.getenv("LOCAL_DATA_DIR", f"./GloBot_Data/{primary_name}")),
+        kb_dir=Path(os.getenv("LOCAL_DATA_DIR", "./GloBot_Data")) / "knowledge_base",
+        bili_auth_file=AUTH_DIR / "bili_auth.json",
+        bili_account_name=BILI_ACCOUNT_NAME,
+    )]
+    for g in settings.extra_groups:
+        name = g.targets.group_name
+        data_dir = Path(g.data_dir) if g.data_dir else Path(f"./GloBot_Data/{name}")
+        groups.append(GroupContext(
+            name=name,
+            targets=g.targets,
+            data_dir=data_dir,
+            kb_dir=data_dir / "knowledge_base",
+            bili_auth_file=AUTH_DIR / (g.bili_auth_file or f"bili_auth_{name}.json"),
+            bili_account_name=g.bili_account_name or BILI_ACCOUNT_NAME,
+        ))
+    return groups
+
+GROUPS = _build_groups()
+PRIMARY_GROUP = GROUPS[0]
+
+_current_group: ContextVar[GroupContext] = ContextVar("globot_group", default=PRIMARY_GROUP)
+
+def current_group() -> GroupContext:
+    return _current_group.get()
+
+def get_group(name: str) -> GroupContext | None:
+    for g in GROUPS:
+        if g.name.lower() == name.lower(): return g
+    return None
+
+def is_multi_group() -> bool:
+    return len(GROUPS) > 1
+
+@contextmanager
+def use_group(group: GroupContext):
+    """在代码块内切换当前团体；在块内 create_task 出来的协程会永久继承该团体"""
+    token = _current_group.set(group)
+    try:
+        yield group
+    finally:
+        _current_group.reset(token)
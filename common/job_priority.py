@@ -0,0 +1,45 @@
+import time
+
+from common.config_loader import settings
+from common.group_context import current_group
+from common.tweet_record import TweetRecord
+
+# ==========================================
+# 🎯 任务优先级打分
+# 分值单位约等于「排队 1 分钟」：领取时再叠加 pipeline.priority_aging_per_min × 已等待分钟数，
+# 低分任务等得越久分越高，不会被高优先级任务永久饿死。
+# ==========================================
+NODE_TYPE_BONUS = {"ORIGINAL": 10.0, "QUOTE": 6.0, "REPLY": 3.0, "RETWEET": 0.0}
+TITLED_ACCOUNT_BONUS = 5.0   # 在 account_title_map 中登记过的账号
+FRESHNESS_BONUS = 20.0       # 刚发出的推文满额加分，随推文年龄线性衰减到 0
+VIDEO_COST = 4.0             # 每个视频 (听译 + 压制 + 人工审片) 的预估成本
+IMAGE_COST = 0.5
+ANCESTOR_COST = 2.0          # 每个尚需穿透首发的祖先节点
+BACKFILL_PENALTY = 600.0     # 历史补录任务：相当于多排队 10 小时，实时推文永远先走
+
+def _count_media(node: TweetRecord) -> tuple[int, int]:
+    media = [str(m).lower() for m in node.media]
+    videos = sum(m.endswith(('.mp4', '.mov')) for m in media)
+    return videos, len(media) - videos
+
+def base_priority(tweet: TweetRecord, now: float | None = None) -> float:
+    now = now or time.time()
+    targets = current_group().targets
+    author = tweet.author.lower()
+
+    score = targets.account_priority.get(author, 0.0)
+    if author in targets.account_title_map: score += TITLED_ACCOUNT_BONUS
+    score += NODE_TYPE_BONUS.get(tweet.node_type, 0.0)
+
+    window = settings.pipeline.freshness_window_min * 60
+    age = max(0.0, now - (tweet.timestamp or now))
+    score += FRESHNESS_BONUS * max(0.0, 1 - age / window)
+
+    chain = tweet.quote_chain
+    videos = images = 0
+    for node in chain + [tweet]:
+        v, i = _count_media(node)
+        videos, images = videos + v, images + i
+    score -= VIDEO_COST * videos + IMAGE_COST * images + ANCESTOR_COST * len(chain)
+    if tweet.backfill: score -= BACKFILL_PENALTY
+    return round(score, 2)
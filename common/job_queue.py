@@ -0,0 +1,339 @@
+import os
+import json
+import time
+import zlib
+import socket
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+
+from common.config_loader import settings
+from common.state_manager import get_conn, transaction, run_sql
+from common.group_context import current_group, use_group
+from common.job_priority import base_priority
+from common.tweet_record import TweetRecord
+
+logger = logging.getLogger("GloBot_JobQueue")
+
+# 任务状态机: pending -> inflight -> done
+#                          └─(失败)─> pending (退避重试) ─(超过最大尝试次数)─> dead (死信)
+#              pending ─(车道过载, 被削峰策略丢弃)─> shed
+# done / shed 超过 pipeline.job_retention_days 后由 purge_finished 清理 (死信保留供人工排查)
+JOBS_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    job_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    lane TEXT NOT NULL,
+    tweet_id TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    checkpoint TEXT,
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    visible_at REAL NOT NULL,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    last_error TEXT,
+    owner TEXT,
+    chain_hash INTEGER NOT NULL DEFAULT 0,
+    priority REAL NOT NULL DEFAULT 0,
+    UNIQUE(lane, tweet_id)
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_claim ON jobs(lane, status, visible_at, job_id);
+CREATE INDEX IF NOT EXISTS idx_jobs_tweet ON jobs(tweet_id);
+"""
+
+# 租约持有者标识：主机名 + 进程号。拆分部署时，多个 worker 进程共享同一个磁盘 broker
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"
+
+# 每个团体的状态库各自建表一次
+_schema_ready: set[int] = set()
+
+def _ensure_schema():
+    conn = get_conn()
+    if id(conn) not in _schema_ready:
+        conn.executescript(JOBS_SCHEMA)
+        cols = {r['name'] for r in conn.execute("PRAGMA table_info(jobs)").fetchall()}
+        if 'owner' not in cols: conn.execute("ALTER TABLE jobs ADD COLUMN owner TEXT")
+        if 'chain_hash' not in cols: conn.execute("ALTER TABLE jobs ADD COLUMN chain_hash INTEGER NOT NULL DEFAULT 0")
+        if 'priority' not in cols: conn.execute("ALTER TABLE jobs ADD COLUMN priority REAL NOT NULL DEFAULT 0")
+        _schema_ready.add(id(conn))
+
+def chain_key(tweet: TweetRecord) -> str:
+    """引用链的根祖先 ID：共享同一根祖先的推文必须按顺序串行发布，否则会重复首发祖先"""
+    return tweet.quote_chain[0].id if tweet.quote_chain else tweet.id
+
+def chain_hash(tweet: TweetRecord) -> int:
+    return zlib.crc32(chain_key(tweet).encode())
+
+class Job:
+    __slots__ = ('job_id', 'lane', 'tweet_id', 'payload', 'checkpoint', 'attempts')
+
+    def __init__(self, row):
+        self.job_id = row['job_id']
+        self.lane = row['lane']
+        self.tweet_id = row['tweet_id']
+        self.payload = TweetRecord.from_dict(json.loads(row['payload']))
+        self.checkpoint = json.loads(row['checkpoint']) if row['checkpoint'] else None
+        self.attempts = row['attempts']
+
+# ==========================================
+# 📦 底层原语 (均为单语句或单事务，跨进程安全)
+# ==========================================
+def _insert_job(conn, lane: str, tweet: TweetRecord, checkpoint: dict | None, now: float):
+    return conn.execute(
+        "INSERT OR IGNORE INTO jobs (lane, tweet_id, payload, checkpoint, visible_at, created_at, updated_at, chain_hash, priority) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+        (lane, tweet.id, json.dumps(tweet.to_payload(), ensure_ascii=False),
+         json.dumps(checkpoint, ensure_ascii=False) if checkpoint is not None else None, now, now, now, chain_hash(tweet), base_priority(tweet, now))
+    )
+
+def enqueue(lane: str, tweet: TweetRecord) -> bool:
+    """投递任务，并在同一事务里把推文写入爬虫去重表 —— 二者要么同时落盘，要么都不发生"""
+    _ensure_schema()
+    now = time.time()
+    with transaction() as conn:
+        cur = _insert_job(conn, lane, tweet, None, now)
+        conn.execute("INSERT OR IGNORE INTO tweets (tweet_id, author, tweeted_at) VALUES (?, ?, ?)",
+                     (tweet.id, tweet.author, tweet.timestamp))
+    return cur.rowcount > 0
+
+def claim(lane: str, visibility_timeout: float, shard: tuple[int, int] | None = None) -> Job | None:
+    """领取一条可见任务 (pending 到期 / inflight 租约超时)，超过最大尝试次数的直接打入死信。
+    shard=(序号, 总数) 时只领取引用链哈希落在本分片的任务，同一条链永远由同一个车间按序处理。
+    领取顺序按「优先级分 + 排队老化分」从高到低；同一条引用链内仍严格按入队顺序，链头未完成前后继任务不可见"""
+    _ensure_schema()
+    max_attempts = settings.pipeline.max_attempts
+    aging = settings.pipeline.priority_aging_per_min / 60
+    shard_sql, shard_args = "", ()
+    if shard and shard[1] > 1:
+        shard_sql, shard_args = " AND chain_hash % ? = ?", (shard[1], shard[0])
+    while True:
+        now = time.time()
+        with transaction() as conn:
+            row = conn.execute(
+                "SELECT * FROM jobs WHERE lane = ? AND status IN ('pending', 'inflight') AND visible_at <= ?" + shard_sql +
+                " AND NOT EXISTS (SELECT 1 FROM jobs AS head WHERE head.lane = jobs.lane AND head.chain_hash = jobs.chain_hash"
+                " AND head.status IN ('pending', 'inflight') AND head.job_id < jobs.job_id)"
+                " ORDER BY priority + (? - created_at) * ? DESC, job_id LIMIT 1",
+                (lane, now) + shard_args + (now, aging)
+            ).fetchone()
+            if row is None: return None
+            if row['attempts'] >= max_attempts:
+                conn.execute("UPDATE jobs SET status = 'dead', updated_at = ?, last_error = COALESCE(last_error, 'LEASE_EXPIRED') WHERE job_id = ?",
+                             (now, row['job_id']))
+                logger.error(f"💀 [死信] 任务 {row['tweet_id']} ({lane}) 已耗尽 {max_attempts} 次尝试，移入死信区。")
+                continue
+            conn.execute("UPDATE jobs SET status = 'inflight', attempts = attempts + 1, visible_at = ?, updated_at = ?, owner = ? WHERE job_id = ?",
+                         (now + visibility_timeout, now, WORKER_ID, row['job_id']))
+            row = conn.execute("SELECT * FROM jobs WHERE job_id = ?", (row['job_id'],)).fetchone()
+        return Job(row)
+
+def extend(job: Job, visibility_timeout: float):
+    now = time.time()
+    run_sql("UPDATE jobs SET visible_at = ?, updated_at = ? WHERE job_id = ? AND status = 'inflight'",
+             (now + visibility_timeout, now, job.job_id))
+
+def save_checkpoint(job: Job, checkpoint: dict):
+    job.checkpoint = checkpoint
+    run_sql("UPDATE jobs SET checkpoint = ?, updated_at = ? WHERE job_id = ?",
+             (json.dumps(checkpoint, ensure_ascii=False), time.time(), job.job_id))
+
+def ack(job: Job):
+    run_sql("UPDATE jobs SET status = 'done', updated_at = ? WHERE job_id = ?", (time.time(), job.job_id))
+
+def handoff(job: Job, next_lane: str, checkpoint: dict) -> bool:
+    """工序交接：在同一事务里向下游车道投递成品并确认本工序完成，崩溃时不会丢件也不会重复交接"""
+    now = time.time()
+    with transaction() as conn:
+        cur = _insert_job(conn, next_lane, job.payload, checkpoint, now)
+        conn.execute("UPDATE jobs SET status = 'done', checkpoint = ?, updated_at = ? WHERE job_id = ?",
+                     (json.dumps(checkpoint, ensure_ascii=False), now, job.job_id))
+    return cur.rowcount > 0
+
+def nack(job: Job, error: str, retry_delay: float | None = None) -> bool:
+    """失败回退：还有尝试次数则退避后重新排队，否则打入死信。返回是否进入死信"""
+    now = time.time()
+    delay = settings.pipeline.retry_delay_sec if retry_delay is None else retry_delay
+    is_dead = job.attempts >= settings.pipeline.max_attempts
+    run_sql("UPDATE jobs SET status = ?, visible_at = ?, updated_at = ?, last_error = ? WHERE job_id = ?",
+             ('dead' if is_dead else 'pending', now + delay, now, str(error)[:500], job.job_id))
+    return is_dead
+
+def bury(job: Job, reason: str):
+    """业务性失败 (如主理人取消、链条断裂)，重试无意义，直接进入死信"""
+    run_sql("UPDATE jobs SET status = 'dead', updated_at = ?, last_error = ? WHERE job_id = ?", (time.time(), str(reason)[:500], job.job_id))
+
+def release(job: Job):
+    """原样吐回队列 (不计尝试次数，保持原有排队顺序)，用于熔断挂起时保护现场"""
+    run_sql("UPDATE jobs SET status = 'pending', attempts = MAX(attempts - 1, 0), visible_at = ?, updated_at = ? WHERE job_id = ?",
+             (time.time(), time.time(), job.job_id))
+
+def _owner_is_dead(owner: str | None) -> bool:
+    """仅能判定本机进程的生死；其他主机持有的租约交给可见性超时兜底"""
+    if not owner: return True
+    host, _, pid = owner.rpartition(":")
+    if host != socket.gethostname(): return False
+    try:
+        os.kill(int(pid), 0)
+        return int(pid) == os.getpid()
+    except ProcessLookupError: return True
+    except (ValueError, PermissionError): return False
+
+def recover_inflight(lane: str) -> int:
+    """进程重启后，把本机已死进程遗留的 inflight 任务立即放回队首"""
+    _ensure_schema()
+    now = time.time()
+    with transaction() as conn:
+        rows = conn.execute("SELECT job_id, owner FROM jobs WHERE lane = ? AND status = 'inflight'", (lane,)).fetchall()
+        orphans = [(now, r['job_id']) for r in rows if _owner_is_dead(r['owner'])]
+        conn.executemany("UPDATE jobs SET status = 'pending', attempts = MAX(attempts - 1, 0), visible_at = ?, owner = NULL WHERE job_id = ?", orphans)
+    return len(orphans)
+
+def backlog(lane: str) -> int:
+    """车道当前积压 (排队中 + 处理中)"""
+    _ensure_schema()
+    return run_sql("SELECT COUNT(*) AS n FROM jobs WHERE lane = ? AND status IN ('pending', 'inflight')", (lane,))[0]['n']
+
+def shed_pending(lane: str, limit: int, reason: str, retweets_only: bool = False) -> int:
+    """过载削峰：按入队先后丢弃最旧的排队任务 (不动处理中的任务)，返回丢弃数量"""
+    if limit <= 0: return 0
+    _ensure_schema()
+    cond = " AND json_extract(payload, '$.node_type') = 'RETWEET'" if retweets_only else ""
+    with transaction() as conn:
+        ids = [r['job_id'] for r in conn.execute(
+            "SELECT job_id FROM jobs WHERE lane = ? AND status = 'pending'" + cond + " ORDER BY job_id LIMIT ?", (lane, limit)
+        ).fetchall()]
+        conn.executemany("UPDATE jobs SET status = 'shed', updated_at = ?, last_error = ? WHERE job_id = ?",
+                         [(time.time(), reason, jid) for jid in ids])
+    return len(ids)
+
+def downgrade_pending(lane: str) -> int:
+    """过载降级：排队中的任务改为只发布视频原片，跳过听译与字幕压制"""
+    _ensure_schema()
+    with transaction() as conn:
+        cur = conn.execute(
+            "UPDATE jobs SET payload = json_set(payload, '$.original_only', json('true')), updated_at = ? "
+            "WHERE lane = ? AND status = 'pending' AND json_extract(payload, '$.original_only') IS NULL",
+            (time.time(), lane)
+        )
+    return cur.rowcount
+
+def purge_finished(older_than_days: float) -> int:
+    """清理早已结束的任务行 (done / shed)，防止 jobs 表无限膨胀拖慢领取。
+    爬虫入队去重靠与任务同事务落盘的 tweets 表，不受影响；补录去重 (job_exists) 还要靠任务行，
+    所以只删仍有别处兜底的行：推文已发布 (history / dyn_map)，或同一推文还有本次不清理的任务行。
+    没发布过、也没有其他记录的削峰行留作墓碑，补录不会把它们当新推文重投"""
+    _ensure_schema()
+    cutoff = time.time() - older_than_days * 86400
+    with transaction() as conn:
+        cur = conn.execute(
+            "DELETE FROM jobs WHERE status IN ('done', 'shed') AND updated_at < ? AND ("
+            "EXISTS (SELECT 1 FROM history WHERE history.tweet_id = jobs.tweet_id)"
+            " OR EXISTS (SELECT 1 FROM dyn_map WHERE dyn_map.tweet_id = jobs.tweet_id)"
+            " OR EXISTS (SELECT 1 FROM jobs AS other WHERE other.tweet_id = jobs.tweet_id AND other.job_id != jobs.job_id"
+            " AND NOT (other.status IN ('done', 'shed') AND other.updated_at < ?)))",
+            (cutoff, cutoff)
+        )
+    return cur.rowcount
+
+def job_exists(tweet_id) -> bool:
+    """推文是否在任意车道登记过任务 (含已完成、死信与被削峰的)"""
+    _ensure_schema()
+    return bool(run_sql("SELECT 1 FROM jobs WHERE tweet_id = ? LIMIT 1", (str(tweet_id),)))
+
+def lane_depth(lane: str) -> dict:
+    _ensure_schema()
+    rows = run_sql("SELECT status, COUNT(*) AS n FROM jobs WHERE lane = ? GROUP BY status", (lane,))
+    return {r['status']: r['n'] for r in rows}
+
+# ==========================================
+# 🚚 异步车道：供车间 await 的持久化队列
+# ==========================================
+class DurableLane:
+    """车道在创建时绑定当前团体，此后无论从哪个团体的协程投递，都写入自己团体的状态库。
+    采集车道挂上下游的发布车道 (downstream)，积压与削峰按「采集 + 待发布」端到端计算"""
+    def __init__(self, name: str, downstream: "DurableLane | None" = None):
+        self.name = name
+        self.group = current_group()
+        self.downstream = downstream
+        self._notify = asyncio.Event()
+
+    def put(self, tweet: TweetRecord) -> bool:
+        with use_group(self.group): added = enqueue(self.name, tweet)
+        self._notify.set()
+        return added
+
+    def handoff(self, job: Job, checkpoint: dict) -> bool:
+        """把上游工序的任务连同成品清单一起转入本车道"""
+        with use_group(self.group): added = handoff(job, self.name, checkpoint)
+        self._notify.set()
+        return added
+
+    async def get(self, shard: tuple[int, int] | None = None) -> Job:
+        cfg = settings.pipeline
+        while True:
+            self._notify.clear()
+            with use_group(self.group): job = claim(self.name, cfg.visibility_timeout_sec, shard)
+            if job: return job
+            try: await asyncio.wait_for(self._notify.wait(), timeout=cfg.poll_interval_sec)
+            except asyncio.TimeoutError: pass
+
+    @asynccontextmanager
+    async def lease(self, job: Job):
+        """处理期间定时续租，防止长耗时任务 (如等待主理人审片) 被误判为失联"""
+        timeout = settings.pipeline.visibility_timeout_sec
+
+        async def heartbeat():
+            while True:
+                await asyncio.sleep(timeout / 3)
+                with use_group(self.group): extend(job, timeout)
+
+        hb = asyncio.create_task(heartbeat())
+        try:
+            yield job
+        finally:
+            hb.cancel()
+
+    def depth(self) -> dict:
+        with use_group(self.group): return lane_depth(self.name)
+
+    def backlog(self) -> int:
+        with use_group(self.group): return backlog(self.name)
+
+    def pipeline_backlog(self) -> int:
+        """本车道连同下游发布车道的积压：媒体车间交接得很快，真正的瓶颈排在发布令牌桶与人工审片前"""
+        with use_group(self.group): return sum(backlog(lane.name) for lane in self._chain())
+
+    def _chain(self) -> list["DurableLane"]:
+        # 下游车道里的任务排得更久，削峰时先动它们
+        return [self.downstream, self] if self.downstream else [self]
+
+    @property
+    def capacity(self) -> int:
+        """车道容量上限，0 表示不设限。采集车道按端到端积压计，发布车道的上限用于让媒体车间暂停领料"""
+        return settings.pipeline.lane_capacity.get(self.name, 0)
+
+    def has_room(self) -> bool:
+        cap = self.capacity
+        return not cap or self.backlog() < cap
+
+    def relieve_overload(self) -> tuple[dict, bool]:
+        """端到端积压超过容量时按配置顺序执行削峰策略。返回 (各策略处理条数, 削峰后是否仍然过载)"""
+        cap = self.capacity
+        if not cap: return {}, False
+        report = {}
+        with use_group(self.group):
+            overflow = sum(backlog(lane.name) for lane in self._chain()) - cap
+            for policy in settings.pipeline.overload_policies:
+                if overflow <= 0: break
+                if policy == "downgrade_video":
+                    # 降级不减少积压条数，但能把每条视频的处理耗时从分钟级压到秒级；
+                    # 发布车道里的视频已经压制完毕，降级省不下什么，只动采集车道
+                    if self.name == "video": report[policy] = downgrade_pending(self.name)
+                    continue
+                reason, retweets_only = ("SHED_RETWEET", True) if policy == "drop_retweets" else ("SHED_COLLAPSED", False)
+                n = 0
+                for lane in self._chain():
+                    if overflow - n <= 0: break
+                    n += shed_pending(lane.name, overflow - n, reason, retweets_only=retweets_only)
+                report[policy] = n
+                overflow -= n
+        return {k: v for k, v in report.items() if v}, overflow > 0
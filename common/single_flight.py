@@ -0,0 +1,61 @@
+import asyncio
+import logging
+from collections import OrderedDict
+
+from common.group_context import current_group
+
+logger = logging.getLogger("GloBot_SingleFlight")
+
+class _LeaderGone(Exception):
+    """领头协程被取消 (如 /kill 或熔断)，等待者需要自己接手重做"""
+
+# ==========================================
+# 🛫 单飞登记处 (进程内)
+# 多条引用链共享同一个祖先节点时，图文/视频车间可能同时去翻译、压制甚至首发它。
+# 同一团体内同一个 key 同时只允许一个协程真正执行，其余协程等待同一个 Future；
+# keep > 0 时还会缓存最近的成品，后来者 (经 reuse 校验仍然有效) 直接复用。
+# ==========================================
+class SingleFlight:
+    def __init__(self, name: str, keep: int = 0):
+        self.name = name
+        self.keep = keep
+        self._inflight: dict[tuple, asyncio.Future] = {}
+        self._done: OrderedDict[tuple, object] = OrderedDict()
+
+    async def do(self, key: str, fn, reuse=None):
+        """执行 fn() 并共享结果；reuse(result) 返回 False 的缓存成品会被丢弃重做"""
+        full_key = (current_group().name, str(key))
+        while True:
+            if full_key in self._done:
+                result = self._done[full_key]
+                if reuse is None or reuse(result):
+                    self._done.move_to_end(full_key)
+                    return result
+                del self._done[full_key]
+
+            fut = self._inflight.get(full_key)
+            if fut is None: break
+            logger.info(f"🛫 [{self.name}] 节点 {key} 正由其他车间处理，挂靠等待其结果...")
+            try: return await asyncio.shield(fut)
+            except _LeaderGone: continue
+
+        fut = asyncio.get_running_loop().create_future()
+        # 没有等待者时也要取走异常，避免事件循环打印 "exception was never retrieved"
+        fut.add_done_callback(lambda f: f.cancelled() or f.exception())
+        self._inflight[full_key] = fut
+        try:
+            result = await fn()
+        except asyncio.CancelledError:
+            fut.set_exception(_LeaderGone())
+            raise
+        except BaseException as e:
+            fut.set_exception(e)
+            raise
+        else:
+            fut.set_result(result)
+            if self.keep:
+                self._done[full_key] = result
+                while len(self._done) > self.keep: self._done.popitem(last=False)
+            return result
+        finally:
+            self._inflight.pop(full_key, None)
@@ -1,34 +1,252 @@
-import os
 import json
+import time
+import sqlite3
+import threading
 from pathlib import Path
+from contextlib import contextmanager
 import logging
 
 from common.config_loader import settings
+from common.group_context import current_group, GROUPS
 
 logger = logging.getLogger("GloBot_StateManager")
 
-DATA_DIR = Path(os.getenv("LOCAL_DATA_DIR", f"./GloBot_Data/{settings.targets.group_name}"))
-HISTORY_FILE = DATA_DIR / "history.json"
-DYN_MAP_FILE = DATA_DIR / "dyn_map.json"
+STATE_DB_NAME = "globot_state.db"
 
-def load_history():
-    if not HISTORY_FILE.exists(): return set()
-    try:
-        with open(HISTORY_FILE, "r", encoding="utf-8") as f: return set(json.load(f))
-    except: return set()
+# 旧版存储文件名 (仅供一次性迁移器读取)
+HISTORY_FILE_NAME = "history.json"
+DYN_MAP_FILE_NAME = "dyn_map.json"
+LEGACY_TWEETS_DB_NAME = "processed_tweets.db"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS history (
+    tweet_id TEXT PRIMARY KEY,
+    added_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS dyn_map (
+    tweet_id TEXT PRIMARY KEY,
+    dyn_id TEXT,
+    record TEXT,
+    updated_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS tweets (
+    tweet_id TEXT PRIMARY KEY,
+    author TEXT,
+    tweeted_at INTEGER,
+    extracted_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+CREATE INDEX IF NOT EXISTS idx_tweets_author_time ON tweets(author, tweeted_at);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+# 每个团体一个独立的状态库连接 (按数据目录寻址)
+_conns: dict[Path, sqlite3.Connection] = {}
+_conn_lock = threading.RLock()
+
+# ==========================================
+# 🗄️ 统一状态仓库：SQLite (WAL) 单点读写
+# ==========================================
+def get_conn() -> sqlite3.Connection:
+    data_dir = current_group().data_dir
+    with _conn_lock:
+        conn = _conns.get(data_dir)
+        if conn is None:
+            data_dir.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(data_dir / STATE_DB_NAME, check_same_thread=False, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            # 跨主机共享存储 (NFS/SMB) 不支持 WAL 的共享内存索引，可在 config.yaml 中降级为 DELETE 日志模式
+            conn.execute(f"PRAGMA journal_mode={settings.pipeline.state_journal_mode}")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=5000")
+            conn.executescript(SCHEMA)
+            _conns[data_dir] = conn
+            migrate_legacy_state(conn, data_dir)
+        return conn
+
+@contextmanager
+def transaction():
+    """显式事务：块内所有写入要么全部落盘，要么全部回滚"""
+    conn = get_conn()
+    with _conn_lock:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+def run_sql(sql: str, params=()):
+    conn = get_conn()
+    with _conn_lock:
+        return conn.execute(sql, params).fetchall()
+
+# ==========================================
+# 🏷️ 全局键值表 (跨进程共享的总线标志位等)
+# ==========================================
+def get_meta(key: str, default=None):
+    rows = run_sql("SELECT value FROM meta WHERE key = ?", (key,))
+    return rows[0]["value"] if rows else default
+
+def set_meta(key: str, value):
+    run_sql("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, str(value)))
+
+def scan_meta(prefix: str) -> dict:
+    """取出全部以 prefix 开头的键值 (如各 worker 的运行指标快照)"""
+    rows = run_sql("SELECT key, value FROM meta WHERE substr(key, 1, ?) = ?", (len(prefix), prefix))
+    return {r["key"]: r["value"] for r in rows}
+
+def delete_meta(key: str):
+    run_sql("DELETE FROM meta WHERE key = ?", (key,))
+
+# ==========================================
+# 📜 发布历史 (history)
+# ==========================================
+def is_in_history(tweet_id) -> bool:
+    return bool(run_sql("SELECT 1 FROM history WHERE tweet_id = ?", (str(tweet_id),)))
+
+def add_history(tweet_id):
+    run_sql("INSERT OR IGNORE INTO history (tweet_id, added_at) VALUES (?, ?)", (str(tweet_id), time.time()))
+
+def add_history_many(tweet_ids):
+    now = time.time()
+    with transaction() as conn:
+        conn.executemany("INSERT OR IGNORE INTO history (tweet_id, added_at) VALUES (?, ?)", [(str(t), now) for t in tweet_ids])
+
+# ==========================================
+# 🔗 推文 -> B站动态 映射 (dyn_map)
+# ==========================================
+def get_dyn_record(tweet_id):
+    """点查单条映射：返回完整记录 dict；旧版纯字符串记录原样返回 dyn_id；不存在返回 None"""
+    rows = run_sql("SELECT dyn_id, record FROM dyn_map WHERE tweet_id = ?", (str(tweet_id),))
+    if not rows: return None
+    dyn_id, record = rows[0]["dyn_id"], rows[0]["record"]
+    if record is None: return dyn_id
+    try: return json.loads(record)
+    except: return dyn_id
 
-def save_history(history_set):
-    HISTORY_FILE.parent.mkdir(parents=True, exist_ok=True)
-    with open(HISTORY_FILE, "w", encoding="utf-8") as f:
-        json.dump(list(history_set), f, ensure_ascii=False, indent=2)
+def upsert_dyn_record(tweet_id, data):
+    dyn_id = data.get("dyn_id") if isinstance(data, dict) else data
+    record = json.dumps(data, ensure_ascii=False) if isinstance(data, dict) else None
+    run_sql(
+        "INSERT INTO dyn_map (tweet_id, dyn_id, record, updated_at) VALUES (?, ?, ?, ?) "
+        "ON CONFLICT(tweet_id) DO UPDATE SET dyn_id = excluded.dyn_id, record = excluded.record, updated_at = excluded.updated_at",
+        (str(tweet_id), str(dyn_id) if dyn_id is not None else None, record, time.time())
+    )
+
+def dyn_map_slice(*tweet_ids) -> dict:
+    """按需点查若干条映射，拼成与旧版 dyn_map 同构的小字典 (供排版引擎使用)"""
+    res = {}
+    for tid in tweet_ids:
+        if not tid: continue
+        rec = get_dyn_record(tid)
+        if rec is not None: res[str(tid)] = rec
+    return res
+
+# ==========================================
+# 🔬 爬虫去重表 (原 processed_tweets.db)
+# ==========================================
+def is_processed(tweet_id) -> bool:
+    return bool(run_sql("SELECT 1 FROM tweets WHERE tweet_id = ?", (str(tweet_id),)))
+
+def processed_subset(tweet_ids) -> set[str]:
+    """批量点查：返回给定 ID 中已经入过去重表的那部分"""
+    ids = [str(t) for t in tweet_ids]
+    seen = set()
+    for i in range(0, len(ids), 500):  # SQLite 绑定参数个数有上限，分批查询
+        chunk = ids[i:i + 500]
+        seen.update(r["tweet_id"] for r in run_sql(f"SELECT tweet_id FROM tweets WHERE tweet_id IN ({','.join('?' * len(chunk))})", chunk))
+    return seen
+
+def mark_processed(tweet_id, author, tweeted_at=None):
+    run_sql("INSERT OR IGNORE INTO tweets (tweet_id, author, tweeted_at) VALUES (?, ?, ?)", (str(tweet_id), author, tweeted_at))
+
+# ==========================================
+# 💣 记忆抹除：单事务同时清理三张表，连同车道里已结束的任务 (否则重新投递会被 UNIQUE(lane, tweet_id) 静默吞掉)
+# ==========================================
+def wipe_tweet_memory(tweet_id):
+    tid = str(tweet_id)
+    with transaction() as conn:
+        conn.execute("DELETE FROM tweets WHERE tweet_id = ?", (tid,))
+        conn.execute("DELETE FROM history WHERE tweet_id = ?", (tid,))
+        conn.execute("DELETE FROM dyn_map WHERE tweet_id = ?", (tid,))
+        # jobs 表由 common/job_queue 按需建表；正在处理中的任务不动，交给持有租约的车间收尾
+        if conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'jobs'").fetchone():
+            conn.execute("DELETE FROM jobs WHERE tweet_id = ? AND status != 'inflight'", (tid,))
+
+# ==========================================
+# 🧰 兼容接口：整表读取 (仅供排版沙盒等离线工具使用)
+# ==========================================
+def load_history():
+    return {r["tweet_id"] for r in run_sql("SELECT tweet_id FROM history")}
 
 def load_dyn_map():
-    if not DYN_MAP_FILE.exists(): return {}
-    try:
-        with open(DYN_MAP_FILE, "r", encoding="utf-8") as f: return json.load(f)
-    except: return {}
-
-def save_dyn_map(dyn_map):
-    DYN_MAP_FILE.parent.mkdir(parents=True, exist_ok=True)
-    with open(DYN_MAP_FILE, "w", encoding="utf-8") as f:
-        json.dump(dyn_map, f, ensure_ascii=False, indent=2)
\ No newline at end of file
+    return {r["tweet_id"]: get_dyn_record(r["tweet_id"]) for r in run_sql("SELECT tweet_id FROM dyn_map")}
+
+# ==========================================
+# 🚚 一次性迁移器：旧版 JSON / processed_tweets.db -> globot_state.db
+# ==========================================
+def migrate_legacy_state(conn: sqlite3.Connection, data_dir: Path) -> dict:
+    HISTORY_FILE = data_dir / HISTORY_FILE_NAME
+    DYN_MAP_FILE = data_dir / DYN_MAP_FILE_NAME
+    LEGACY_TWEETS_DB = data_dir / LEGACY_TWEETS_DB_NAME
+    counts = {"history": 0, "dyn_map": 0, "tweets": 0}
+    with _conn_lock:
+        if conn.execute("SELECT 1 FROM meta WHERE key = 'legacy_migrated'").fetchone():
+            return counts
+
+        history, dyn_map = [], {}
+        try:
+            if HISTORY_FILE.exists():
+                with open(HISTORY_FILE, "r", encoding="utf-8") as f: history = list(json.load(f))
+            if DYN_MAP_FILE.exists():
+                with open(DYN_MAP_FILE, "r", encoding="utf-8") as f: dyn_map = json.load(f)
+        except Exception as e:
+            logger.error(f"❌ [状态迁移] 旧版 JSON 读取失败，本次跳过迁移: {e}")
+            return counts
+
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.executemany("INSERT OR IGNORE INTO history (tweet_id, added_at) VALUES (?, ?)", [(str(t), now) for t in history])
+            for tid, data in dyn_map.items():
+                dyn_id = data.get("dyn_id") if isinstance(data, dict) else data
+                record = json.dumps(data, ensure_ascii=False) if isinstance(data, dict) else None
+                conn.execute("INSERT OR IGNORE INTO dyn_map (tweet_id, dyn_id, record, updated_at) VALUES (?, ?, ?, ?)",
+                             (str(tid), str(dyn_id) if dyn_id is not None else None, record, now))
+            if LEGACY_TWEETS_DB.exists():
+                legacy = sqlite3.connect(LEGACY_TWEETS_DB)
+                try:
+                    rows = legacy.execute("SELECT tweet_id, author, extracted_at FROM tweets").fetchall()
+                except sqlite3.Error: rows = []
+                finally: legacy.close()
+                conn.executemany("INSERT OR IGNORE INTO tweets (tweet_id, author, extracted_at) VALUES (?, ?, ?)", rows)
+                counts["tweets"] = len(rows)
+            conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('legacy_migrated', ?)", (str(now),))
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+        counts["history"], counts["dyn_map"] = len(history), len(dyn_map)
+
+    # 迁移完成后将旧文件改名封存，防止被误读
+    for legacy_file in (HISTORY_FILE, DYN_MAP_FILE, LEGACY_TWEETS_DB):
+        if legacy_file.exists():
+            try: legacy_file.rename(legacy_file.with_name(legacy_file.name + ".migrated"))
+            except Exception as e: logger.warning(f"⚠️ [状态迁移] 无法封存旧文件 {legacy_file.name}: {e}")
+
+    if any(counts.values()):
+        logger.info(f"🚚 [状态迁移] 旧版记忆已导入 SQLite: 历史 {counts['history']} 条 / 映射 {counts['dyn_map']} 条 / 去重 {counts['tweets']} 条")
+    return counts
+
+if __name__ == "__main__":
+    from common.group_context import use_group
+    for group in GROUPS:
+        with use_group(group):
+            get_conn()
+            print(f"✅ [{group.name}] 状态仓库就绪: {group.data_dir / STATE_DB_NAME}")
+            print(f"   历史 {len(load_history())} 条 / 映射 {len(load_dyn_map())} 条")
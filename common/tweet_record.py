@@ -0,0 +1,72 @@
+from dataclasses import dataclass, field, fields
+
+# ==========================================
+# 🪶 推文记录
+# 旧版每条推文都是一个字典，并用 raw_node 挂着整棵 GraphQL 子树 (含作者画像、实体、统计等)，
+# quote_chain 再各自拷贝一份，跟着任务在车道里一直活到发布冷却结束。
+# 现在只保留流水线真正用到的字段 (__slots__，无实例字典)，
+# 原始 JSON 通过 capture_id 引用抓包归档 (Bot_Crawler/capture_store)，需要时再按 ID 回查。
+# ==========================================
+@dataclass(slots=True)
+class MediaRef:
+    """化验阶段挑好的下载目标：图片为原图地址，视频为最高码率 mp4"""
+    kind: str               # photo / video / animated_gif
+    url: str
+    media_key: str = ""
+    alt: str = ""
+    bitrate: int = 0
+    duration_ms: int = 0
+    est_bytes: int = 0      # 估算体积，供下载规划统计
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "MediaRef":
+        return cls(**{f.name: data[f.name] for f in fields(cls) if f.name in data})
+
+    def to_dict(self) -> dict:
+        return {f.name: getattr(self, f.name) for f in fields(self)}
+
+@dataclass(slots=True)
+class TweetRecord:
+    id: str
+    author: str
+    author_display_name: str
+    text: str
+    timestamp: int
+    node_type: str = 'ORIGINAL'
+    in_reply_to_screen_name: str | None = None
+    in_reply_to_status_id_str: str | None = None
+    media_refs: list[MediaRef] = field(default_factory=list)  # 待下载的媒体，仅化验阶段使用，不入队
+    media: list[str] = field(default_factory=list)            # 已下载到本地的媒体路径
+    capture_id: int | None = None                             # 原始 JSON 所在的抓包归档
+    is_placeholder: bool = False
+    quoted_tweet_id: str | None = None
+    quoted_text: str | None = None
+    original_only: bool = False
+    backfill: bool = False                                    # 历史补录投递的旧推文 (低优先级)
+    quote_chain: list["TweetRecord"] = field(default_factory=list)
+
+    @classmethod
+    def placeholder(cls, tweet_id: str, author: str, timestamp: int) -> "TweetRecord":
+        """回复链上没抓到的祖先：只占个位，发布时跳过"""
+        return cls(id=tweet_id, author=author, author_display_name=f"@{author}", text="(回复溯源占位符)",
+                   timestamp=timestamp, is_placeholder=True)
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "TweetRecord":
+        """从车道任务的 JSON 载荷还原；旧版载荷里多余的键直接忽略"""
+        kwargs = {f.name: data[f.name] for f in fields(cls) if f.name in data}
+        kwargs['id'] = str(kwargs['id'])
+        kwargs.setdefault('author_display_name', f"@{kwargs['author']}")
+        kwargs['media_refs'] = [MediaRef.from_dict(m) for m in kwargs.get('media_refs', [])]
+        kwargs['quote_chain'] = [cls.from_dict(n) for n in kwargs.get('quote_chain', [])]
+        return cls(**kwargs)
+
+    def to_payload(self) -> dict:
+        """入队载荷：媒体已落盘，media_refs 不再需要；空值字段省略以压缩体积"""
+        res = {}
+        for f in fields(self):
+            value = getattr(self, f.name)
+            if f.name == 'media_refs' or value is None or value is False: continue
+            if f.name == 'quote_chain': value = [n.to_payload() for n in value]
+            res[f.name] = value
+        return res
@@ -1,20 +1,25 @@
 import os
-import time
 import logging
 import asyncio
-import random
 import html
-from pathlib import Path
+import argparse
+import functools
 from datetime import datetime
 
 # 1. 核心底座与中枢
 from common.config_loader import settings
-from common.state_manager import load_history, save_history, load_dyn_map, save_dyn_map
-from Bot_Master.tg_bot import start_telegram_bot, send_tg_msg, send_tg_error, GloBotState
+from common.state_manager import add_history, add_history_many, get_dyn_record, upsert_dyn_record, dyn_map_slice, mark_processed
+from common.job_queue import DurableLane, save_checkpoint, ack, nack, bury, release, recover_inflight, purge_finished
+from common.group_context import GROUPS, current_group, use_group, is_multi_group
+from common.single_flight import SingleFlight
+from common.tweet_record import TweetRecord
+from common.deadline import run_stage, StageTimeout, STAGE_LABELS, set_timeout_reporter
+from Bot_Master.tg_bot import start_telegram_bot, send_tg_msg, send_tg_error, GloBotState, set_bus_running, sync_bus_valve
 
 # 2. 爬虫嗅探引擎
-from Bot_Crawler.twitter_scraper import fetch_timeline
-from Bot_Crawler.tweet_parser import parse_timeline_json
+from Bot_Crawler.source_adapter import SourceAdapter, build_adapters
+from Bot_Crawler.poll_scheduler import HIBERNATE_NAP_SEC
+from Bot_Crawler.backfill import BackfillRunner
 
 # 3. 多模态处理引擎
 from Bot_Media.llm_translator import translate_text
@@ -24,6 +29,7 @@ from Bot_Media.media_pipeline import process_media_files, cleanup_media, cleanup
 from Bot_Publisher.bili_formatter import build_safe_dynamic_text, build_repost_context
 from Bot_Publisher.bili_uploader import smart_publish, smart_repost, get_dynamic_id_by_bvid
 from Bot_Publisher.bili_video_uploader import upload_video_bilibili 
+from Bot_Publisher.publish_context import PublishContext
 
 logging.getLogger("httpx").setLevel(logging.WARNING)
 logging.getLogger("httpcore").setLevel(logging.WARNING)
@@ -34,24 +40,6 @@ logging.getLogger("telegram.ext.Application").setLevel(logging.WARNING)
 logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
 logger = logging.getLogger("GloBot_Matrix")
 
-DATA_DIR = Path(os.getenv("LOCAL_DATA_DIR", f"./GloBot_Data/{settings.targets.group_name}"))
-RAW_DIR = DATA_DIR / "timeline_raw"
-FIRST_RUN_FLAG_FILE = DATA_DIR / ".first_run_completed"
-
-# 🛡️ 全局并发状态锁，防止两个车间同时读写历史记忆导致 JSON 损坏
-state_lock = asyncio.Lock()
-
-async def safe_update_dyn_map(tweet_id, data):
-    async with state_lock:
-        dm = load_dyn_map()
-        dm[tweet_id] = data
-        save_dyn_map(dm)
-
-async def safe_add_history(tweet_id):
-    async with state_lock:
-        hs = load_history()
-        hs.add(tweet_id)
-        save_history(hs)
 
 # ==========================================
 # 🚨 终极防线：全局致命异常熔断器
@@ -59,121 +47,108 @@ async def safe_add_history(tweet_id):
 async def trigger_fatal_panic(error_type: str, error_msg: Exception):
     if not GloBotState.is_running.is_set(): 
         return # 已经被熔断过，防止重复发报
-    GloBotState.is_running.clear()
+    set_bus_running(False) # 同步挂起其他 worker 进程
     logger.critical(f"🛑 [全局熔断] 触发 T0 级警报: {error_type} - {error_msg}")
     await send_tg_error(f"🛑 <b>{error_type}</b>\n\n异常追踪：\n<code>{error_msg}</code>\n\n系统三大引擎已全线物理挂起。修复后请发送 /resume 恢复。")
 
 # ==========================================
 # 🏭 核心执行管线 (供图文与视频车间调用)
 # ==========================================
-async def process_pipeline(tweet: dict, preprocessing_cache: dict, engine_name: str) -> tuple[bool, str, str]:
-    logger.info(f"\n" + "="*50)
-    logger.info(f"🚀 [{engine_name}] 开始处理推文树... 终点成员: @{tweet['author']}")
+# 🛫 同一节点的预处理与首发在进程内只做一次：并发请求挂靠同一个 Future，预处理成品缓存复用
+prep_flight = SingleFlight("预处理", keep=256)
+publish_flight = SingleFlight("发布")
+
+def record_publication(node: TweetRecord, dyn_id: str, translated_text: str, raw_text: str, publish_mode: str):
+    """把一次成功发射写入 dyn_map，供后续引用链套娃寻址"""
+    upsert_dyn_record(node.id, {
+        "dyn_id": dyn_id, "author_handle": node.author,
+        "author_display_name": node.author_display_name,
+        "node_type": node.node_type,
+        "dt_str": datetime.fromtimestamp(node.timestamp).strftime("%Y-%m-%d %H:%M:%S"),
+        "translated_text": translated_text, "raw_text": raw_text, "publish_mode": publish_mode
+    })
+
+async def publish_ancestor(ancestor: TweetRecord, prev_dyn_id, prev_tw_id, preprocessing_cache: dict, base_ctx: PublishContext, engine_name: str) -> tuple[bool, str, str]:
+    anc_id = ancestor.id
+    logger.info(f"   -> ⛓️ 发现全新祖先节点！开始穿透发布: @{ancestor.author}")
+    id_retention_level = base_ctx.id_retention_level
     
-    id_retention_level = getattr(settings.publishers.bilibili, 'tweet_id_retention', 0)
-    prev_dyn_id, prev_tw_id = None, None 
+    anc_node_type = ancestor.node_type
+    anc_translated = preprocessing_cache[anc_id]['translated_text']
+    dt_str = datetime.fromtimestamp(ancestor.timestamp).strftime("%Y-%m-%d %H:%M:%S")
+    clean_raw = html.unescape(ancestor.text)
+    author_handle = ancestor.author
+    author_display = ancestor.author_display_name
+    display_name = current_group().targets.account_title_map.get(author_handle, author_display)
     
-    for ancestor in tweet.get('quote_chain', []):
-        anc_id = str(ancestor['id'])
-        dm = load_dyn_map() # 每次都动态读取最新记忆，保证极高的并发一致性
-        
-        if anc_id in dm:
-            prev_info = dm[anc_id]
-            prev_dyn_id = prev_info.get("dyn_id") if isinstance(prev_info, dict) else prev_info
-            prev_tw_id = anc_id
-            logger.info(f"   -> ♻️ 记忆寻址命中：祖先节点 {anc_id} 已搬运，跳过首发，将其作为套娃基底。")
-            continue
-            
-        if ancestor.get('is_placeholder', False):
-            logger.info(f"   -> ⚠️ 祖先节点 {anc_id} 为占位符，跳过发布。")
-            continue
-            
-        logger.info(f"   -> ⛓️ 发现全新祖先节点！开始穿透发布: @{ancestor['author']}")
-        
-        anc_node_type = ancestor.get('node_type', 'ORIGINAL')
-        anc_translated = preprocessing_cache[anc_id]['translated_text']
-        dt_str = datetime.fromtimestamp(ancestor['timestamp']).strftime("%Y-%m-%d %H:%M:%S")
-        clean_raw = html.unescape(ancestor['text'])
-        author_handle = ancestor['author']
-        author_display = ancestor.get('author_display_name', f"@{author_handle}")
-        display_name = settings.targets.account_title_map.get(author_handle, author_display)
-        
-        anc_media = preprocessing_cache[anc_id]['final_media']
-        anc_video_info = preprocessing_cache[anc_id].get('video_info', {"original": None, "translated": None})
-        anc_source_url = f"https://x.com/{ancestor['author']}/status/{anc_id}"
-        
-        vid_candidates = {"translated": anc_video_info.get("translated") if settings.publishers.bilibili.publish_translated_video else None, 
-                          "original": anc_video_info.get("original") if settings.publishers.bilibili.publish_original_video else None}
-        has_anc_video = bool(vid_candidates["translated"] or vid_candidates["original"])
-        anc_video_type = "translated" if vid_candidates["translated"] else "original" if vid_candidates["original"] else "none"
-        
-        fallback_to_publish, curr_publish_mode = False, "original"
+    anc_media = preprocessing_cache[anc_id]['final_media']
+    anc_video_info = preprocessing_cache[anc_id].get('video_info', {"original": None, "translated": None})
+    anc_source_url = f"https://x.com/{ancestor.author}/status/{anc_id}"
+    
+    vid_candidates = {"translated": anc_video_info.get("translated") if settings.publishers.bilibili.publish_translated_video else None, 
+                      "original": anc_video_info.get("original") if (settings.publishers.bilibili.publish_original_video or base_ctx.original_only) else None}
+    has_anc_video = bool(vid_candidates["translated"] or vid_candidates["original"])
+    anc_video_type = "translated" if vid_candidates["translated"] else "original" if vid_candidates["original"] else "none"
+    
+    fallback_to_publish, curr_publish_mode = False, "original"
 
-        if prev_dyn_id:
-            real_prev_dyn_id = prev_dyn_id
-            if isinstance(prev_dyn_id, str) and prev_dyn_id.startswith("BV"):
-                resolved_id = await get_dynamic_id_by_bvid(prev_dyn_id)
-                if resolved_id: real_prev_dyn_id = resolved_id
-                else: logger.warning(f"   -> ⚠️ [动态猎犬] 反查失败。")
+    if prev_dyn_id:
+        real_prev_dyn_id = prev_dyn_id
+        if isinstance(prev_dyn_id, str) and prev_dyn_id.startswith("BV"):
+            resolved_id = await get_dynamic_id_by_bvid(prev_dyn_id)
+            if resolved_id: real_prev_dyn_id = resolved_id
+            else: logger.warning(f"   -> ⚠️ [动态猎犬] 反查失败。")
 
-            fallback_to_publish = (len(anc_media) > 0) or str(real_prev_dyn_id).startswith("BV")
-            if not fallback_to_publish: curr_publish_mode = "repost"
-                
-        is_video_route = has_anc_video if (not prev_dyn_id or fallback_to_publish) else False
-        limit = 220 if is_video_route else 950
-        ref_link = f"https://www.bilibili.com/video/{prev_dyn_id}" if prev_dyn_id and str(prev_dyn_id).startswith("BV") else f"https://t.bilibili.com/{prev_dyn_id}" if prev_dyn_id else ""
-        
-        context_suffix = build_repost_context(prev_tw_id, dm, settings, id_retention_level, is_video_mode=is_video_route)
-        settings.publishers.bilibili.title = "" if anc_node_type in ["REPLY", "RETWEET"] else display_name
+        fallback_to_publish = (len(anc_media) > 0) or str(real_prev_dyn_id).startswith("BV")
+        if not fallback_to_publish: curr_publish_mode = "repost"
+            
+    is_video_route = has_anc_video if (not prev_dyn_id or fallback_to_publish) else False
+    limit = 220 if is_video_route else 950
+    ref_link = f"https://www.bilibili.com/video/{prev_dyn_id}" if prev_dyn_id and str(prev_dyn_id).startswith("BV") else f"https://t.bilibili.com/{prev_dyn_id}" if prev_dyn_id else ""
+    
+    anc_ctx = base_ctx.with_title("" if anc_node_type in ["REPLY", "RETWEET"] else display_name)
+    context_suffix = build_repost_context(prev_tw_id, dyn_map_slice(prev_tw_id), current_group(), id_retention_level, is_video_mode=is_video_route, ctx=anc_ctx)
 
-        anc_content = build_safe_dynamic_text(
-            display_name, dt_str, anc_translated, clean_raw, anc_id, anc_node_type, 
-            id_retention_level, context_suffix, ref_link if fallback_to_publish else "", limit
-        )
+    anc_content = build_safe_dynamic_text(
+        display_name, dt_str, anc_translated, clean_raw, anc_id, anc_node_type, 
+        id_retention_level, context_suffix, ref_link if fallback_to_publish else "", limit, ctx=anc_ctx
+    )
 
-        if prev_dyn_id and not fallback_to_publish:
-            logger.info(f"   -> 🔄 触发 B 站原生纯文本转发机制...")
-            success, new_anc_dyn_id = await smart_repost(anc_content, real_prev_dyn_id)
+    if prev_dyn_id and not fallback_to_publish:
+        logger.info(f"   -> 🔄 触发 B 站原生纯文本转发机制...")
+        success, new_anc_dyn_id = await smart_repost(anc_content, real_prev_dyn_id, ctx=anc_ctx, detail=f"推文 {anc_id}")
+    else:
+        if has_anc_video:
+            logger.info(f"   -> 🆕 [{engine_name}] 移交视频投稿中枢...")
+            success, new_anc_dyn_id = await upload_video_bilibili(vid_candidates, display_name[:80] if anc_node_type != 'REPLY' else f"{display_name}的视频回复", anc_content, anc_source_url, settings, ctx=anc_ctx)
         else:
-            if has_anc_video:
-                logger.info(f"   -> 🆕 [{engine_name}] 移交视频投稿中枢...")
-                success, new_anc_dyn_id = await upload_video_bilibili(vid_candidates, display_name[:80] if anc_node_type != 'REPLY' else f"{display_name}的视频回复", anc_content, anc_source_url, settings)
-            else:
-                logger.info(f"   -> 🆕 [{engine_name}] 将图文节点进行首发...")
-                success, new_anc_dyn_id = await smart_publish(anc_content, anc_media, video_type=anc_video_type)
-            
-        cleanup_media(anc_media)
+            logger.info(f"   -> 🆕 [{engine_name}] 将图文节点进行首发...")
+            success, new_anc_dyn_id = await smart_publish(anc_content, anc_media, video_type=anc_video_type, ctx=anc_ctx, detail=f"推文 {anc_id}")
         
-        if success and new_anc_dyn_id:
-            await safe_update_dyn_map(anc_id, {
-                "dyn_id": new_anc_dyn_id, "author_handle": author_handle, "author_display_name": author_display,
-                "node_type": anc_node_type, "dt_str": dt_str, "translated_text": anc_translated, "raw_text": clean_raw, "publish_mode": curr_publish_mode
-            })
-            prev_dyn_id, prev_tw_id = new_anc_dyn_id, anc_id
-            logger.warning(f"   -> ⏳ [风控规避] 祖先节点发射成功，{engine_name}强制冷却 65 秒...")
-            await asyncio.sleep(65)
-        else:
-            logger.error(f"❌ 引用/回复 节点链条断裂，发布终止！")
-            return False, "", "repost"
+    cleanup_media(anc_media)
+    
+    # 风控冷却交给共享的发布令牌桶 (Bot_Publisher/publish_scheduler)，这里不再硬睡眠
+    if success and new_anc_dyn_id:
+        record_publication(ancestor, new_anc_dyn_id, anc_translated, clean_raw, curr_publish_mode)
+    return success, new_anc_dyn_id, curr_publish_mode
 
-    # ==========================================
-    # 处理叶子节点
-    # ==========================================
+async def publish_leaf(tweet: TweetRecord, prev_dyn_id, prev_tw_id, preprocessing_cache: dict, base_ctx: PublishContext, engine_name: str) -> tuple[bool, str, str]:
     logger.info(f"   -> 👑 链路穿透完成，开始处理最终成员点评！")
-    tw_id = str(tweet['id'])
-    tw_node_type = tweet.get('node_type', 'ORIGINAL')
-    author_handle = tweet['author']
-    display_name = settings.targets.account_title_map.get(author_handle, tweet.get('author_display_name', f"@{author_handle}"))
-    dt_str = datetime.fromtimestamp(tweet['timestamp']).strftime("%Y-%m-%d %H:%M:%S")
+    id_retention_level = base_ctx.id_retention_level
+    tw_id = tweet.id
+    tw_node_type = tweet.node_type
+    author_handle = tweet.author
+    display_name = current_group().targets.account_title_map.get(author_handle, tweet.author_display_name)
+    dt_str = datetime.fromtimestamp(tweet.timestamp).strftime("%Y-%m-%d %H:%M:%S")
     
     translated_text = "" if tw_node_type == 'RETWEET' else preprocessing_cache[tw_id]['translated_text']
-    clean_raw_text = "" if tw_node_type == 'RETWEET' else html.unescape(tweet['text'])
+    clean_raw_text = "" if tw_node_type == 'RETWEET' else html.unescape(tweet.text)
     final_media = [] if tw_node_type == 'RETWEET' else preprocessing_cache[tw_id]['final_media']
     tw_video_info = {} if tw_node_type == 'RETWEET' else preprocessing_cache[tw_id].get('video_info', {"original": None, "translated": None})
-    final_source_url = f"https://x.com/{tweet['author']}/status/{tw_id}"
+    final_source_url = f"https://x.com/{tweet.author}/status/{tw_id}"
 
     vid_candidates = {"translated": tw_video_info.get("translated") if settings.publishers.bilibili.publish_translated_video else None,
-                      "original": tw_video_info.get("original") if settings.publishers.bilibili.publish_original_video else None}
+                      "original": tw_video_info.get("original") if (settings.publishers.bilibili.publish_original_video or base_ctx.original_only) else None}
     has_final_video = bool(vid_candidates["translated"] or vid_candidates["original"])
     leaf_video_type = "translated" if vid_candidates["translated"] else "original" if vid_candidates["original"] else "none"
 
@@ -192,242 +167,457 @@ async def process_pipeline(tweet: dict, preprocessing_cache: dict, engine_name:
     limit = 220 if is_video_route else 950
     ref_link = f"https://www.bilibili.com/video/{prev_dyn_id}" if prev_dyn_id and str(prev_dyn_id).startswith("BV") else f"https://t.bilibili.com/{prev_dyn_id}" if prev_dyn_id else ""
 
-    dm = load_dyn_map()
-    context_suffix = build_repost_context(prev_tw_id, dm, settings, id_retention_level, is_video_mode=is_video_route)
-    settings.publishers.bilibili.title = "" if tw_node_type in ["REPLY", "RETWEET"] else display_name
+    leaf_ctx = base_ctx.with_title("" if tw_node_type in ["REPLY", "RETWEET"] else display_name)
+    context_suffix = build_repost_context(prev_tw_id, dyn_map_slice(prev_tw_id), current_group(), id_retention_level, is_video_mode=is_video_route, ctx=leaf_ctx)
 
     final_content = build_safe_dynamic_text(
         display_name, dt_str, translated_text, clean_raw_text, tw_id, tw_node_type, 
-        id_retention_level, context_suffix, ref_link if fallback_to_publish else "", limit
+        id_retention_level, context_suffix, ref_link if fallback_to_publish else "", limit, ctx=leaf_ctx
     )
 
     if prev_dyn_id and not fallback_to_publish:
         logger.info(f"   -> ♻️ 触发成员原生纯文本转发动作...")
-        success, new_dyn_id = await smart_repost(final_content, real_prev_dyn_id)
+        success, new_dyn_id = await smart_repost(final_content, real_prev_dyn_id, ctx=leaf_ctx, detail=f"推文 {tw_id}")
     else:
         if has_final_video:
             logger.info(f"   -> [{engine_name}] 移交视频投稿中枢...")
-            success, new_dyn_id = await upload_video_bilibili(vid_candidates, display_name[:80] if tw_node_type != 'REPLY' else f"{display_name}的视频回复", final_content, final_source_url, settings)
+            success, new_dyn_id = await upload_video_bilibili(vid_candidates, display_name[:80] if tw_node_type != 'REPLY' else f"{display_name}的视频回复", final_content, final_source_url, settings, ctx=leaf_ctx)
         else:
             logger.info(f"   -> [{engine_name}] 移交图文首发中枢...")
-            success, new_dyn_id = await smart_publish(final_content, final_media, video_type=leaf_video_type)
+            success, new_dyn_id = await smart_publish(final_content, final_media, video_type=leaf_video_type, ctx=leaf_ctx, detail=f"推文 {tw_id}")
         
     cleanup_media(final_media)
+    # 叶子也可能是别的推文的祖先，落盘映射必须在单飞结束前完成，挂靠者才能立即套娃
+    if success and new_dyn_id: record_publication(tweet, new_dyn_id, translated_text, clean_raw_text, curr_publish_mode)
     return success, new_dyn_id, curr_publish_mode
 
+async def process_pipeline(tweet: TweetRecord, preprocessing_cache: dict, engine_name: str) -> tuple[bool, str, str]:
+    logger.info(f"\n" + "="*50)
+    logger.info(f"🚀 [{engine_name}] 开始处理推文树... 终点成员: @{tweet.author}")
+    
+    # 每个任务持有自己的只读发布快照，不再改写全局配置，多个发布车间可安全并发
+    base_ctx = PublishContext.build(original_only=tweet.original_only)
+    prev_dyn_id, prev_tw_id = None, None 
+    
+    for ancestor in tweet.quote_chain:
+        anc_id = ancestor.id
+        prev_info = get_dyn_record(anc_id) # 索引点查最新记忆，保证极高的并发一致性
+        
+        if prev_info is not None:
+            prev_dyn_id = prev_info.get("dyn_id") if isinstance(prev_info, dict) else prev_info
+            prev_tw_id = anc_id
+            logger.info(f"   -> ♻️ 记忆寻址命中：祖先节点 {anc_id} 已搬运，跳过首发，将其作为套娃基底。")
+            continue
+            
+        if ancestor.is_placeholder:
+            logger.info(f"   -> ⚠️ 祖先节点 {anc_id} 为占位符，跳过发布。")
+            continue
+        
+        # 其他车间正在首发同一个祖先时，挂靠等待它的结果，绝不重复发射
+        success, new_anc_dyn_id, _ = await publish_flight.do(anc_id, functools.partial(
+            publish_ancestor, ancestor, prev_dyn_id, prev_tw_id, preprocessing_cache, base_ctx, engine_name))
+        
+        if success and new_anc_dyn_id:
+            prev_dyn_id, prev_tw_id = new_anc_dyn_id, anc_id
+        else:
+            logger.error(f"❌ 引用/回复 节点链条断裂，发布终止！")
+            return False, "", "repost"
+
+    # ==========================================
+    # 处理叶子节点
+    # ==========================================
+    # 叶子可能已被其他车道里引用它的推文当作祖先先行搬运 (车道间不保证先后)，直接复用映射，绝不重复发射
+    leaf_record = get_dyn_record(tweet.id)
+    if isinstance(leaf_record, dict) and leaf_record.get("dyn_id"):
+        logger.info(f"   -> ♻️ 叶子节点 {tweet.id} 已作为祖先被搬运，跳过重复发射。")
+        return True, leaf_record["dyn_id"], leaf_record.get("publish_mode", "original")
+    return await publish_flight.do(tweet.id, functools.partial(
+        publish_leaf, tweet, prev_dyn_id, prev_tw_id, preprocessing_cache, base_ctx, engine_name))
+
 
 # ==========================================
-# ⚙️ 独立消费者引擎：负责接收队列指令并干苦力
+# 🧪 媒体预处理：翻译 + 压制 (媒体车间与发布车间共用)
 # ==========================================
-async def publisher_engine(queue: asyncio.Queue, engine_name: str):
-    logger.info(f"🏭 [{engine_name}] 消费车间已上线，等待上游分发...")
+def _checkpoint_alive(entry: dict) -> bool:
+    """断点缓存中的成品文件仍在磁盘上，才允许跳过预处理直接复用"""
+    return all(os.path.exists(p) for p in entry.get('final_media', []))
+
+def collect_unique_nodes(tweet: TweetRecord) -> dict:
+    """找出本条推文树中尚未搬运、需要翻译与压制的真实节点"""
+    tweet_id = tweet.id
+    unique_nodes = {}
+    for anc in tweet.quote_chain:
+        if not anc.is_placeholder and get_dyn_record(anc.id) is None:
+            unique_nodes[anc.id] = anc
+    if tweet.node_type != 'RETWEET':
+        unique_nodes[tweet_id] = tweet
+    return unique_nodes
+
+async def preprocess_nodes(tweet: TweetRecord, cache: dict, engine_name: str) -> dict:
+    """就地补全 cache：即使中途崩溃，已完成的节点也保留在 cache 里供调用方存档"""
+    unique_nodes = collect_unique_nodes(tweet)
+
+    # ♻️ 断点续跑：上一次投递已经翻译/压制完成的节点直接复用，不再重复烧 Token 与算力
+    for nid in list(cache):
+        if nid not in unique_nodes or not _checkpoint_alive(cache[nid]): del cache[nid]
+    pending_nodes = [n for nid, n in unique_nodes.items() if nid not in cache]
+    if cache and pending_nodes: logger.info(f"♻️ [{engine_name}] 命中断点缓存 {len(cache)} 个节点，跳过重复预处理。")
+    if not pending_nodes: return cache
+
+    logger.info(f"\n" + "="*50)
+    logger.info(f"⚡ [{engine_name}] 开始预处理 {len(pending_nodes)} 个节点...")
+    
+    # 🚨 止血点：将 llm_sem 从 5 降为 1 或 2，排队过闸门，防止大模型 API 拥堵超时！
+    llm_sem = asyncio.Semaphore(1) 
+    comp_sem = asyncio.Semaphore(2)
+
+    # 🪶 过载降级的任务只准备视频原片，成品与完整版分开缓存
+    ai_translate = not tweet.original_only
+
+    async def prepare(node):
+        async with llm_sem:
+            # ⏰ 翻译超时降级：译文留空，排版引擎只发布日文原文
+            try: trans = await run_stage("translate", translate_text(node.text), f"推文 {node.id}")
+            except StageTimeout: trans = ""
+        async with comp_sem: f_media, v_info = await process_media_files(node.media, ai_translate=ai_translate)
+        return {'translated_text': trans, 'final_media': f_media, 'video_info': v_info}
+
+    async def process_one(node):
+        nid = node.id
+        # 多条链共享的祖先只翻译、压制一次；缓存成品的文件已被清理时重新制作
+        flight_key = nid if ai_translate else f"{nid}:original_only"
+        entry = await prep_flight.do(flight_key, functools.partial(prepare, node), reuse=_checkpoint_alive)
+        cache[nid] = dict(entry)
+
+    await asyncio.gather(*(process_one(n) for n in pending_nodes))
+    return cache
+
+# ==========================================
+# 🧪 媒体车间：从采集车道领料，预处理后交接给发布车道
+# ==========================================
+async def media_engine(in_lane: DurableLane, out_lane: DurableLane, engine_name: str, shard: tuple[int, int] | None = None):
+    logger.info(f"🧪 [{engine_name}] 预处理车间已上线，等待上游分发...")
     
     while True:
-        tweet = await queue.get()
-        tweet_id = str(tweet['id'])
+        # 🧯 下游发布车道已满时暂停领料，成品不再在发布车道里无限堆积
+        while not out_lane.has_room(): await asyncio.sleep(settings.pipeline.poll_interval_sec)
+        await GloBotState.is_running.wait() # 如果熔断，则原地挂起，不领取任务
+        job = await in_lane.get(shard)
+        tweet_id = job.payload.id
+        cache = dict(job.checkpoint or {})
         
         try:
-            await GloBotState.is_running.wait() # 如果熔断，则原地挂起，不消费队列
-            
-            dm = load_dyn_map()
-            unique_nodes = {}
-            for anc in tweet.get('quote_chain', []):
-                if not anc.get('is_placeholder') and str(anc['id']) not in dm:
-                    unique_nodes[str(anc['id'])] = anc
-            if tweet.get('node_type') != 'RETWEET':
-                unique_nodes[tweet_id] = tweet
-
-            cache = {}
-            if unique_nodes:
-                logger.info(f"\n" + "="*50)
-                logger.info(f"⚡ [{engine_name}] 开始预处理 {len(unique_nodes)} 个节点...")
-                
-                # 🚨 止血点：将 llm_sem 从 5 降为 1 或 2，排队过闸门，防止大模型 API 拥堵超时！
-                llm_sem = asyncio.Semaphore(1) 
-                comp_sem = asyncio.Semaphore(2)
-
-                async def process_one(node):
-                    nid = str(node['id'])
-                    async with llm_sem: trans = await translate_text(node['text'])
-                    async with comp_sem: f_media, v_info = await process_media_files(node.get('media', []))
-                    cache[nid] = {'translated_text': trans, 'final_media': f_media, 'video_info': v_info}
+            async with in_lane.lease(job):
+                # 领取瞬间恰好熔断时在租约内挂起：心跳持续续租，任务不会被其他车间当作失联重领
+                await GloBotState.is_running.wait()
+                try:
+                    await preprocess_nodes(job.payload, cache, engine_name)
+                except BaseException:
+                    save_checkpoint(job, cache)
+                    raise
+            out_lane.handoff(job, cache)
+            logger.info(f"📦 [{engine_name}] 推文 [{tweet_id}] 预处理完毕，已移交发布车道。")
+        except RuntimeError as e:
+            if "LLM_TRANSLATION_FAILED" in str(e):
+                await trigger_fatal_panic("大模型翻译引擎宕机", e)
+                release(job) # 吐回队列，等修复后重试
+            else:
+                logger.error(f"🔥 [{engine_name}] 运行时异常: {e}")
+                if nack(job, e): await send_tg_msg(f"💀 <b>任务进入死信区</b>\n推特源: <code>{tweet_id}</code>\n<code>{e}</code>")
+        except Exception as e:
+            logger.error(f"🔥 [{engine_name}] 内部崩溃: {e}")
+            if nack(job, e): await send_tg_msg(f"💀 <b>任务进入死信区</b>\n推特源: <code>{tweet_id}</code>\n<code>{e}</code>")
 
+# ==========================================
+# ⚙️ 发布车间：负责接收成品并按序发射到 B 站
+# ==========================================
+async def publisher_engine(lane: DurableLane, engine_name: str, shard: tuple[int, int] | None = None):
+    logger.info(f"🏭 [{engine_name}] 消费车间已上线，等待上游分发...")
+    
+    while True:
+        await GloBotState.is_running.wait() # 如果熔断，则原地挂起，不领取任务
+        job = await lane.get(shard)
+        tweet = job.payload
+        tweet_id = tweet.id
+        cache = dict(job.checkpoint or {})
+        success = False
+        
+        try:
+            async with lane.lease(job):
+                await GloBotState.is_running.wait() # 同上：租约内挂起，心跳续租
+                # 正常情况下媒体车间已备好全部成品；缺件 (例如祖先记忆被 /reset 抹除) 时就地补做
                 try:
-                    await asyncio.gather(*(process_one(n) for n in unique_nodes.values()))
-                except RuntimeError as e:
-                    if "LLM_TRANSLATION_FAILED" in str(e):
-                        await trigger_fatal_panic("大模型翻译引擎宕机", e)
-                        queue.put_nowait(tweet) # 吐回队列，等修复后重试
-                        continue
-                    else: raise e
-
-            success, new_dyn_id, leaf_publish_mode = await process_pipeline(tweet, cache, engine_name)
+                    await preprocess_nodes(tweet, cache, engine_name)
+                except BaseException:
+                    save_checkpoint(job, cache)
+                    raise
+                success, new_dyn_id, _ = await process_pipeline(tweet, cache, engine_name)
             
             if success:
-                await safe_add_history(tweet_id)
-                if new_dyn_id:
-                    leaf_node_type = tweet.get('node_type', 'ORIGINAL')
-                    dt_str = datetime.fromtimestamp(tweet['timestamp']).strftime("%Y-%m-%d %H:%M:%S")
-                    await safe_update_dyn_map(tweet_id, {
-                        "dyn_id": new_dyn_id, "author_handle": tweet['author'], 
-                        "author_display_name": tweet.get('author_display_name', f"@{tweet['author']}"),
-                        "node_type": leaf_node_type, "dt_str": dt_str, 
-                        "translated_text": "" if leaf_node_type == 'RETWEET' else cache[tweet_id]['translated_text'], 
-                        "raw_text": "" if leaf_node_type == 'RETWEET' else html.unescape(tweet['text']), 
-                        "publish_mode": leaf_publish_mode
-                    })
+                add_history(tweet_id) # dyn_map 映射已在 publish_leaf 内落盘
+                ack(job)
                 logger.info(f"✅ [{engine_name}] 任务 [{tweet_id}] 成功发射！")
                 GloBotState.daily_stats['success'] += 1 
                 if not str(new_dyn_id).startswith("BV"): 
                     await send_tg_msg(f"🎉 <b>图文搬运成功</b>\n推特源: <code>{tweet_id}</code>\nB站动态: <code>{new_dyn_id}</code>")
             else:
+                bury(job, "PUBLISH_REJECTED")
                 logger.error(f"❌ [{engine_name}] 推文 {tweet_id} 发布失败！")
                 GloBotState.daily_stats['failed'] += 1   
                 await send_tg_msg(f"❌ <b>搬运受阻</b>\n推特源: <code>{tweet_id}</code>\n未能成功发布。")
                 
         except RuntimeError as e:
-            if "AUTH_EXPIRED" in str(e):
-                await trigger_fatal_panic("安全熔断机制触发 (凭证失效)", e)
-                queue.put_nowait(tweet) # 保护现场
+            if "AUTH_EXPIRED" in str(e) or "LLM_TRANSLATION_FAILED" in str(e):
+                reason = "安全熔断机制触发 (凭证失效)" if "AUTH_EXPIRED" in str(e) else "大模型翻译引擎宕机"
+                await trigger_fatal_panic(reason, e)
+                release(job) # 保护现场
             else:
                 logger.error(f"🔥 [{engine_name}] 运行时异常: {e}")
                 GloBotState.daily_stats['failed'] += 1
+                if nack(job, e): await send_tg_msg(f"💀 <b>任务进入死信区</b>\n推特源: <code>{tweet_id}</code>\n<code>{e}</code>")
         except Exception as e:
             logger.error(f"🔥 [{engine_name}] 内部崩溃: {e}")
             GloBotState.daily_stats['failed'] += 1
-        finally:
-            queue.task_done()
-            
-        if success:
-            logger.warning(f"⏳ [{engine_name}] 单条任务完成，进入 65 秒风控冷却...")
-            await asyncio.sleep(65)
+            if nack(job, e): await send_tg_msg(f"💀 <b>任务进入死信区</b>\n推特源: <code>{tweet_id}</code>\n<code>{e}</code>")
+
+# ==========================================
+# 🧯 过载保护：有界车道削峰 + Telegram 播报
+# ==========================================
+OVERLOAD_POLICY_LABELS = {"drop_retweets": "丢弃转推", "collapse_older": "折叠旧任务", "downgrade_video": "视频降级为原片"}
+
+async def relieve_lanes(routes: list[tuple[DurableLane, DurableLane]]) -> bool:
+    """逐条车道执行削峰，返回是否仍有车道过载"""
+    overloaded = False
+    for lanes in routes:
+        for lane in lanes:
+            report, still_full = lane.relieve_overload()
+            overloaded = overloaded or still_full
+            if not report: continue
+            shed = sum(n for k, n in report.items() if k != "downgrade_video")
+            GloBotState.daily_stats['shed'] = GloBotState.daily_stats.get('shed', 0) + shed
+            detail = "，".join(f"{OVERLOAD_POLICY_LABELS[k]} {n} 条" for k, n in report.items())
+            logger.warning(f"🧯 [削峰] {lane.group.name}·{lane.name} 车道过载 (容量 {lane.capacity})：{detail}")
+            with use_group(lane.group):
+                await send_tg_msg(f"🧯 <b>车道过载削峰</b>\n车道: <code>{lane.name}</code> (端到端积压 {lane.pipeline_backlog()}/{lane.capacity})\n{detail}")
+    return overloaded
+
+# ==========================================
+# ⏰ 工序超时播报 (由 common/deadline 在每次超时时回调)
+# ==========================================
+async def report_stage_timeout(stage: str, seconds: float, detail: str):
+    GloBotState.daily_stats['timeouts'] = GloBotState.daily_stats.get('timeouts', 0) + 1
+    await send_tg_msg(f"⏰ <b>工序超时</b>\n工序: <code>{stage}</code> ({STAGE_LABELS.get(stage, stage)})\n时限: {seconds:.0f} 秒\n对象: <code>{html.escape(detail or '-')}</code>\n该工序已被取消。")
 
 # ==========================================
 # 📡 独立生产者引擎：爬虫雷达与路权分发
 # ==========================================
-async def crawler_engine(text_queue: asyncio.Queue, video_queue: asyncio.Queue):
-    logger.info("📡 [雷达引擎] 爬虫总线已上线，绝不阻塞...")
-    is_first_run = not FIRST_RUN_FLAG_FILE.exists()
-    if is_first_run: logger.warning("🚨 检测到首次部署！首发截断保护机制已就绪。")
-    last_cleanup_time = 0
+def dispatch_tweet(tweet: TweetRecord, text_lane: DurableLane, video_lane: DurableLane) -> bool:
+    """按有无视频分流投递，返回是否新入队"""
+    tag = f"[{text_lane.group.name}] " if is_multi_group() else ""
+    has_video = False
+    # 只要这个推文或其祖先引用链里有视频，就全权交给重装甲去拉取和压制
+    for node in tweet.quote_chain + [tweet]:
+        media = node.media
+        if any(str(m).lower().endswith(('.mp4', '.mov')) for m in media):
+            has_video = True
+            break
+    
+    if has_video:
+        logger.info(f"   -> 🔀 {tag}[流转分发] 甄别出视频流，投递给【视频重装甲】: {tweet.id}")
+        return video_lane.put(tweet)
+    logger.info(f"   -> 🔀 {tag}[流转分发] 纯图文流，投递给【图文轻骑兵】: {tweet.id}")
+    return text_lane.put(tweet)
+
+async def backfill_engine(routes: list[tuple[DurableLane, DurableLane]]):
+    """历史补录 (Bot_Crawler/backfill)：与爬虫轮流使用热浏览器，按限速把旧推文低优先级投进各团体车道"""
+    lanes = {text_lane.group.name: (text_lane, video_lane) for text_lane, video_lane in routes}
+    runner = BackfillRunner(
+        dispatch=lambda tweet, group: dispatch_tweet(tweet, *lanes[group]),
+        lane_backlog=lambda group: max(lane.pipeline_backlog() for lane in lanes[group]),
+    )
+    while True:
+        await GloBotState.is_running.wait()
+        try: delay = await runner.step()
+        except RuntimeError as e:
+            if "TWITTER_AUTH_EXPIRED" not in str(e): raise
+            await trigger_fatal_panic("推特爬虫账号疑似被风控 (历史补录)", e)
+            continue
+        if delay: await asyncio.sleep(delay)
+
+_napping = 0  # 正在休眠的雷达引擎数
+
+async def nap(seconds: float) -> bool:
+    """可被 /force 提前唤醒的休眠；多个雷达引擎共用一个唤醒信号，任一引擎在睡即视为休眠中"""
+    global _napping
+    _napping += 1
+    GloBotState.is_sleeping = True
+    GloBotState.wake_up_event.clear()
+    try: 
+        await asyncio.wait_for(GloBotState.wake_up_event.wait(), timeout=seconds)
+        return True
+    except asyncio.TimeoutError: return False
+    finally:
+        _napping -= 1
+        GloBotState.is_sleeping = _napping > 0
+
+async def harvest_group(adapter: SourceAdapter, batch, first_run: bool) -> list[TweetRecord]:
+    """在当前团体上下文内化验一批矿石，首发截断后再下载媒体，被截断的历史推文不占带宽"""
+    group = current_group()
+    new_tweets = await adapter.parse(batch)
+    if not new_tweets: return []
+    new_tweets.sort(key=lambda x: x.timestamp)
+    if first_run:
+        # 🚨 首发防海量爆发机制：只将最后一条送进队列，其余全部标为历史
+        skipped = new_tweets[:-1]
+        add_history_many(t.id for t in skipped)
+        for t in skipped: mark_processed(t.id, t.author, t.timestamp)
+        new_tweets = [new_tweets[-1]]
+        (group.data_dir / adapter.first_run_flag).touch()
+    await adapter.plan_media(new_tweets)
+    print(f"\n✅ 提纯与下载全部完成！共提取 {len(new_tweets)} 条全新动态。")
+    return new_tweets
+
+async def crawler_engine(adapter: SourceAdapter, routes: list[tuple[DurableLane, DurableLane]]):
+    """一个信息源一个雷达：共享一条信息流，按团体分别化验并投递到各自的 (图文, 视频) 车道"""
+    logger.info(f"📡 [雷达引擎] {adapter.label}爬虫总线已上线，绝不阻塞...")
+    first_run_groups = {text_lane.group.name for text_lane, _ in routes if not (text_lane.group.data_dir / adapter.first_run_flag).exists()}
+    if first_run_groups: logger.warning(f"🚨 {adapter.label}: 检测到首次部署！首发截断保护机制已就绪: {', '.join(first_run_groups)}")
     
     while True:
         await GloBotState.is_running.wait()
         
-        sleep_cfg = settings.crawlers.global_settings.sleep_schedule
-        if sleep_cfg.enable:
-            try:
-                curr_time = datetime.now().time()
-                t_start = datetime.strptime(sleep_cfg.start_time, "%H:%M").time()
-                t_end = datetime.strptime(sleep_cfg.end_time, "%H:%M").time()
-                is_sleeping_time = (t_start <= curr_time <= t_end) if t_start <= t_end else (curr_time >= t_start or curr_time <= t_end)
-                    
-                if is_sleeping_time:
-                    logger.info(f"🌙 触发仿生休眠期 ({sleep_cfg.start_time} - {sleep_cfg.end_time})，系统进入深度蛰伏...")
-                    GloBotState.is_sleeping = True
-                    GloBotState.wake_up_event.clear()
-                    try: 
-                        await asyncio.wait_for(GloBotState.wake_up_event.wait(), timeout=600)
-                        logger.info("⚡ 收到强制唤醒信号，提前结束蛰伏！")
-                    except asyncio.TimeoutError: pass
-                    finally: GloBotState.is_sleeping = False
-                    continue
-            except Exception as e: pass
-
-        if time.time() - last_cleanup_time > 12 * 3600:
-            cleanup_old_media(getattr(settings.system, 'media_retention_days', 2.0))
-            last_cleanup_time = time.time()
+        # 🌙 休眠时段：推特由自适应节奏决定是否蛰伏 (成员历来在这个钟点活跃时照常巡视)
+        if adapter.should_hibernate():
+            sleep_cfg = settings.crawlers.global_settings.sleep_schedule
+            logger.info(f"🌙 {adapter.label}触发仿生休眠期 ({sleep_cfg.start_time} - {sleep_cfg.end_time})，进入深度蛰伏...")
+            if await nap(HIBERNATE_NAP_SEC): logger.info("⚡ 收到强制唤醒信号，提前结束蛰伏！")
+            continue
 
-        logger.info("\n📡 启动爬虫嗅探...")
+        logger.info(f"\n📡 启动{adapter.label}爬虫嗅探...")
         try:
-            await fetch_timeline()
+            batch = await run_stage("crawl", adapter.fetch(), adapter.label)
+        except StageTimeout:
+            # 浏览器卡死：本轮作废，热浏览器下轮自动重启，稍后重新巡视
+            await asyncio.sleep(60)
+            continue
         except RuntimeError as e:
-            if "TWITTER_AUTH_EXPIRED" in str(e):
-                await trigger_fatal_panic("推特爬虫账号疑似被风控", e)
+            if "AUTH_EXPIRED" in str(e):
+                await trigger_fatal_panic(f"{adapter.label}爬虫账号疑似被风控", e)
                 continue
             else: raise e
             
-        json_files = list(RAW_DIR.glob("*.json"))
-        if not json_files:
-            GloBotState.is_sleeping = True
-            GloBotState.wake_up_event.clear()
-            try: await asyncio.wait_for(GloBotState.wake_up_event.wait(), timeout=60)
-            except asyncio.TimeoutError: pass
-            finally: GloBotState.is_sleeping = False
+        if batch is None:
+            await nap(60)
             continue
             
-        latest_json = max(json_files, key=os.path.getmtime)
-        new_tweets = await parse_timeline_json(latest_json)
-        for jf in json_files:
-            if jf.name != latest_json.name:
-                try: jf.unlink()
-                except: pass
+        found_any, parsed_all = False, True
+        for text_lane, video_lane in routes:
+            group = text_lane.group
+            with use_group(group):
+                # ⏰ 化验 (含媒体下载) 超时：本团体本轮跳过，未入库的推文下轮重新化验
+                try: new_tweets = await run_stage("parse", harvest_group(adapter, batch, group.name in first_run_groups), adapter.describe(batch))
+                except StageTimeout:
+                    parsed_all = False
+                    continue
+                if not new_tweets: continue
+                found_any = True
+                first_run_groups.discard(group.name)
+
+            for tweet in new_tweets: dispatch_tweet(tweet, text_lane, video_lane)
+        
+        # 有团体化验超时则游标不前进，下轮重新化验这批矿石 (已入队的推文会被去重表拦下)
+        if parsed_all: adapter.commit(batch)
         
-        if not new_tweets:
-            sleep_time = random.randint(240, 420)
-            logger.info(f"💤 无新动态，雷达休眠 {sleep_time} 秒...")
-            GloBotState.is_sleeping = True
-            GloBotState.wake_up_event.clear()
-            try: await asyncio.wait_for(GloBotState.wake_up_event.wait(), timeout=sleep_time)
-            except asyncio.TimeoutError: pass
-            finally: GloBotState.is_sleeping = False
+        # 🧯 有界车道：积压超限时执行削峰策略，仍然过载则放缓巡视节奏，给下游车间喘息
+        overloaded = await relieve_lanes(routes)
+        if overloaded:
+            sleep_time = settings.pipeline.backpressure_sleep_sec
+            logger.warning(f"🧯 [背压] 下游车道仍然过载，{adapter.label}雷达放缓巡视，休眠 {sleep_time} 秒...")
+            await nap(sleep_time)
             continue
-            
-        new_tweets.sort(key=lambda x: x['timestamp'])
-        if is_first_run:
-            # 🚨 首发防海量爆发机制：只将最后一条送进队列，其余全部标为历史
-            hs = load_history()
-            for t in new_tweets[:-1]: hs.add(str(t['id']))
-            save_history(hs)
-            new_tweets = [new_tweets[-1]]
-            FIRST_RUN_FLAG_FILE.touch()
-            is_first_run = False
-
-        for tweet in new_tweets:
-            has_video = False
-            # 只要这个推文或其祖先引用链里有视频，就全权交给重装甲去拉取和压制
-            for node in tweet.get('quote_chain', []) + [tweet]:
-                media = node.get('media', [])
-                if any(str(m).lower().endswith(('.mp4', '.mov')) for m in media):
-                    has_video = True
-                    break
-            
-            if has_video:
-                logger.info(f"   -> 🔀 [流转分发] 甄别出视频流，投递给【视频重装甲】: {tweet['id']}")
-                await video_queue.put(tweet)
-            else:
-                logger.info(f"   -> 🔀 [流转分发] 纯图文流，投递给【图文轻骑兵】: {tweet['id']}")
-                await text_queue.put(tweet)
-                
-        sleep_time = random.randint(240, 420)
-        logger.info(f"✅ 雷达周期巡视完成，深度休眠 {sleep_time} 秒...")
-        GloBotState.is_sleeping = True
-        GloBotState.wake_up_event.clear()
-        try: await asyncio.wait_for(GloBotState.wake_up_event.wait(), timeout=sleep_time)
-        except asyncio.TimeoutError: pass
-        finally: GloBotState.is_sleeping = False
+        
+        sleep_time = adapter.next_interval()
+        if not found_any:
+            logger.info(f"💤 {adapter.label}无新动态，雷达休眠 {sleep_time} 秒...")
+        else:
+            logger.info(f"✅ {adapter.label}雷达周期巡视完成，深度休眠 {sleep_time} 秒...")
+        await nap(sleep_time)
+
+async def media_janitor(routes: list[tuple[DurableLane, DurableLane]]):
+    """每 12 小时按保留天数清理一次各团体的过期媒体 (旧版夹在推特巡视循环里) 与早已结束的任务记录"""
+    while True:
+        await GloBotState.is_running.wait()
+        for text_lane, _ in routes:
+            with use_group(text_lane.group):
+                cleanup_old_media(getattr(settings.system, 'media_retention_days', 2.0))
+                purged = purge_finished(settings.pipeline.job_retention_days)
+            if purged: logger.info(f"🧹 [清洁工] {text_lane.group.name} 清理了 {purged} 条已结束的任务记录。")
+        await asyncio.sleep(12 * 3600)
 
 # ==========================================
-# 🧠 总线调度器：三引擎并发
+# 🧠 总线调度器：按角色拉起引擎 (单进程全量 / 拆分部署)
 # ==========================================
-async def pipeline_loop():
-    text_queue = asyncio.Queue()
-    video_queue = asyncio.Queue()
+# 车道拓扑: 爬虫 -> [text / video] -> 媒体车间 -> [publish_text / publish_video] -> 发布车间
+ROLES = ("all", "crawler", "media", "publisher")
+
+async def pipeline_loop(role: str = "all", workers: int | None = None):
+    # 💾 磁盘持久化车道：/kill、崩溃或熔断后重启，从断点处原样续跑；拆分部署时同时充当进程间 broker
+    # 👥 多团体托管：每个团体一套独立车道与车间 (各自的状态库)，爬虫与重资源闸门全局共享
+    tasks, routes = [], []
+    GloBotState.lanes = []
+    lane_workers = settings.pipeline.lane_workers
+    if role != "all":
+        tasks.append(asyncio.create_task(sync_bus_valve(settings.pipeline.poll_interval_sec, role)))
+    
+    for group in GROUPS:
+        with use_group(group):
+            tag = f"{group.name}·" if is_multi_group() else ""
+            pub_text_lane, pub_video_lane = DurableLane("publish_text"), DurableLane("publish_video")
+            text_lane, video_lane = DurableLane("text", pub_text_lane), DurableLane("video", pub_video_lane)
+            for lane in (text_lane, video_lane, pub_text_lane, pub_video_lane):
+                recovered = recover_inflight(lane.name)
+                if recovered: logger.warning(f"♻️ [断点恢复] {tag}{lane.name} 车道找回 {recovered} 个上次未完成的任务，重新排队。")
+            routes.append((text_lane, video_lane))
+            GloBotState.lanes.extend((text_lane, video_lane, pub_text_lane, pub_video_lane))
+            
+            # 在团体上下文内创建的车间协程会永久继承该团体
+            # 同一车道的多个车间按引用链哈希分片：同一根祖先的推文只会落在同一个车间，保证链内顺序
+            if role in ("all", "media"):
+                for in_lane, out_lane, label in ((text_lane, pub_text_lane, "图文预处理"), (video_lane, pub_video_lane, "视频预处理")):
+                    n = workers or lane_workers.get(in_lane.name, settings.pipeline.media_workers)
+                    for i in range(n):
+                        tasks.append(asyncio.create_task(media_engine(in_lane, out_lane, f"{tag}{label}-{i+1}", (i, n))))
+            if role in ("all", "publisher"):
+                for lane, label in ((pub_text_lane, "图文轻骑兵"), (pub_video_lane, "视频重装甲")):
+                    n = lane_workers.get(lane.name, 1)
+                    for i in range(n):
+                        tasks.append(asyncio.create_task(publisher_engine(lane, f"{tag}{label}" + (f"-{i+1}" if n > 1 else ""), (i, n))))
     
-    task_crawler = asyncio.create_task(crawler_engine(text_queue, video_queue))
-    task_text = asyncio.create_task(publisher_engine(text_queue, "图文轻骑兵"))
-    task_video = asyncio.create_task(publisher_engine(video_queue, "视频重装甲"))
+    if role in ("all", "crawler"):
+        # 每个启用的信息源各开一个雷达，节奏互不牵连 (Bot_Crawler/source_adapter)
+        for adapter in build_adapters():
+            tasks.append(asyncio.create_task(crawler_engine(adapter, routes)))
+        tasks.append(asyncio.create_task(media_janitor(routes)))
+        tasks.append(asyncio.create_task(backfill_engine(routes)))
     
-    await asyncio.gather(task_crawler, task_text, task_video)
-
-async def main_master():
-    logger.info("🤖 初始化 Telegram 中枢...")
-    GloBotState.main_loop_coro = pipeline_loop
-    await start_telegram_bot()
-    GloBotState.crawler_task = asyncio.create_task(pipeline_loop())
-    await send_tg_msg("🟢 <b>GloBot Matrix 三引擎并发版已上线</b>")
+    await asyncio.gather(*tasks)
+
+async def main_master(role: str = "all", workers: int | None = None):
+    # 指令监听只能有一个进程：单进程模式或发布角色 (需要 Telegram 人工审片) 承担控制中枢
+    is_control_plane = role in ("all", "publisher")
+    GloBotState.role = role
+    logger.info(f"🤖 初始化 Telegram 中枢... (角色: {role})")
+    GloBotState.main_loop_coro = functools.partial(pipeline_loop, role, workers)
+    await start_telegram_bot(polling=is_control_plane)
+    set_timeout_reporter(report_stage_timeout)
+    GloBotState.crawler_task = asyncio.create_task(pipeline_loop(role, workers))
+    if is_control_plane: await send_tg_msg(f"🟢 <b>GloBot Matrix 三引擎并发版已上线</b> (角色: {role})")
     while True: await asyncio.sleep(86400)
 
 if __name__ == "__main__":
-    try: asyncio.run(main_master())
-    except KeyboardInterrupt: logger.info("\n🛑 安全停机。")
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="GloBot Matrix 总线")
+    parser.add_argument("--role", choices=ROLES, default="all", help="all=单进程全量；crawler/media/publisher=拆分部署的独立 worker")
+    parser.add_argument("--workers", type=int, default=None, help="媒体车间并发数 (media 与 all 角色生效，默认读取 pipeline.media_workers)")
+    args = parser.parse_args()
+    try: asyncio.run(main_master(args.role, args.workers))
+    except KeyboardInterrupt: logger.info("\n🛑 安全停机。")
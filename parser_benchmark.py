@@ -0,0 +1,109 @@
+import sys
+import json
+import time
+import random
+import argparse
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parent))
+
+from common.config_loader import settings
+from Bot_Crawler.capture_store import capture_store, json_loads, JSON_BACKEND
+from Bot_Crawler.tweet_parser import find_tweets, find_key, extract_tweet_node, get_node_type, index_timeline
+
+# ==========================================
+# 🏁 信息流化验基准测试
+# 对比旧版 (标准库 json + 全树递归 find_tweets + 每条推文提取两次 + find_key 找作者)
+# 与新版 (orjson + 沿时间线骨架单遍建索引) 在大页信息流上的耗时。
+# 用法: python parser_benchmark.py                 # 最近 10 份真实抓包归档
+#       python parser_benchmark.py --files a.json  # 指定旧版落盘的 JSON 文件
+#       python parser_benchmark.py --synthetic 400 # 无归档时生成 400 条推文的模拟大页
+# ==========================================
+def legacy_index(pages: list, target_accounts) -> dict:
+    """复刻重构前的化验路径，仅供对照"""
+    raw = [t for data in pages for t in find_tweets(data)]
+    nodes = {}
+    for t_node in raw:
+        info = extract_tweet_node(t_node)
+        find_key(t_node.get('core', {}), 'screen_name'), find_key(t_node.get('core', {}), 'name')
+        info.node_type = get_node_type(info, t_node, target_accounts)
+        nodes[info.id] = info
+    for t_node in raw:
+        info = extract_tweet_node(t_node)
+        find_key(t_node.get('core', {}), 'screen_name'), find_key(t_node.get('core', {}), 'name')
+        info.node_type = get_node_type(info, t_node, target_accounts)
+    return nodes
+
+def synthetic_page(n: int, seed: int = 7) -> bytes:
+    """生成结构贴近真实 HomeLatestTimeline 的模拟大页 (带引用、转推与冗余的用户画像字段)"""
+    rng = random.Random(seed)
+    accounts = settings.targets.x_accounts + [f"someone_{i}" for i in range(20)]
+
+    def user(name):
+        return {"result": {"__typename": "User", "rest_id": str(rng.randint(1, 10**12)),
+                           "core": {"screen_name": name, "name": name.upper(), "created_at": "Mon Jan 01 00:00:00 +0000 2018"},
+                           "legacy": {"description": "x" * 160, "followers_count": rng.randint(0, 10**5),
+                                      "entities": {"description": {"urls": []}, "url": {"urls": [{"expanded_url": "https://example.com"}]}},
+                                      "pinned_tweet_ids_str": [str(rng.randint(1, 10**18))]},
+                           "professional": {"category": [{"name": "Artist"}]}}}
+
+    def tweet(tid, depth=0):
+        t = {"__typename": "Tweet", "rest_id": str(tid), "core": {"user_results": user(rng.choice(accounts))},
+             "views": {"count": str(rng.randint(0, 10**5))},
+             "legacy": {"full_text": "ライブありがとうございました！" * 3, "created_at": "Wed Oct 15 10:00:00 +0000 2026",
+                        "entities": {"hashtags": [{"text": "ライブ"}], "urls": [], "user_mentions": []},
+                        "favorite_count": rng.randint(0, 5000), "retweet_count": rng.randint(0, 500)}}
+        if depth < 2 and rng.random() < 0.3:
+            t["quoted_status_result"] = {"result": tweet(tid * 10 + 1, depth + 1)}
+        elif depth == 0 and rng.random() < 0.2:
+            t["legacy"]["retweeted_status_result"] = {"result": tweet(tid * 10 + 2, depth + 1)}
+        return t
+
+    entries = [{"entryId": f"tweet-{i}", "content": {"entryType": "TimelineTimelineItem",
+                "itemContent": {"itemType": "TimelineTweet", "tweet_results": {"result": tweet(10**6 + i)}}}} for i in range(n)]
+    return json.dumps({"data": {"home": {"home_timeline_urt": {"instructions": [{"type": "TimelineAddEntries", "entries": entries}]}}}}).encode()
+
+def bench(label: str, fn, rounds: int) -> float:
+    fn()  # 预热
+    start = time.perf_counter()
+    for _ in range(rounds): fn()
+    cost = (time.perf_counter() - start) / rounds * 1000
+    print(f"   {label:<36} {cost:9.2f} ms")
+    return cost
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="GloBot 信息流化验基准测试")
+    parser.add_argument("--captures", type=int, default=10, help="读取最近 N 份抓包归档")
+    parser.add_argument("--files", nargs="*", default=[], help="改为读取指定的 JSON 文件")
+    parser.add_argument("--synthetic", type=int, default=0, help="生成 N 条推文的模拟大页")
+    parser.add_argument("--rounds", type=int, default=20)
+    args = parser.parse_args()
+
+    if args.files:
+        bodies = [Path(f).read_bytes() for f in args.files]
+    elif args.synthetic:
+        bodies = [synthetic_page(args.synthetic)]
+    else:
+        latest = capture_store.latest() or 0
+        bodies = [capture_store.read_raw(cid) for cid in capture_store.after(max(0, latest - args.captures))]
+    if not bodies:
+        print("❌ 没有可用的抓包归档，请改用 --synthetic 400 或 --files 指定样本。")
+        sys.exit(1)
+
+    targets = {a.lower() for a in settings.targets.x_accounts}
+    total_kb = sum(len(b) for b in bodies) / 1024
+    print(f"🏁 样本: {len(bodies)} 页 / {total_kb:.0f} KB，快速解码后端: {JSON_BACKEND}")
+
+    print("\n🔓 解码")
+    old_decode = bench("json.loads", lambda: [json.loads(b) for b in bodies], args.rounds)
+    new_decode = bench(f"{JSON_BACKEND}.loads", lambda: [json_loads(b) for b in bodies], args.rounds)
+
+    pages = [json_loads(b) for b in bodies]
+    print("\n🧬 建索引")
+    old_index = bench("全树递归 + 双重提取 (旧)", lambda: legacy_index(pages, targets), args.rounds)
+    new_index = bench("骨架直达 + 单遍索引 (新)", lambda: index_timeline(pages, targets), args.rounds)
+
+    old_nodes = legacy_index(pages, targets)
+    new_nodes, _, _ = index_timeline(pages, targets)
+    print(f"\n✅ 节点数 旧 {len(old_nodes)} / 新 {len(new_nodes)}{'' if set(old_nodes) == set(new_nodes) else ' ⚠️ 节点集合不一致!'}")
+    print(f"⚡ 端到端加速: {(old_decode + old_index) / (new_decode + new_index):.1f}x")